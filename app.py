@@ -43,6 +43,21 @@ def create_app(config_class=Config):
     jwt.init_app(app)
     mail.init_app(app)
     
+    from utils.cache import response_cache
+    response_cache.init_app(app)
+    
+    from services.watch_time_service import watch_time_buffer
+    watch_time_buffer.init_app(app)
+    
+    from services.certificate_verification import verification_cache
+    verification_cache.init_app(app, 'CERTIFICATE_VERIFY_CACHE_ENTRIES')
+    
+    from utils.event_hub import event_hub
+    event_hub.init_app(app)
+    
+    from services.dashboard_service import dashboard_snapshot
+    dashboard_snapshot.init_app(app)
+    
     # Configure 
     # CORS(app)
 
@@ -87,19 +102,25 @@ def create_app(config_class=Config):
     app.register_blueprint(live_session_bp, url_prefix='/api/v1/live-sessions')
     app.register_blueprint(helper_bp,url_prefix='/api/v1/helper/')
     app.register_blueprint(prereq_bp,url_prefix='/api/v1/')
+
+    # Register CLI commands
+    from commands import register_commands
+    register_commands(app)
+
     # Create tables
     with app.app_context():
         import models  # noqa: F401
         db.create_all()
+
+        from services.search_service import CourseSearchIndex
+        CourseSearchIndex().ensure_schema()
     
-    # JWT token blacklist handling
-    from models import TokenBlacklist
+    # JWT token blacklist handling, served from a per-process cache
+    from services.token_service import revoked_tokens
     
     @jwt.token_in_blocklist_loader
     def check_if_token_revoked(jwt_header, jwt_payload):
-        token_jti = jwt_payload['jti']
-        token = TokenBlacklist.query.filter_by(jti=token_jti).first()
-        return token is not None
+        return revoked_tokens.is_revoked(jwt_payload['jti'])
     
     # Root endpoint
     @app.route('/')
@@ -1,18 +1,22 @@
+import threading
+import time
 from functools import wraps
 from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
-from flask import jsonify
+from flask import jsonify, g, current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached
+from app import db
 from models import User, UserRole
 
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         verify_jwt_in_request()
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
-        
+        user = _resolve_current_user()
+
         if not user or user.role != UserRole.ADMIN:
             return jsonify({'error': 'Admin access required'}), 403
-        
+
         return f(*args, **kwargs)
     return decorated_function
 
@@ -20,20 +24,92 @@ def instructor_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         verify_jwt_in_request()
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
-        
+        user = _resolve_current_user()
+
         if not user or user.role not in [UserRole.INSTRUCTOR, UserRole.ADMIN]:
             return jsonify({'error': 'Instructor/Admin access required'}), 403
-        
+
         return f(*args, **kwargs)
     return decorated_function
 
 def get_current_user():
-    """Get the current user from JWT token"""
+    """Get the current user from JWT token.
+
+    Resolved once per request and kept on ``flask.g``, so the role decorators
+    and the handler share one lookup.
+    """
+    if not hasattr(g, '_current_user'):
+        try:
+            try:
+                identity = get_jwt_identity()
+            except RuntimeError:
+                # Nothing has verified the token yet in this request
+                verify_jwt_in_request()
+                identity = get_jwt_identity()
+            g._current_user = load_user(identity)
+        except Exception:
+            g._current_user = None
+    return g._current_user
+
+def _resolve_current_user():
+    # Only called once the JWT has been verified
+    if not hasattr(g, '_current_user'):
+        g._current_user = load_user(get_jwt_identity())
+    return g._current_user
+
+
+# Optional per-process cache of user rows, enabled with CURRENT_USER_CACHE_TTL
+# (seconds). Writes to a user drop its entry once committed; other workers
+# can keep the old row until the TTL runs out, so keep it short.
+_user_cache = {}
+_user_cache_lock = threading.Lock()
+
+def load_user(user_id):
+    """Load a user by JWT identity, going through the user cache when enabled"""
     try:
-        verify_jwt_in_request()
-        current_user_id = get_jwt_identity()
-        return User.query.get(current_user_id)
-    except:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
         return None
+
+    ttl = current_app.config.get('CURRENT_USER_CACHE_TTL', 0)
+    if not ttl:
+        return db.session.get(User, user_id)
+
+    cached = _user_cache.get(user_id)
+    if cached and cached[0] > time.monotonic():
+        # Attach a copy of the cached row to this session without a query;
+        # it behaves like a freshly loaded instance, writes included
+        user = User(**cached[1])
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    user = db.session.get(User, user_id)
+    if user:
+        state = {column.key: getattr(user, column.key) for column in User.__table__.columns}
+        with _user_cache_lock:
+            _user_cache[user_id] = (time.monotonic() + ttl, state)
+    return user
+
+def invalidate_user(user_id):
+    with _user_cache_lock:
+        _user_cache.pop(user_id, None)
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _mark_user_changed(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_user_ids', set()).add(target.id)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_users(session):
+    for user_id in session.info.pop('changed_user_ids', ()):
+        invalidate_user(user_id)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_changed_users(session, previous_transaction):
+    # A failed savepoint leaves the changes made outside it standing
+    if previous_transaction.parent is not None:
+        return
+    session.info.pop('changed_user_ids', None)
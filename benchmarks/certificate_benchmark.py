@@ -0,0 +1,256 @@
+"""Compare the platypus certificate renderer with the cached-layout one.
+
+Issues certificates for a synthetic graduating class of one course through
+both code paths and reports certificates per second. PDFs are written to a
+throwaway folder (or UPLOAD_FOLDER).
+
+    python benchmarks/certificate_benchmark.py --certificates 500
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from functools import partial
+from types import SimpleNamespace
+from reportlab.lib.colors import Color, black, blue
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIRST_NAMES = "Aisha Ben Carla Dev Elena Farid Grace Hiro Ines Jonas Kemi Liam Mei Noor Omar Priya".split()
+LAST_NAMES = "Ahmed Brown Chen Diaz Evans Fischer Garcia Haddad Ito Jensen Khan Lopez Mensah Novak".split()
+
+
+def graduating_class(count, seed_value=42):
+    rng = random.Random(seed_value)
+    instructor = SimpleNamespace(id=1, first_name='Bench', last_name='Mark')
+    course = SimpleNamespace(
+        id=1,
+        title='Applied Machine Learning with Python: From Data Pipelines to Deployed Models',
+        duration_hours=40,
+        difficulty_level='intermediate',
+        instructor=instructor,
+        instructor_id=instructor.id,
+        updated_at=datetime(2024, 1, 1)
+    )
+
+    students = []
+    for i in range(count):
+        user = SimpleNamespace(id=i + 2, first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES))
+        number = f"AIFA-1-{user.id}-{rng.getrandbits(32):08X}"
+        certificate = SimpleNamespace(
+            id=i + 1,
+            certificate_number=number,
+            issued_at=datetime(2024, 6, 1),
+            verification_url=f"/api/v1/certificates/verify/{number}"
+        )
+        students.append((user, certificate))
+    return course, students
+
+
+def generate_flowable_certificate_pdf(folder, user, course, certificate):
+    """Generate a PDF certificate by laying out the whole platypus flow, as
+    CertificateService did before the cached-layout renderer"""
+    from services.storage_index import StorageIndex
+    try:
+        # Generate unique filename
+        filename = f"certificate_{certificate.id}_{uuid.uuid4().hex[:8]}.pdf"
+        file_path = os.path.join(folder, filename).replace("\\", "/")
+        
+        # Create the PDF document
+        doc = SimpleDocTemplate(file_path, pagesize=A4)
+        
+        # Get styles
+        styles = getSampleStyleSheet()
+        
+        # Custom styles
+        title_style = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=28,
+            spaceAfter=30,
+            alignment=TA_CENTER,
+            textColor=blue
+        )
+        
+        subtitle_style = ParagraphStyle(
+            'CustomSubtitle',
+            parent=styles['Heading2'],
+            fontSize=18,
+            spaceAfter=20,
+            alignment=TA_CENTER,
+            textColor=black
+        )
+        
+        body_style = ParagraphStyle(
+            'CustomBody',
+            parent=styles['Normal'],
+            fontSize=14,
+            spaceAfter=12,
+            alignment=TA_CENTER,
+            textColor=black
+        )
+        
+        large_body_style = ParagraphStyle(
+            'LargeBody',
+            parent=styles['Normal'],
+            fontSize=16,
+            spaceAfter=15,
+            alignment=TA_CENTER,
+            textColor=black
+        )
+        
+        # Build the content
+        content = []
+        
+        # Add some space from top
+        content.append(Spacer(1, 0.5*inch))
+        
+        # Certificate header
+        content.append(Paragraph("CERTIFICATE OF COMPLETION", title_style))
+        content.append(Spacer(1, 0.3*inch))
+        
+        # Subtitle
+        content.append(Paragraph("AI First Academy", subtitle_style))
+        content.append(Spacer(1, 0.5*inch))
+        
+        # This certifies that
+        content.append(Paragraph("This is to certify that", body_style))
+        content.append(Spacer(1, 0.2*inch))
+        
+        # Student name (larger, bold)
+        student_name_style = ParagraphStyle(
+            'StudentName',
+            parent=styles['Normal'],
+            fontSize=24,
+            spaceAfter=20,
+            alignment=TA_CENTER,
+            textColor=blue,
+            fontName='Helvetica-Bold'
+        )
+        content.append(Paragraph(f"{user.first_name} {user.last_name}", student_name_style))
+        
+        # Has successfully completed
+        content.append(Paragraph("has successfully completed the course", body_style))
+        content.append(Spacer(1, 0.2*inch))
+        
+        # Course name (larger, bold)
+        course_name_style = ParagraphStyle(
+            'CourseName',
+            parent=styles['Normal'],
+            fontSize=20,
+            spaceAfter=20,
+            alignment=TA_CENTER,
+            textColor=black,
+            fontName='Helvetica-Bold'
+        )
+        content.append(Paragraph(course.title, course_name_style))
+        
+        # Course details
+        if course.duration_hours:
+            content.append(Paragraph(f"Duration: {course.duration_hours} hours", body_style))
+        
+        if course.difficulty_level:
+            content.append(Paragraph(f"Level: {course.difficulty_level.title()}", body_style))
+        
+        content.append(Spacer(1, 0.3*inch))
+        
+        # Issue date
+        issue_date = certificate.issued_at.strftime("%B %d, %Y")
+        content.append(Paragraph(f"Issued on: {issue_date}", large_body_style))
+        content.append(Spacer(1, 0.2*inch))
+        
+        # Certificate number
+        content.append(Paragraph(f"Certificate Number: {certificate.certificate_number}", body_style))
+        content.append(Spacer(1, 0.4*inch))
+        
+        # Instructor signature section
+        signature_style = ParagraphStyle(
+            'Signature',
+            parent=styles['Normal'],
+            fontSize=12,
+            spaceAfter=8,
+            alignment=TA_CENTER,
+            textColor=black
+        )
+        
+        content.append(Paragraph("_" * 40, signature_style))
+        content.append(Paragraph(f"{course.instructor.first_name} {course.instructor.last_name}", signature_style))
+        content.append(Paragraph("Course Instructor", signature_style))
+        content.append(Spacer(1, 0.3*inch))
+        
+        # Academy signature
+        content.append(Paragraph("_" * 40, signature_style))
+        content.append(Paragraph("AI First Academy", signature_style))
+        content.append(Paragraph("Certificate Authority", signature_style))
+        content.append(Spacer(1, 0.2*inch))
+        
+        # Verification note
+        verification_style = ParagraphStyle(
+            'Verification',
+            parent=styles['Normal'],
+            fontSize=10,
+            alignment=TA_CENTER,
+            textColor=Color(0.5, 0.5, 0.5)
+        )
+        content.append(Paragraph(
+            f"This certificate can be verified at: {certificate.verification_url}",
+            verification_style
+        ))
+        
+        # Build the PDF
+        doc.build(content)
+        StorageIndex().record(file_path, os.path.getsize(file_path), owner_id=user.id, course_id=course.id)
+        
+        return file_path
+        
+    except Exception as e:
+        raise Exception(f"Certificate generation error: {str(e)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--certificates', type=int, default=500)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='certificate-benchmark-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault('UPLOAD_FOLDER', os.path.join(workdir, 'uploads'))
+
+    from app import create_app, db
+    from services.certificate_service import CertificateService
+
+    app = create_app()
+    with app.app_context():
+        service = CertificateService()
+        course, students = graduating_class(args.certificates)
+
+        print(f"{'renderer':<12}{'seconds':>10}{'certs/s':>10}{'avg KB':>9}")
+        rates = {}
+        for name, generate in (
+            ('platypus', partial(generate_flowable_certificate_pdf, service.certificates_folder)),
+            ('cached', service.generate_certificate_pdf),
+        ):
+            size = 0
+            started = time.perf_counter()
+            for user, certificate in students:
+                size += os.path.getsize(generate(user, course, certificate))
+            elapsed = time.perf_counter() - started
+            db.session.rollback()
+
+            rates[name] = args.certificates / elapsed
+            print(f"{name:<12}{elapsed:>10.2f}{rates[name]:>10.1f}{size / args.certificates / 1024:>9.1f}")
+
+        print(f"\nspeedup {rates['cached'] / rates['platypus']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
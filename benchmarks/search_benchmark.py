@@ -0,0 +1,138 @@
+"""Compare the old ILIKE course search with the full-text search index.
+
+Builds a synthetic catalog in a throwaway SQLite database (or the database in
+SEARCH_BENCHMARK_DATABASE_URL) and times the first page of results for a set
+of search terms through both code paths.
+
+    python benchmarks/search_benchmark.py --courses 100000 --repeat 20
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = (
+    "python data science machine learning deep neural network statistics pandas numpy "
+    "visualization regression classification clustering transformer language model vision "
+    "cloud devops docker kubernetes security cryptography web flask django react javascript "
+    "sql database analytics spark streaming optimization algorithms graphs probability calculus "
+    "linear algebra ethics prompt engineering agents reinforcement robotics finance marketing"
+).split()
+
+SEARCHES = ['python', 'neural network', 'kubern', 'prompt engineering', 'zebra', 'data']
+
+
+def vocabulary(rng, size=20000):
+    """Topic words plus a long tail of filler words, so common topic terms
+    match a realistic fraction of the catalog instead of nearly every course"""
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    filler = {''.join(rng.choice(letters) for _ in range(rng.randint(4, 9))) for _ in range(size)}
+    return sorted(filler)
+
+
+def sentence(rng, words, filler):
+    return ' '.join(
+        rng.choice(WORDS) if rng.random() < 0.05 else rng.choice(filler)
+        for _ in range(words)
+    )
+
+
+def seed(db, count, seed_value=42):
+    from sqlalchemy import insert
+    from models import User, UserRole, Course, CourseStatus
+
+    instructor = User(email='bench@example.com', first_name='Bench', last_name='Mark', role=UserRole.INSTRUCTOR)
+    instructor.set_password('benchmark')
+    db.session.add(instructor)
+    db.session.commit()
+
+    rng = random.Random(seed_value)
+    filler = vocabulary(rng)
+    batch = []
+    for i in range(count):
+        batch.append({
+            'title': sentence(rng, 4, filler).title(),
+            'short_description': sentence(rng, 12, filler),
+            'description': sentence(rng, 80, filler),
+            'instructor_id': instructor.id,
+            'price': 49,
+            'status': CourseStatus.PUBLISHED
+        })
+        if len(batch) == 5000:
+            db.session.execute(insert(Course), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(Course), batch)
+    db.session.commit()
+
+
+def first_page(db, search, use_index):
+    from models import Course
+    from services.search_service import CourseSearchIndex
+
+    query = Course.query
+    search_index = CourseSearchIndex()
+    if use_index:
+        query = search_index.filter(query, search)
+    else:
+        term = f"%{search}%"
+        query = query.filter(db.or_(
+            Course.title.ilike(term),
+            Course.description.ilike(term),
+            Course.short_description.ilike(term)
+        ))
+
+    page = query.order_by(Course.created_at.desc()).paginate(page=1, per_page=20, error_out=False)
+    if use_index:
+        search_index.snippets(search, [course.id for course in page.items])
+    return page.total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--courses', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='search-benchmark-')
+    os.environ['DATABASE_URL'] = os.environ.get(
+        'SEARCH_BENCHMARK_DATABASE_URL', f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    )
+    os.environ.setdefault('UPLOAD_FOLDER', os.path.join(workdir, 'uploads'))
+
+    from app import create_app, db
+    from services.search_service import CourseSearchIndex
+
+    app = create_app()
+    with app.app_context():
+        started = time.perf_counter()
+        seed(db, args.courses)
+        print(f"Seeded {args.courses} courses in {time.perf_counter() - started:.1f}s")
+
+        search_index = CourseSearchIndex()
+        started = time.perf_counter()
+        search_index.rebuild()
+        print(f"Built {search_index.backend} index in {time.perf_counter() - started:.1f}s\n")
+
+        print(f"{'search':<22}{'ilike ms':>10}{'index ms':>10}{'speedup':>9}{'ilike hits':>12}{'index hits':>12}")
+        for search in SEARCHES:
+            timings = {}
+            totals = {}
+            for use_index in (False, True):
+                first_page(db, search, use_index)  # warm up
+                started = time.perf_counter()
+                for _ in range(args.repeat):
+                    totals[use_index] = first_page(db, search, use_index)
+                timings[use_index] = (time.perf_counter() - started) * 1000 / args.repeat
+
+            speedup = timings[False] / timings[True] if timings[True] else float('inf')
+            print(f"{search:<22}{timings[False]:>10.1f}{timings[True]:>10.1f}{speedup:>8.1f}x"
+                  f"{totals[False]:>12}{totals[True]:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+import click
+from flask.cli import with_appcontext
+
+
+@click.command('reconcile-enrollment-counts')
+@click.option('--course-id', 'course_ids', multiple=True, type=int, help='Only rebuild these courses')
+@with_appcontext
+def reconcile_enrollment_counts(course_ids):
+    """Rebuild the denormalized enrollment counters on courses"""
+    from services.enrollment_service import EnrollmentService
+
+    updated = EnrollmentService().reconcile_counters(course_ids or None)
+    click.echo(f"Reconciled enrollment counters for {updated} courses")
+
+
+@click.command('rebuild-search-index')
+@with_appcontext
+def rebuild_search_index():
+    """Re-index every course for full-text search"""
+    from services.search_service import CourseSearchIndex
+
+    search_index = CourseSearchIndex()
+    search_index.ensure_schema()
+    search_index.rebuild()
+    click.echo(f"Rebuilt course search index ({search_index.backend})")
+
+
+@click.command('purge-revoked-tokens')
+@with_appcontext
+def purge_revoked_tokens():
+    """Delete token blacklist rows older than JWT_REFRESH_TOKEN_EXPIRES"""
+    from services.token_service import revoked_tokens
+
+    purged = revoked_tokens.purge()
+    click.echo(f"Purged {purged} expired token revocations")
+
+
+@click.command('reconcile-course-progress')
+@click.option('--course-id', 'course_ids', multiple=True, type=int, help='Only rebuild these courses')
+@with_appcontext
+def reconcile_course_progress(course_ids):
+    """Rebuild lesson counts and enrollment progress from lesson_progress"""
+    from services.progress_service import ProgressService
+
+    updated = ProgressService().reconcile(course_ids or None)
+    click.echo(f"Reconciled progress for {updated} courses")
+
+
+@click.command('purge-upload-sessions')
+@with_appcontext
+def purge_upload_sessions():
+    """Delete expired upload sessions and their partial files"""
+    from services.upload_service import UploadService
+
+    purged = UploadService().purge_expired()
+    click.echo(f"Purged {purged} expired upload sessions")
+
+
+@click.command('run-jobs')
+@click.option('--processes', type=int, default=None, help='Worker processes (default JOB_WORKER_PROCESSES)')
+@click.option('--poll-interval', type=float, default=2.0, help='Seconds between polls when idle')
+@click.option('--once', is_flag=True, help='Exit once no job is due')
+@with_appcontext
+def run_jobs(processes, poll_interval, once):
+    """Run background jobs (media probing, ...)"""
+    from flask import current_app
+    from services.job_queue import run_worker
+    from utils.event_hub import event_hub
+
+    if not event_hub.shared:
+        # Jobs publish to the stream of whoever they concern (live session
+        # reminders); with the in-process hub nobody is listening here
+        current_app.logger.warning(
+            "EVENT_HUB_URL is memory://: events published by jobs won't reach any stream. "
+            "Point EVENT_HUB_URL at Redis to deliver them."
+        )
+
+    processes = processes or current_app.config.get('JOB_WORKER_PROCESSES', 2)
+    processed = run_worker(processes=processes, poll_interval=poll_interval, once=once)
+    click.echo(f"Ran {processed} jobs")
+
+
+@click.command('rebuild-storage-index')
+@click.option('--root', 'roots', multiple=True, help='Scan these folders (default STORAGE_INDEX_ROOTS)')
+@with_appcontext
+def rebuild_storage_index(roots):
+    """Rebuild the stored_files index from disk"""
+    from services.storage_index import StorageIndex
+
+    indexed = StorageIndex().rebuild(list(roots) or None)
+    click.echo(f"Indexed {indexed} stored files")
+
+
+@click.command('collect-storage-garbage')
+@click.option('--root', 'roots', multiple=True, help='Sweep these folders (default STORAGE_INDEX_ROOTS)')
+@click.option('--dry-run', is_flag=True, help='Only report what would be deleted')
+@click.option('--min-age-hours', type=float, default=24.0, help='Keep unreferenced files younger than this')
+@click.option('--batch-size', type=int, default=100, help='Files deleted per batch')
+@click.option('--max-per-second', type=float, default=50.0, help='Delete rate cap (0 for none)')
+@with_appcontext
+def collect_storage_garbage(roots, dry_run, min_age_hours, batch_size, max_per_second):
+    """Delete stored files no record refers to any more"""
+    from datetime import timedelta
+    from services.storage_gc import StorageCollector
+
+    result = StorageCollector().collect(
+        roots=list(roots) or None,
+        dry_run=dry_run,
+        min_age=timedelta(hours=min_age_hours),
+        batch_size=batch_size,
+        max_per_second=max_per_second or None
+    )
+    verb = 'Would reclaim' if dry_run else 'Reclaimed'
+    click.echo(
+        f"Scanned {result['scanned_files']} files, {result['orphaned_files']} unreferenced; "
+        f"{verb} {result['reclaimed_size']} bytes ({result['reclaimed_size_mb']:.1f} MB)"
+        + ('' if dry_run else f" from {result['deleted_files']} deleted files")
+    )
+
+
+@click.command('deliver-emails')
+@click.option('--batch-size', type=int, default=None, help='Messages claimed per batch (default EMAIL_OUTBOX_BATCH_SIZE)')
+@click.option('--poll-interval', type=float, default=5.0, help='Seconds between polls when idle')
+@click.option('--once', is_flag=True, help='Exit once no email is due')
+@click.option('--quiet', is_flag=True, help='Only print the totals')
+@with_appcontext
+def deliver_emails(batch_size, poll_interval, once, quiet):
+    """Send queued email over a reused SMTP connection"""
+    from flask import current_app
+    from services.email_outbox import run_delivery
+
+    def report(stats):
+        rate = stats['sent'] / stats['seconds'] if stats['seconds'] else 0
+        click.echo(f"Sent {stats['sent']}, failed {stats['failed']}, retrying {stats['retried']} ({rate:.1f}/s)")
+
+    batch_size = batch_size or current_app.config.get('EMAIL_OUTBOX_BATCH_SIZE', 200)
+    stats = run_delivery(batch_size=batch_size, poll_interval=poll_interval, once=once,
+                         report=None if quiet else report)
+    rate = stats['sent'] / stats['seconds'] if stats['seconds'] else 0
+    click.echo(f"Sent {stats['sent']} emails in {stats['seconds']:.1f}s ({rate:.1f}/s); "
+               f"{stats['failed']} failed, {stats['retried']} to retry")
+
+
+@click.command('reconcile-notification-counts')
+@click.option('--user-id', 'user_ids', multiple=True, type=int, help='Only rebuild these users')
+@with_appcontext
+def reconcile_notification_counts(user_ids):
+    """Rebuild the cached unread notification counts"""
+    from services.notification_service import UnreadCounter
+
+    updated = UnreadCounter().reconcile(user_ids or None)
+    click.echo(f"Reconciled unread counts for {updated} users")
+
+
+@click.command('backfill-analytics')
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help='First day to rebuild')
+@click.option('--until', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help='Last day to rebuild')
+@with_appcontext
+def backfill_analytics(since, until):
+    """Rebuild the daily analytics rollups from payments and enrollments"""
+    from services.analytics_service import AnalyticsRollup
+
+    written = AnalyticsRollup().backfill(since.date() if since else None, until.date() if until else None)
+    click.echo(f"Rebuilt {written} daily course rollups")
+
+
+def register_commands(app):
+    app.cli.add_command(reconcile_enrollment_counts)
+    app.cli.add_command(rebuild_search_index)
+    app.cli.add_command(purge_revoked_tokens)
+    app.cli.add_command(reconcile_course_progress)
+    app.cli.add_command(purge_upload_sessions)
+    app.cli.add_command(run_jobs)
+    app.cli.add_command(rebuild_storage_index)
+    app.cli.add_command(collect_storage_garbage)
+    app.cli.add_command(deliver_emails)
+    app.cli.add_command(reconcile_notification_counts)
+    app.cli.add_command(backfill_analytics)
@@ -22,6 +22,13 @@ class Config:
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'jwt-secret-string')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+    # Revoked JTI cache (services/token_service.py): how stale another
+    # worker's logout may be, and how often expired revocations are purged
+    REVOKED_TOKEN_REFRESH_SECONDS = int(os.environ.get('REVOKED_TOKEN_REFRESH_SECONDS', '5'))
+    REVOKED_TOKEN_PURGE_SECONDS = int(os.environ.get('REVOKED_TOKEN_PURGE_SECONDS', '3600'))
+    # Per-process cache of the authenticated user row (auth.load_user), in
+    # seconds; 0 disables it so role/is_active changes apply on the next request
+    CURRENT_USER_CACHE_TTL = int(os.environ.get('CURRENT_USER_CACHE_TTL', '0'))
     
     # Mail configuration
     MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
@@ -30,6 +37,10 @@ class Config:
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', 'noreply@aifirstacademy.com')
+    # Email outbox (services/email_outbox.py, flask deliver-emails): messages
+    # per batch, and when a message claimed by a dead worker is released
+    EMAIL_OUTBOX_BATCH_SIZE = int(os.environ.get('EMAIL_OUTBOX_BATCH_SIZE', '200'))
+    EMAIL_OUTBOX_TIMEOUT_SECONDS = int(os.environ.get('EMAIL_OUTBOX_TIMEOUT_SECONDS', '300'))
     
     # Stripe configuration
     STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLISHABLE_KEY')
@@ -40,8 +51,76 @@ class Config:
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     # In Flask app config
     
-    # Rate limiting
-    RATELIMIT_STORAGE_URL = os.environ.get('REDIS_URL', 'memory://')
+    # Content-addressed file storage (services/blob_store.py); the public
+    # store is served as static files
+    BLOB_STORE_FOLDER = os.environ.get('BLOB_STORE_FOLDER', os.path.join(UPLOAD_FOLDER, 'blobs'))
+    BLOB_STORE_PUBLIC_FOLDER = os.environ.get('BLOB_STORE_PUBLIC_FOLDER', os.path.join('static', 'uploads', 'blobs'))
+    
+    # Folders covered by the storage index (flask rebuild-storage-index)
+    STORAGE_INDEX_ROOTS = os.environ.get('STORAGE_INDEX_ROOTS', f"{UPLOAD_FOLDER},{os.path.join('static', 'uploads')}").split(',')
+    
+    # Resumable uploads (services/upload_service.py)
+    UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', str(2 * 1024 * 1024 * 1024)))
+    UPLOAD_CHUNK_MAX_BYTES = int(os.environ.get('UPLOAD_CHUNK_MAX_BYTES', str(16 * 1024 * 1024)))
+    UPLOAD_SESSION_TTL_HOURS = int(os.environ.get('UPLOAD_SESSION_TTL_HOURS', '24'))
+    
+    # Response cache (utils/cache.py), per process
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '2048'))
+    
+    # Video heartbeat buffer (services/watch_time_service.py): flush to the
+    # database every N seconds or after M buffered heartbeats
+    WATCH_TIME_FLUSH_SECONDS = int(os.environ.get('WATCH_TIME_FLUSH_SECONDS', '30'))
+    WATCH_TIME_FLUSH_EVENTS = int(os.environ.get('WATCH_TIME_FLUSH_EVENTS', '500'))
+    
+    # File downloads (FileService.send_file). FILE_OFFLOAD = x-accel (nginx)
+    # or x-sendfile hands the bytes to the front-end server after the access
+    # check; for x-accel, FILE_OFFLOAD_PREFIX is an internal location that
+    # aliases FILE_OFFLOAD_ROOT
+    FILE_OFFLOAD = os.environ.get('FILE_OFFLOAD', '')
+    FILE_OFFLOAD_ROOT = os.environ.get('FILE_OFFLOAD_ROOT', os.getcwd())
+    FILE_OFFLOAD_PREFIX = os.environ.get('FILE_OFFLOAD_PREFIX', '/protected/')
+    FILE_MAX_AGE = int(os.environ.get('FILE_MAX_AGE', '3600'))
+    
+    # Background jobs (services/job_queue.py, flask run-jobs)
+    JOB_WORKER_PROCESSES = int(os.environ.get('JOB_WORKER_PROCESSES', '2'))
+    JOB_TIMEOUT_SECONDS = int(os.environ.get('JOB_TIMEOUT_SECONDS', '600'))
+    
+    # Bulk certificate generation: enrollments per background job, each committed on its own
+    CERTIFICATE_BATCH_SIZE = int(os.environ.get('CERTIFICATE_BATCH_SIZE', '50'))
+    
+    # Certificate numbers are HMAC-signed (services/certificate_verification.py);
+    # verification payloads are cached per process
+    CERTIFICATE_SIGNING_KEY = os.environ.get('CERTIFICATE_SIGNING_KEY', os.environ.get('SECRET_KEY', 'dev-secret-key'))
+    CERTIFICATE_VERIFY_CACHE_ENTRIES = int(os.environ.get('CERTIFICATE_VERIFY_CACHE_ENTRIES', '1024'))
+    CERTIFICATE_VERIFY_CACHE_SECONDS = int(os.environ.get('CERTIFICATE_VERIFY_CACHE_SECONDS', '600'))
+    # QR code linking to the verification URL on certificate PDFs; needs
+    # PUBLIC_BASE_URL outside of a request (e.g. bulk generation jobs)
+    CERTIFICATE_QR_CODE = os.environ.get('CERTIFICATE_QR_CODE', 'true').lower() in ['true', 'on', '1']
+    PUBLIC_BASE_URL = os.environ.get('PUBLIC_BASE_URL')
+    
+    # Rate limiting: memory:// (per worker), file:///path/ratelimit.bin (shared
+    # by the workers on one host) or redis:// (shared by every host)
+    RATELIMIT_STORAGE_URL = os.environ.get('RATELIMIT_STORAGE_URL', os.environ.get('REDIS_URL', 'memory://'))
+    
+    # Admin dashboard snapshot (services/dashboard_service.py): recomputed
+    # every N seconds while admins are looking at it
+    DASHBOARD_SNAPSHOT_SECONDS = int(os.environ.get('DASHBOARD_SNAPSHOT_SECONDS', '60'))
+    DASHBOARD_SNAPSHOT_IDLE_SECONDS = int(os.environ.get('DASHBOARD_SNAPSHOT_IDLE_SECONDS', '900'))
+    
+    # Server-sent events (GET /notifications/stream). Every open stream holds
+    # a worker thread, so run gunicorn with threaded workers and keep
+    # SSE_MAX_STREAMS (per worker process) below its thread count; further
+    # streams get a 503 and retry after SSE_BUSY_RETRY_SECONDS. memory://
+    # only reaches streams in the publishing process; redis:// reaches every
+    # web worker and job runner (needed for live session reminders)
+    EVENT_HUB_URL = os.environ.get('EVENT_HUB_URL', os.environ.get('REDIS_URL', 'memory://'))
+    SSE_HEARTBEAT_SECONDS = int(os.environ.get('SSE_HEARTBEAT_SECONDS', '15'))
+    SSE_MAX_STREAM_SECONDS = int(os.environ.get('SSE_MAX_STREAM_SECONDS', '300'))
+    SSE_RETRY_MILLISECONDS = int(os.environ.get('SSE_RETRY_MILLISECONDS', '3000'))
+    SSE_HISTORY_SIZE = int(os.environ.get('SSE_HISTORY_SIZE', '1000'))
+    SSE_MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS', '24'))
+    SSE_BUSY_RETRY_SECONDS = int(os.environ.get('SSE_BUSY_RETRY_SECONDS', '30'))
+    LIVE_SESSION_REMINDER_MINUTES = int(os.environ.get('LIVE_SESSION_REMINDER_MINUTES', '15'))
     
     # Security
     SECRET_KEY = os.environ.get('SECRET_KEY', 'dev-secret-key')
@@ -1,7 +1,17 @@
+import os
 from app import create_app
+from utils.event_hub import event_hub
 
 app = create_app()
 
+# Each web worker process has its own in-process hub, so with several of
+# them a stream misses the events published by requests its worker didn't serve
+if not event_hub.shared and int(os.environ.get('WEB_CONCURRENCY', '1')) > 1:
+    app.logger.warning(
+        "EVENT_HUB_URL is memory:// but WEB_CONCURRENCY runs several web workers: "
+        "event streams will miss pushes. Point EVENT_HUB_URL at Redis or run a single worker."
+    )
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
 
@@ -0,0 +1,39 @@
+"""Indexes matching the list sort orders, for keyset pagination
+
+Revision ID: 1a5707c12642
+Revises: 7dd99f2d39c5
+Create Date: 2026-10-17 08:02:11.504318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1a5707c12642'
+down_revision = '7dd99f2d39c5'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_users_created_at_id', 'users', ['created_at', 'id']),
+    ('ix_courses_created_at_id', 'courses', ['created_at', 'id']),
+    ('ix_enrollments_enrolled_at_id', 'enrollments', ['enrolled_at', 'id']),
+    ('ix_payments_created_at_id', 'payments', ['created_at', 'id']),
+    ('ix_payments_user_created_at_id', 'payments', ['user_id', 'created_at', 'id']),
+    ('ix_live_sessions_scheduled_at_id', 'live_sessions', ['scheduled_at', 'id']),
+    ('ix_notifications_user_created_at_id', 'notifications', ['user_id', 'created_at', 'id']),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns in INDEXES:
+        if name not in {index['name'] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,86 @@
+"""Lesson counters for course progress
+
+Adds ``courses.lesson_count`` and ``enrollments.completed_lessons``, which
+``ProgressService`` keeps up to date instead of counting ``lesson_progress``
+rows on every update, and fills them in from the rows they count.
+
+Revision ID: 3b61f2a9d0e7
+Revises: 9629a0f83c41
+Create Date: 2026-10-17 08:34:12.640981
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b61f2a9d0e7'
+down_revision = '9629a0f83c41'
+branch_labels = None
+depends_on = None
+
+
+courses = sa.table(
+    'courses',
+    sa.column('id', sa.Integer),
+    sa.column('lesson_count', sa.Integer),
+)
+course_modules = sa.table(
+    'course_modules',
+    sa.column('id', sa.Integer),
+    sa.column('course_id', sa.Integer),
+)
+lessons = sa.table(
+    'lessons',
+    sa.column('id', sa.Integer),
+    sa.column('module_id', sa.Integer),
+)
+enrollments = sa.table(
+    'enrollments',
+    sa.column('id', sa.Integer),
+    sa.column('course_id', sa.Integer),
+    sa.column('completed_lessons', sa.Integer),
+)
+lesson_progress = sa.table(
+    'lesson_progress',
+    sa.column('enrollment_id', sa.Integer),
+    sa.column('lesson_id', sa.Integer),
+    sa.column('completed', sa.Boolean),
+)
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    if 'lesson_count' not in {column['name'] for column in inspector.get_columns('courses')}:
+        op.add_column('courses', sa.Column('lesson_count', sa.Integer(), nullable=False, server_default='0'))
+        op.execute(courses.update().values(lesson_count=(
+            sa.select(sa.func.count())
+            .select_from(lessons.join(course_modules, lessons.c.module_id == course_modules.c.id))
+            .where(course_modules.c.course_id == courses.c.id)
+            .scalar_subquery()
+        )))
+
+    if 'completed_lessons' not in {column['name'] for column in inspector.get_columns('enrollments')}:
+        op.add_column('enrollments', sa.Column('completed_lessons', sa.Integer(), nullable=False, server_default='0'))
+        op.execute(enrollments.update().values(completed_lessons=(
+            sa.select(sa.func.count())
+            .select_from(
+                lesson_progress
+                .join(lessons, lesson_progress.c.lesson_id == lessons.c.id)
+                .join(course_modules, lessons.c.module_id == course_modules.c.id)
+            )
+            .where(
+                lesson_progress.c.enrollment_id == enrollments.c.id,
+                lesson_progress.c.completed == sa.true(),
+                course_modules.c.course_id == enrollments.c.course_id
+            )
+            .scalar_subquery()
+        )))
+
+
+def downgrade():
+    with op.batch_alter_table('enrollments') as batch_op:
+        batch_op.drop_column('completed_lessons')
+    with op.batch_alter_table('courses') as batch_op:
+        batch_op.drop_column('lesson_count')
@@ -0,0 +1,35 @@
+"""Media probe status and results on lessons and lesson resources
+
+Revision ID: 5e02b7c9a4d1
+Revises: c4e8a1d27f53
+Create Date: 2026-10-17 09:07:48.552190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e02b7c9a4d1'
+down_revision = 'c4e8a1d27f53'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ('lessons', 'lesson_resources')
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table in TABLES:
+        if 'media_status' in {column['name'] for column in inspector.get_columns(table)}:
+            continue
+        op.add_column(table, sa.Column('media_status', sa.String(length=20), nullable=True))
+        op.add_column(table, sa.Column('media_info', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('media_info')
+            batch_op.drop_column('media_status')
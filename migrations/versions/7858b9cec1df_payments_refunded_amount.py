@@ -0,0 +1,43 @@
+"""Refunded amount on payments
+
+Stripe reports refunds as a running total per charge; ``refunded_amount``
+keeps it so partial refunds are recorded (and counted in analytics) once.
+Payments already marked refunded are taken to be refunded in full.
+
+Revision ID: 7858b9cec1df
+Revises: 808e0b6401e6
+Create Date: 2026-10-16 10:04:51.227613
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7858b9cec1df'
+down_revision = '808e0b6401e6'
+branch_labels = None
+depends_on = None
+
+
+payments = sa.table(
+    'payments',
+    sa.column('amount', sa.Numeric(10, 2)),
+    sa.column('status', sa.String),
+    sa.column('refunded_amount', sa.Numeric(10, 2)),
+)
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'refunded_amount' in {column['name'] for column in inspector.get_columns('payments')}:
+        return
+
+    op.add_column('payments', sa.Column('refunded_amount', sa.Numeric(10, 2), nullable=False, server_default='0'))
+    # The status enum is stored by member name
+    op.execute(payments.update().where(payments.c.status == 'REFUNDED').values(refunded_amount=payments.c.amount))
+
+
+def downgrade():
+    with op.batch_alter_table('payments') as batch_op:
+        batch_op.drop_column('refunded_amount')
@@ -0,0 +1,67 @@
+"""Enrollment counters on courses
+
+``db.create_all()`` creates new tables but never alters existing ones, so
+columns added to tables that already existed ship as revisions like this
+one. Columns that are already there (a database created by ``create_all``
+after they were introduced) are skipped; new counters are filled in from
+the rows they count.
+
+Revision ID: 7dd99f2d39c5
+Revises:
+Create Date: 2026-10-16 09:12:40.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7dd99f2d39c5'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+COLUMNS = ('enrolled_count', 'active_enrolled_count', 'completed_count')
+
+# Lightweight tables: no ``onupdate``, so the backfill leaves
+# ``courses.updated_at`` alone
+courses = sa.table(
+    'courses',
+    sa.column('id', sa.Integer),
+    sa.column('enrolled_count', sa.Integer),
+    sa.column('active_enrolled_count', sa.Integer),
+    sa.column('completed_count', sa.Integer),
+)
+enrollments = sa.table(
+    'enrollments',
+    sa.column('course_id', sa.Integer),
+    sa.column('is_active', sa.Boolean),
+    sa.column('completed_at', sa.DateTime),
+)
+
+
+def upgrade():
+    existing = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('courses')}
+    if 'enrolled_count' in existing:
+        return
+
+    for name in COLUMNS:
+        op.add_column('courses', sa.Column(name, sa.Integer(), nullable=False, server_default='0'))
+
+    def count_where(*conditions):
+        return sa.select(sa.func.count()).select_from(enrollments).where(
+            enrollments.c.course_id == courses.c.id, *conditions
+        ).scalar_subquery()
+
+    op.execute(courses.update().values(
+        enrolled_count=count_where(),
+        active_enrolled_count=count_where(enrollments.c.is_active == sa.true()),
+        completed_count=count_where(enrollments.c.completed_at.isnot(None))
+    ))
+
+
+def downgrade():
+    with op.batch_alter_table('courses') as batch_op:
+        for name in reversed(COLUMNS):
+            batch_op.drop_column(name)
@@ -0,0 +1,60 @@
+"""One certificate per student and course
+
+Adds ``uq_certificates_user_course``, which bulk generation relies on to be
+safe to retry or run concurrently. Certificates are never removed here: if
+students already hold more than one certificate for a course, the upgrade
+stops and lists them so they can be resolved by hand first.
+
+Revision ID: 808e0b6401e6
+Revises: a71d3c5e9b28
+Create Date: 2026-10-16 09:31:05.904117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '808e0b6401e6'
+down_revision = 'a71d3c5e9b28'
+branch_labels = None
+depends_on = None
+
+
+CONSTRAINT = 'uq_certificates_user_course'
+
+certificates = sa.table(
+    'certificates',
+    sa.column('id', sa.Integer),
+    sa.column('user_id', sa.Integer),
+    sa.column('course_id', sa.Integer),
+)
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if CONSTRAINT in {constraint['name'] for constraint in inspector.get_unique_constraints('certificates')}:
+        return
+
+    duplicates = op.get_bind().execute(
+        sa.select(certificates.c.user_id, certificates.c.course_id, sa.func.count())
+        .group_by(certificates.c.user_id, certificates.c.course_id)
+        .having(sa.func.count() > 1)
+        .order_by(certificates.c.user_id, certificates.c.course_id)
+    ).all()
+    if duplicates:
+        listed = ', '.join(f"user {user_id} / course {course_id} ({count})"
+                           for user_id, course_id, count in duplicates)
+        raise RuntimeError(
+            f"Cannot add {CONSTRAINT}, some students hold more than one certificate for a course "
+            f"(certificate counts in brackets): {listed}. Keep one certificate for each and run the upgrade again."
+        )
+
+    # SQLite can't add a constraint in place; batch mode rebuilds the table
+    with op.batch_alter_table('certificates') as batch_op:
+        batch_op.create_unique_constraint(CONSTRAINT, ['user_id', 'course_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('certificates') as batch_op:
+        batch_op.drop_constraint(CONSTRAINT, type_='unique')
@@ -0,0 +1,29 @@
+"""Index token_blacklist.created_at for the expired entry purge
+
+Revision ID: 9629a0f83c41
+Revises: 1a5707c12642
+Create Date: 2026-10-17 08:20:37.118245
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9629a0f83c41'
+down_revision = '1a5707c12642'
+branch_labels = None
+depends_on = None
+
+
+INDEX = 'ix_token_blacklist_created_at'
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if INDEX not in {index['name'] for index in inspector.get_indexes('token_blacklist')}:
+        op.create_index(INDEX, 'token_blacklist', ['created_at'])
+
+
+def downgrade():
+    op.drop_index(INDEX, table_name='token_blacklist')
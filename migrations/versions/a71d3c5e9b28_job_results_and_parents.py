@@ -0,0 +1,42 @@
+"""Job results and parent jobs
+
+Bulk certificate generation splits a run into batch jobs under a parent
+job and reads their results to report progress.
+
+Revision ID: a71d3c5e9b28
+Revises: 5e02b7c9a4d1
+Create Date: 2026-10-17 09:24:15.806337
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a71d3c5e9b28'
+down_revision = '5e02b7c9a4d1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'jobs' not in inspector.get_table_names():
+        return
+    if 'parent_id' in {column['name'] for column in inspector.get_columns('jobs')}:
+        return
+
+    # SQLite can't add a foreign key in place; batch mode rebuilds the table
+    with op.batch_alter_table('jobs') as batch_op:
+        batch_op.add_column(sa.Column('result', sa.JSON(), nullable=True))
+        batch_op.add_column(sa.Column('parent_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_jobs_parent_id_jobs', 'jobs', ['parent_id'], ['id'])
+        batch_op.create_index('ix_jobs_parent_id', ['parent_id'])
+
+
+def downgrade():
+    # Dropping parent_id drops its foreign key too
+    with op.batch_alter_table('jobs') as batch_op:
+        batch_op.drop_index('ix_jobs_parent_id')
+        batch_op.drop_column('parent_id')
+        batch_op.drop_column('result')
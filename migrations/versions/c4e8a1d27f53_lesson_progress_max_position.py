@@ -0,0 +1,30 @@
+"""Furthest playback position on lesson progress
+
+Revision ID: c4e8a1d27f53
+Revises: 3b61f2a9d0e7
+Create Date: 2026-10-17 08:51:29.073416
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e8a1d27f53'
+down_revision = '3b61f2a9d0e7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'max_position_seconds' in {column['name'] for column in inspector.get_columns('lesson_progress')}:
+        return
+
+    op.add_column('lesson_progress',
+                  sa.Column('max_position_seconds', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('lesson_progress') as batch_op:
+        batch_op.drop_column('max_position_seconds')
@@ -0,0 +1,43 @@
+"""Broadcast total on notification counters
+
+Broadcast ids can commit out of order, so a counter also notes how many
+broadcasts existed when it was counted. Existing counters get their
+broadcast count dropped and rebuilt on next read.
+
+Revision ID: d2b9e4f61a07
+Revises: 7858b9cec1df
+Create Date: 2026-10-17 09:46:03.271559
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2b9e4f61a07'
+down_revision = '7858b9cec1df'
+branch_labels = None
+depends_on = None
+
+
+notification_counters = sa.table(
+    'notification_counters',
+    sa.column('unread_broadcasts', sa.Integer),
+)
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'notification_counters' not in inspector.get_table_names():
+        return
+    if 'broadcasts_seen' in {column['name'] for column in inspector.get_columns('notification_counters')}:
+        return
+
+    op.add_column('notification_counters',
+                  sa.Column('broadcasts_seen', sa.Integer(), nullable=False, server_default='0'))
+    op.execute(notification_counters.update().values(unread_broadcasts=None))
+
+
+def downgrade():
+    with op.batch_alter_table('notification_counters') as batch_op:
+        batch_op.drop_column('broadcasts_seen')
@@ -23,6 +23,23 @@ class ModeOfConduct(Enum):
     ONLINE = "online"
     OFFLINE = "offline"
 
+class UploadStatus(Enum):
+    PENDING = "pending"
+    COMPLETED = "completed"
+    ABORTED = "aborted"
+
+class JobStatus(Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+class EmailStatus(Enum):
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+
 class User(db.Model):
     __tablename__ = 'users'
     
@@ -46,6 +63,9 @@ class User(db.Model):
     certificates = db.relationship('Certificate', backref='user', lazy='dynamic')
     notifications = db.relationship('Notification', backref='user', lazy='dynamic')
     
+    # Matches the list sort order so keyset pagination (utils/pagination.py) can seek
+    __table_args__ = (db.Index('ix_users_created_at_id', 'created_at', 'id'),)
+    
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
     
@@ -106,7 +126,8 @@ class SubCategory(db.Model):
             # "courses": [c.to_dict() for c in self.courses]
         }
         if include_courses:
-            response['courses'] = [c.to_dict() for c in self.courses]
+            from serializers import CourseSerializer
+            response['courses'] = CourseSerializer.dump_many(self.courses)
             
         return response
 
@@ -153,6 +174,14 @@ class Course(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     prerequisites_course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=True)
+    # Denormalized enrollment counters, maintained by EnrollmentService
+    enrolled_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    active_enrolled_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    completed_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Number of lessons across all modules, maintained by ProgressService
+    lesson_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
+    __table_args__ = (db.Index('ix_courses_created_at_id', 'created_at', 'id'),)
     # Relationships
     instructor = db.relationship('User', backref='courses_taught')
     modules = db.relationship('CourseModule', backref='course', cascade='all, delete-orphan',order_by="CourseModule.order")
@@ -170,46 +199,8 @@ class Course(db.Model):
     )
 
     def to_dict(self, include_modules=False):
-        data = {
-            'id': self.id,
-            'title': self.title,
-            'description': self.description,
-            'short_description': self.short_description,
-            'instructor_id': self.instructor_id,
-            'instructor_name': f"{self.instructor.first_name} {self.instructor.last_name}",
-            'price': float(self.price),
-            'currency': self.currency,
-            'duration_hours': self.duration_hours,
-            'difficulty_level': self.difficulty_level,
-            'thumbnail': self.thumbnail,
-            'status': self.status.value,
-            'max_students': self.max_students,
-            'prerequisites': self.prerequisites,
-            'learning_outcomes': self.learning_outcomes,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat(),
-            'enrollment_count': self.enrollments.count(),
-
-            
-        # full prerequisites
-        'prerequisites_courses': [
-            {
-                'id': prereq.prerequisite_course.id,
-                'title': prereq.prerequisite_course.title,
-                'difficulty_level': prereq.prerequisite_course.difficulty_level,
-                'status': prereq.prerequisite_course.status.value if prereq.prerequisite_course.status else None
-            }
-            for prereq in self.prerequisites_courses.all()
-        ]
-    }
-
-            
-  
-        
-        if include_modules:
-            data['modules'] = [module.to_dict(include_lessons=True) for module in self.modules]
-        
-        return data
+        from serializers import CourseSerializer
+        return CourseSerializer.dump(self, include_modules=include_modules)
 
 
 class CourseModule(db.Model):
@@ -227,7 +218,7 @@ class CourseModule(db.Model):
     # Relationships
     lessons = db.relationship('Lesson', backref='module', lazy='dynamic', cascade='all, delete-orphan')
     
-    def to_dict(self, include_lessons=False):
+    def to_dict(self, include_lessons=False, lessons=None):
         data = {
             'id': self.id,
             'course_id': self.course_id,
@@ -239,7 +230,9 @@ class CourseModule(db.Model):
         }
         
         if include_lessons:
-            data['lessons'] = [lesson.to_dict() for lesson in self.lessons.order_by(Lesson.order)]
+            if lessons is None:
+                lessons = [lesson.to_dict() for lesson in self.lessons.order_by(Lesson.order)]
+            data['lessons'] = lessons
         
         return data
 
@@ -255,13 +248,18 @@ class Lesson(db.Model):
     duration_minutes = db.Column(db.Integer,default=0)
     order = db.Column(db.Integer, nullable=False)
     is_preview = db.Column(db.Boolean, default=False)
+    # Set by the probe_media job: pending -> ready/failed; None without a video
+    media_status = db.Column(db.String(20))
+    media_info = db.Column(db.JSON)  # duration_seconds, fps, width, height, codec
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
     resources = db.relationship('LessonResource', backref='lesson', lazy='dynamic', cascade='all, delete-orphan')
     progress = db.relationship('LessonProgress', backref='lesson', lazy='dynamic')
     
-    def to_dict(self,include_resources=False):
+    def to_dict(self,include_resources=False, resources=None):
+        if resources is None:
+            resources = self.resources
         data =  {
             'id': self.id,
             'module_id': self.module_id,
@@ -269,10 +267,12 @@ class Lesson(db.Model):
             'content': self.content,
             'video_url': self.video_url,
             'duration_minutes': self.duration_minutes,
+            'media_status': self.media_status,
+            'media_info': self.media_info,
             'order': self.order,
             'is_preview': self.is_preview,
             'created_at': self.created_at.isoformat(),
-            'resources': [resource.to_dict() for resource in self.resources]
+            'resources': [resource.to_dict() for resource in resources]
         }
         return data 
 
@@ -287,6 +287,8 @@ class LessonResource(db.Model):
     file_size = db.Column(db.Integer)
     is_active = db.Column(db.Boolean, default=False, nullable=False)
     duration_minutes = db.Column(db.Integer,default=0)
+    media_status = db.Column(db.String(20))  # video files only, see Lesson.media_status
+    media_info = db.Column(db.JSON)
 
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -297,6 +299,8 @@ class LessonResource(db.Model):
             'lesson_id': self.lesson_id,
             'title': self.title,
             'duration_minutes':self.duration_minutes,
+            'media_status': self.media_status,
+            'media_info': self.media_info,
             'file_path': self.file_path,
             'file_type': self.file_type,
             'file_size': self.file_size,
@@ -312,12 +316,17 @@ class Enrollment(db.Model):
     enrolled_at = db.Column(db.DateTime, default=datetime.utcnow)
     completed_at = db.Column(db.DateTime)
     progress_percentage = db.Column(db.Float, default=0.0)
+    # Completed lessons in the course, maintained by ProgressService
+    completed_lessons = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     is_active = db.Column(db.Boolean, default=True)
     
     # Relationships
     lesson_progress = db.relationship('LessonProgress', backref='enrollment', lazy='dynamic')
     
-    __table_args__ = (db.UniqueConstraint('user_id', 'course_id'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'course_id'),
+        db.Index('ix_enrollments_enrolled_at_id', 'enrolled_at', 'id'),
+    )
     
     def to_dict(self):
         return {
@@ -327,6 +336,7 @@ class Enrollment(db.Model):
             'enrolled_at': self.enrolled_at.isoformat(),
             'completed_at': self.completed_at.isoformat() if self.completed_at else None,
             'progress_percentage': self.progress_percentage,
+            'completed_lessons': self.completed_lessons,
             'is_active': self.is_active
         }
 
@@ -339,6 +349,8 @@ class LessonProgress(db.Model):
     completed = db.Column(db.Boolean, default=False)
     completed_at = db.Column(db.DateTime)
     watch_time_seconds = db.Column(db.Integer, default=0)
+    # Furthest playback position reported by heartbeats (WatchTimeBuffer)
+    max_position_seconds = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     __table_args__ = (db.UniqueConstraint('enrollment_id', 'lesson_id'),)
 
@@ -354,9 +366,17 @@ class Payment(db.Model):
     stripe_payment_intent_id = db.Column(db.String(255))
     stripe_session_id = db.Column(db.String(255))
     payment_method = db.Column(db.String(50))
+    # Total refunded so far, from Stripe's charge.refunded webhooks; the
+    # status only becomes REFUNDED once all of it is
+    refunded_amount = db.Column(Numeric(10, 2), nullable=False, default=0, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_payments_created_at_id', 'created_at', 'id'),
+        db.Index('ix_payments_user_created_at_id', 'user_id', 'created_at', 'id'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -365,6 +385,7 @@ class Payment(db.Model):
             'amount': float(self.amount),
             'currency': self.currency,
             'status': self.status.value,
+            'refunded_amount': float(self.refunded_amount or 0),
             'payment_method': self.payment_method,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
@@ -381,6 +402,9 @@ class Certificate(db.Model):
     file_path = db.Column(db.String(500))
     verification_url = db.Column(db.String(500))
     
+    # One certificate per student and course, so bulk generation can be re-run safely
+    __table_args__ = (db.UniqueConstraint('user_id', 'course_id', name='uq_certificates_user_course'),)
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -408,6 +432,8 @@ class LiveSession(db.Model):
     recording_url = db.Column(db.String(500))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (db.Index('ix_live_sessions_scheduled_at_id', 'scheduled_at', 'id'),)
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -435,6 +461,8 @@ class Notification(db.Model):
     is_read = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (db.Index('ix_notifications_user_created_at_id', 'user_id', 'created_at', 'id'),)
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -446,13 +474,217 @@ class Notification(db.Model):
             'created_at': self.created_at.isoformat()
         }
 
+class BroadcastNotification(db.Model):
+    """A notification for everyone in a role and/or enrolled in a course,
+    stored once and merged into each user's feed when read
+    (services/notification_service.py)"""
+    __tablename__ = 'broadcast_notifications'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(200), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    type = db.Column(db.String(50))
+    target_role = db.Column(db.Enum(UserRole))  # None: every role
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), index=True)  # None: every user
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'message': self.message,
+            'type': self.type,
+            'target_role': self.target_role.value if self.target_role else None,
+            'course_id': self.course_id,
+            'created_by': self.created_by,
+            'created_at': self.created_at.isoformat()
+        }
+
+class BroadcastReceipt(db.Model):
+    """A user's read/dismissed state for a broadcast, written on first use"""
+    __tablename__ = 'broadcast_receipts'
+    
+    broadcast_id = db.Column(db.Integer, db.ForeignKey('broadcast_notifications.id', ondelete='CASCADE'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True, index=True)
+    read_at = db.Column(db.DateTime)
+    dismissed_at = db.Column(db.DateTime)
+
+class NotificationCounter(db.Model):
+    """Cached unread notification count for a user, built on first read and
+    kept up to date by NotificationFeed (services/notification_service.py)"""
+    __tablename__ = 'notification_counters'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    unread = db.Column(db.Integer, nullable=False, default=0)  # personal notifications
+    # Unread broadcasts up to broadcasts_counted_to (a broadcast id); None: recount
+    unread_broadcasts = db.Column(db.Integer)
+    broadcasts_counted_to = db.Column(db.Integer, nullable=False, default=0)
+    # How many broadcasts existed when counted; ids may commit out of order
+    broadcasts_seen = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+class CourseDailyStats(db.Model):
+    """Per-course, per-day analytics counters, updated as payments and
+    enrollments happen and rebuilt by ``flask backfill-analytics``
+    (services/analytics_service.py)"""
+    __tablename__ = 'course_daily_stats'
+    
+    day = db.Column(db.Date, primary_key=True)
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), primary_key=True)
+    instructor_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    revenue = db.Column(Numeric(12, 2), nullable=False, default=0)
+    payments = db.Column(db.Integer, nullable=False, default=0)
+    enrollments = db.Column(db.Integer, nullable=False, default=0)
+    completions = db.Column(db.Integer, nullable=False, default=0)
+    refunds = db.Column(db.Integer, nullable=False, default=0)
+    refunded_amount = db.Column(Numeric(12, 2), nullable=False, default=0)
+    
+    __table_args__ = (db.Index('ix_course_daily_stats_instructor_day', 'instructor_id', 'day'),)
+
 class TokenBlacklist(db.Model):
     __tablename__ = 'token_blacklist'
     
     id = db.Column(db.Integer, primary_key=True)
     jti = db.Column(db.String(120), nullable=False, unique=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class UploadSession(db.Model):
+    """A resumable upload. Chunks are written straight into ``file_path``;
+    completing the session creates the lesson or lesson resource."""
+    __tablename__ = 'upload_sessions'
+    
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # lesson_video, lesson_resource
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False)
+    module_id = db.Column(db.Integer, db.ForeignKey('course_modules.id'))
+    lesson_id = db.Column(db.Integer, db.ForeignKey('lessons.id'))
+    title = db.Column(db.String(200), nullable=False)
+    content = db.Column(db.Text)
+    is_preview = db.Column(db.Boolean, default=False)
+    filename = db.Column(db.String(255), nullable=False)
+    file_path = db.Column(db.String(500), nullable=False)
+    total_size = db.Column(db.BigInteger, nullable=False)
+    received_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    sha256 = db.Column(db.String(64))  # optional checksum of the whole file
+    status = db.Column(db.Enum(UploadStatus), nullable=False, default=UploadStatus.PENDING)
+    result_id = db.Column(db.Integer)  # lesson or resource created on completion
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    def to_dict(self):
+        return {
+            'upload_id': self.id,
+            'kind': self.kind,
+            'course_id': self.course_id,
+            'module_id': self.module_id,
+            'lesson_id': self.lesson_id,
+            'title': self.title,
+            'filename': self.filename,
+            'offset': self.received_bytes,
+            'total_size': self.total_size,
+            'status': self.status.value,
+            'result_id': self.result_id,
+            'created_at': self.created_at.isoformat(),
+            'expires_at': self.expires_at.isoformat()
+        }
 
 
+class Job(db.Model):
+    """Background job, run by ``flask run-jobs`` (services/job_queue.py)"""
+    __tablename__ = 'jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    result = db.Column(db.JSON)
+    parent_id = db.Column(db.Integer, db.ForeignKey('jobs.id'), index=True)
+    status = db.Column(db.Enum(JobStatus), nullable=False, default=JobStatus.QUEUED)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    last_error = db.Column(db.Text)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    
+    __table_args__ = (db.Index('ix_jobs_status_run_after', 'status', 'run_after'),)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'payload': self.payload,
+            'result': self.result,
+            'parent_id': self.parent_id,
+            'status': self.status.value,
+            'attempts': self.attempts,
+            'last_error': self.last_error,
+            'run_after': self.run_after.isoformat(),
+            'created_at': self.created_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class StoredBlob(db.Model):
+    """A file in the content-addressed store (services/blob_store.py)"""
+    __tablename__ = 'stored_blobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), nullable=False)
+    public = db.Column(db.Boolean, nullable=False, default=False)
+    path = db.Column(db.String(500), nullable=False, unique=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('sha256', 'public'),)
+
+
+class StoredFile(db.Model):
+    """Storage index: one row per file on disk (services/storage_index.py)"""
+    __tablename__ = 'stored_files'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    path = db.Column(db.String(500), nullable=False, unique=True)
+    size = db.Column(db.BigInteger, nullable=False, default=0)
+    mime_type = db.Column(db.String(100), index=True)
+    owner_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
 
+class OutboxEmail(db.Model):
+    """Email waiting to be delivered by ``flask deliver-emails`` (services/email_outbox.py)"""
+    __tablename__ = 'email_outbox'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(255), nullable=False)
+    sender = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    html_body = db.Column(db.Text)
+    status = db.Column(db.Enum(EmailStatus), nullable=False, default=EmailStatus.PENDING)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    last_error = db.Column(db.Text)
+    send_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+    
+    __table_args__ = (db.Index('ix_email_outbox_status_send_after', 'status', 'send_after'),)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'recipient': self.recipient,
+            'subject': self.subject,
+            'status': self.status.value,
+            'attempts': self.attempts,
+            'last_error': self.last_error,
+            'send_after': self.send_after.isoformat(),
+            'created_at': self.created_at.isoformat(),
+            'sent_at': self.sent_at.isoformat() if self.sent_at else None
+        }
@@ -1,10 +1,16 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
 from app import db
-from models import User, Course, Enrollment, Payment, UserRole, CourseStatus, PaymentStatus, MasterCategory,SubCategory
+from models import User, Course, Enrollment, Payment, UserRole, CourseStatus, PaymentStatus
 from auth import admin_required, get_current_user
-from datetime import datetime, timedelta
-from sqlalchemy import func
+from datetime import date
+from serializers import CourseSerializer
+from utils.pagination import paginate, InvalidCursor
+from services.file_service import FileService
+from services.notification_service import UnreadCounter
+from services.dashboard_service import dashboard_snapshot
+from services.analytics_service import AnalyticsRollup
+from utils.cache import invalidate
 admin_bp = Blueprint('admin', __name__)
 
 """ Dashboard  """
@@ -12,52 +18,14 @@ admin_bp = Blueprint('admin', __name__)
 @admin_required
 def get_admin_dashboard():
     try:
-        # Get statistics
-        total_users = User.query.count()
-        total_students = User.query.filter_by(role=UserRole.STUDENT).count()
-        total_instructors = User.query.filter_by(role=UserRole.INSTRUCTOR).count()
-        master_categories = MasterCategory.query.count()
-        subcategories = SubCategory.query.count()
-        total_courses = Course.query.count()
-        published_courses = Course.query.filter_by(status=CourseStatus.PUBLISHED).count()
-        total_enrollments = Enrollment.query.filter_by(is_active=True).count()
-        
-        # Payment statistics
-        total_revenue = db.session.query(func.sum(Payment.amount)).filter_by(status=PaymentStatus.COMPLETED).scalar() or 0
-        this_month_revenue = db.session.query(func.sum(Payment.amount)).filter(
-            Payment.status == PaymentStatus.COMPLETED,
-            Payment.created_at >= datetime.utcnow().replace(day=1)
-        ).scalar() or 0
-        
-        # Recent activity
-        recent_users = User.query.order_by(User.created_at.desc()).limit(10).all()
-        recent_enrollments = Enrollment.query.order_by(Enrollment.enrolled_at.desc()).limit(10).all()
-        recent_payments = Payment.query.order_by(Payment.created_at.desc()).limit(10).all()
+        # Recomputed in the background every DASHBOARD_SNAPSHOT_SECONDS
+        snapshot, computed_at, age = dashboard_snapshot.get()
         
         return jsonify({
-            'statistics': {
-                'total_users': total_users,
-                'total_students': total_students,
-                'total_instructors': total_instructors,
-                'master_categories':master_categories,
-                'subcategories': subcategories,
-                'total_courses': total_courses,
-                'published_courses': published_courses,
-                'total_enrollments': total_enrollments,
-                'total_revenue': float(total_revenue),
-                'this_month_revenue': float(this_month_revenue)
-            },
-            'recent_activity': {
-                'users': [user.to_dict() for user in recent_users],
-                'enrollments': [
-                    {
-                        'enrollment': enrollment.to_dict(),
-                        'user': enrollment.user.to_dict(),
-                        'course': enrollment.course.to_dict()
-                    }
-                    for enrollment in recent_enrollments
-                ],
-                'payments': [payment.to_dict() for payment in recent_payments]
+            **snapshot,
+            'snapshot': {
+                'computed_at': computed_at.isoformat(),
+                'age_seconds': round(age, 1)
             }
         }), 200
         
@@ -69,8 +37,6 @@ def get_admin_dashboard():
 @admin_required
 def get_all_users():
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
         role = request.args.get('role')
         search = request.args.get('search')
         
@@ -89,22 +55,15 @@ def get_all_users():
                 )
             )
         
-        users = query.order_by(User.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        users = paginate(query, User.created_at, User.id)
         
         return jsonify({
             'users': [user.to_dict() for user in users.items],
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': users.total,
-                'pages': users.pages,
-                'has_next': users.has_next,
-                'has_prev': users.has_prev
-            }
+            'pagination': users.meta
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
@@ -119,9 +78,10 @@ def get_user_details(user_id):
         
         # Get user's enrollments
         enrollments = Enrollment.query.filter_by(user_id=user_id).all()
+        courses = CourseSerializer.dump_by_id(e.course_id for e in enrollments)
         enrollment_data = []
         for enrollment in enrollments:
-            course_data = enrollment.course.to_dict()
+            course_data = dict(courses[enrollment.course_id])
             course_data['enrollment'] = enrollment.to_dict()
             enrollment_data.append(course_data)
         
@@ -160,7 +120,11 @@ def update_user(user_id):
                 return jsonify({'error': 'Email already taken'}), 409
             user.email = data['email'].lower()
         if 'role' in data:
-            user.role = UserRole(data['role'])
+            role = UserRole(data['role'])
+            if role != user.role:
+                # Role-targeted broadcasts now differ
+                UnreadCounter().audience_changed([user.id])
+            user.role = role
         if 'is_active' in data:
             user.is_active = data['is_active']
         if 'phone' in data:
@@ -226,7 +190,7 @@ def get_all_courses():
         )
         
         return jsonify({
-            'courses': [course.to_dict() for course in courses.items],
+            'courses': CourseSerializer.dump_many(courses.items),
             'pagination': {
                 'page': page,
                 'per_page': per_page,
@@ -255,6 +219,7 @@ def update_course_status(course_id):
         
         course.status = CourseStatus(data['status'])
         db.session.commit()
+        invalidate('courses')
         
         return jsonify({
             'message': 'Course status updated successfully',
@@ -270,8 +235,6 @@ def update_course_status(course_id):
 @admin_required
 def get_all_payments():
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
         status = request.args.get('status')
         user_id = request.args.get('user_id', type=int)
         course_id = request.args.get('course_id', type=int)
@@ -287,30 +250,25 @@ def get_all_payments():
         if course_id:
             query = query.filter_by(course_id=course_id)
         
-        payments = query.order_by(Payment.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        payments = paginate(query, Payment.created_at, Payment.id)
         
         # Include user and course details
+        users = {u.id: u for u in User.query.filter(User.id.in_({p.user_id for p in payments.items})).all()}
+        courses = CourseSerializer.dump_by_id(p.course_id for p in payments.items)
         payment_data = []
         for payment in payments.items:
             payment_dict = payment.to_dict()
-            payment_dict['user'] = payment.user.to_dict()
-            payment_dict['course'] = payment.course.to_dict()
+            payment_dict['user'] = users[payment.user_id].to_dict()
+            payment_dict['course'] = courses.get(payment.course_id)
             payment_data.append(payment_dict)
         
         return jsonify({
             'payments': payment_data,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': payments.total,
-                'pages': payments.pages,
-                'has_next': payments.has_next,
-                'has_prev': payments.has_prev
-            }
+            'pagination': payments.meta
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -319,8 +277,6 @@ def get_all_payments():
 @admin_required
 def get_all_enrollments():
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
         course_id = request.args.get('course_id', type=int)
         user_id = request.args.get('user_id', type=int)
         
@@ -332,30 +288,25 @@ def get_all_enrollments():
         if user_id:
             query = query.filter_by(user_id=user_id)
         
-        enrollments = query.order_by(Enrollment.enrolled_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        enrollments = paginate(query, Enrollment.enrolled_at, Enrollment.id)
         
         # Include user and course details
+        users = {u.id: u for u in User.query.filter(User.id.in_({e.user_id for e in enrollments.items})).all()}
+        courses = CourseSerializer.dump_by_id(e.course_id for e in enrollments.items)
         enrollment_data = []
         for enrollment in enrollments.items:
             enrollment_dict = enrollment.to_dict()
-            enrollment_dict['user'] = enrollment.user.to_dict()
-            enrollment_dict['course'] = enrollment.course.to_dict()
+            enrollment_dict['user'] = users[enrollment.user_id].to_dict()
+            enrollment_dict['course'] = courses.get(enrollment.course_id)
             enrollment_data.append(enrollment_dict)
         
         return jsonify({
             'enrollments': enrollment_data,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': enrollments.total,
-                'pages': enrollments.pages,
-                'has_next': enrollments.has_next,
-                'has_prev': enrollments.has_prev
-            }
+            'pagination': enrollments.meta
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -363,42 +314,37 @@ def get_all_enrollments():
 @admin_bp.route('/analytics', methods=['GET'])
 @admin_required
 def get_analytics():
+    """Revenue, enrollments, completions and refunds per ``granularity``
+    (day, week or month) from the daily rollups, optionally limited to
+    ``start``/``end`` dates (inclusive, YYYY-MM-DD), a ``course_id`` or an
+    ``instructor_id``"""
     try:
-        # Revenue analytics
-        revenue_by_month = db.session.query(
-            func.date_trunc('month', Payment.created_at).label('month'),
-            func.sum(Payment.amount).label('revenue')
-        ).filter_by(status=PaymentStatus.COMPLETED).group_by('month').order_by('month').all()
-        
-        # Enrollment analytics
-        enrollments_by_month = db.session.query(
-            func.date_trunc('month', Enrollment.enrolled_at).label('month'),
-            func.count(Enrollment.id).label('enrollments')
-        ).group_by('month').order_by('month').all()
+        granularity = request.args.get('granularity', 'month')
+        start = request.args.get('start')
+        end = request.args.get('end')
+        start = date.fromisoformat(start) if start else None
+        end = date.fromisoformat(end) if end else None
+        
+        rollup = AnalyticsRollup()
+        series = rollup.series(
+            granularity, start, end,
+            course_id=request.args.get('course_id', type=int),
+            instructor_id=request.args.get('instructor_id', type=int)
+        )
         
         # Popular courses
         popular_courses = db.session.query(
             Course.id,
             Course.title,
-            func.count(Enrollment.id).label('enrollment_count')
-        ).join(Enrollment).group_by(Course.id, Course.title)\
-         .order_by(func.count(Enrollment.id).desc()).limit(10).all()
-        
-        return jsonify({
-            'revenue_by_month': [
-                {
-                    'month': revenue.month.strftime('%Y-%m'),
-                    'revenue': float(revenue.revenue)
-                }
-                for revenue in revenue_by_month
-            ],
-            'enrollments_by_month': [
-                {
-                    'month': enrollment.month.strftime('%Y-%m'),
-                    'enrollments': enrollment.enrollments
-                }
-                for enrollment in enrollments_by_month
-            ],
+            Course.enrolled_count.label('enrollment_count')
+        ).filter(Course.enrolled_count > 0)\
+         .order_by(Course.enrolled_count.desc()).limit(10).all()
+        
+        analytics = {
+            'granularity': granularity,
+            'series': series,
+            'top_courses': rollup.leaders('course', start, end),
+            'top_instructors': rollup.leaders('instructor', start, end),
             'popular_courses': [
                 {
                     'course_id': course.id,
@@ -407,11 +353,42 @@ def get_analytics():
                 }
                 for course in popular_courses
             ]
-        }), 200
+        }
+        if granularity == 'month':
+            analytics['revenue_by_month'] = [
+                {'month': period['period'], 'revenue': period['revenue']} for period in series
+            ]
+            analytics['enrollments_by_month'] = [
+                {'month': period['period'], 'enrollments': period['enrollments']} for period in series
+            ]
+        
+        return jsonify(analytics), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
+"""  Get Storage Usage   """
+@admin_bp.route('/storage', methods=['GET'])
+@admin_required
+def get_storage_stats():
+    """Stored files and bytes, optionally grouped by owner, course or mime_type"""
+    try:
+        file_service = FileService()
+        stats = file_service.get_upload_stats(
+            group_by=request.args.get('group_by'),
+            owner_id=request.args.get('owner_id', type=int),
+            course_id=request.args.get('course_id', type=int)
+        )
+        
+        return jsonify({'storage': stats}), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 """ Promote to Instructor """
 @admin_bp.route('/users/<int:user_id>/promote-instructor', methods=['POST'])
 @admin_required
@@ -425,6 +402,7 @@ def promote_to_instructor(user_id):
             return jsonify({'error': 'User is already an instructor'}), 400
         
         user.role = UserRole.INSTRUCTOR
+        UnreadCounter().audience_changed([user.id])
         db.session.commit()
         
         return jsonify({
@@ -10,6 +10,8 @@ from werkzeug.utils import secure_filename
 import requests 
 from config import Config
 from services.email_service import EmailService
+from services.token_service import revoked_tokens
+from auth import get_current_user
 
 email_service = EmailService()
 
@@ -80,6 +82,8 @@ def register():
         user.set_password(data['password'])
         
         db.session.add(user)
+        # Queued with the new account; delivered by flask deliver-emails
+        email_service.send_welcome_email(user)
         db.session.commit()
         
         # Create tokens
@@ -92,7 +96,6 @@ def register():
             'access_token': access_token,
             'refresh_token': refresh_token
         }
-        email_service.send_welcome_email(user)
         # ✅ jsonify makes it a Response object
         response = jsonify(response_data)
 
@@ -171,6 +174,7 @@ def logout():
         blacklisted_token = TokenBlacklist(jti=jti)
         db.session.add(blacklisted_token)
         db.session.commit()
+        revoked_tokens.add(jti, blacklisted_token.created_at)
         
         return jsonify({'message': 'Successfully logged out'}), 200
         
@@ -215,10 +219,9 @@ def change_password():
 """ Get Current Details   """
 @auth_bp.route('/me', methods=['GET'])
 @jwt_required()
-def get_current_user():
+def get_me():
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -4,7 +4,8 @@ from app import db
 from models import Certificate, Enrollment, Course, User
 from auth import get_current_user, admin_required
 from services.certificate_service import CertificateService
-import uuid
+from services.bulk_certificate_service import BulkCertificateService
+from services.certificate_verification import CertificateVerifier
 
 certificate_bp = Blueprint('certificates', __name__)
 
@@ -66,31 +67,7 @@ def generate_certificate(course_id):
         
         # Generate certificate
         course = Course.query.get(course_id)
-        certificate_service = CertificateService()
-        
-        # Generate unique certificate number
-        certificate_number = f"AIFA-{course_id}-{user.id}-{uuid.uuid4().hex[:8].upper()}"
-        
-        # Create certificate record
-        certificate = Certificate(
-            user_id=user.id,
-            course_id=course_id,
-            certificate_number=certificate_number
-        )
-        
-        db.session.add(certificate)
-        db.session.flush()  # Get the certificate ID
-        
-        # Generate PDF certificate
-        pdf_path = certificate_service.generate_certificate_pdf(
-            user=user,
-            course=course,
-            certificate=certificate
-        )
-        
-        # Update certificate with file path and verification URL
-        certificate.file_path = pdf_path
-        certificate.verification_url = f"/api/v1/certificates/verify/{certificate.certificate_number}"
+        certificate = CertificateService().issue_certificate(user, course)
         
         db.session.commit()
         
@@ -127,15 +104,13 @@ def download_certificate(certificate_id):
         
         from services.file_service import FileService
         file_service = FileService()
-
-        response_file = file_service.send_file(certificate.file_path, 
-            f"Certificate_{certificate.certificate_number}.pdf")
+        if not file_service.resolve_path(certificate.file_path):
+            return jsonify({'error': 'Certificate file not found'}), 404
         
         return file_service.send_file(
             certificate.file_path, 
             f"Certificate_{certificate.certificate_number}.pdf"
         )
-        # print(response_file)
 
         
     except Exception as e:
@@ -144,26 +119,28 @@ def download_certificate(certificate_id):
 """Verify Certificate"""
 @certificate_bp.route('/verify/<certificate_number>', methods=['GET'])
 def verify_certificate(certificate_number):
+    """Public verification. Forged signed numbers are rejected without a
+    database lookup, and genuine ones are served from a per-process cache."""
     try:
-        certificate = Certificate.query.filter_by(certificate_number=certificate_number).first()
+        verifier = CertificateVerifier()
+        payload = verifier.verify(certificate_number)
         
-        if not certificate:
-            return jsonify({
+        if not payload:
+            response = jsonify({
                 'valid': False,
                 'error': 'Certificate not found'
-            }), 404
+            })
+            # A forged signature never becomes valid; an unknown number might
+            forged = verifier.is_signed(certificate_number) and verifier.claims(certificate_number) is None
+            response.headers['Cache-Control'] = f"public, max-age={3600 if forged else 60}"
+            return response, 404
         
-        return jsonify({
+        response = jsonify({
             'valid': True,
-            'certificate': {
-                'certificate_number': certificate.certificate_number,
-                'issued_at': certificate.issued_at.isoformat(),
-                'user_name': f"{certificate.user.first_name} {certificate.user.last_name}",
-                'course_title': certificate.course.title,
-                'instructor_name': f"{certificate.course.instructor.first_name} {certificate.course.instructor.last_name}",
-                'issued_by': 'AI First Academy'
-            }
-        }), 200
+            'certificate': payload
+        })
+        response.headers['Cache-Control'] = 'public, max-age=300'
+        return response, 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -203,6 +180,7 @@ def regenerate_certificate(certificate_id):
         
         certificate.file_path = pdf_path
         db.session.commit()
+        CertificateVerifier().invalidate(certificate.id)
         
         return jsonify({
             'message': 'Certificate regenerated successfully',
@@ -261,6 +239,8 @@ def get_all_certificates():
 @certificate_bp.route('/admin/bulk-generate', methods=['POST'])
 @admin_required
 def bulk_generate_certificates():
+    """Queue certificate generation for every completed enrollment of a
+    course; poll the returned status URL for progress"""
     try:
         data = request.get_json()
         course_id = data.get('course_id')
@@ -272,67 +252,34 @@ def bulk_generate_certificates():
         if not course:
             return jsonify({'error': 'Course not found'}), 404
         
-        # Get all completed enrollments for this course that don't have certificates
-        completed_enrollments = db.session.query(Enrollment).filter(
-            Enrollment.course_id == course_id,
-            Enrollment.completed_at.isnot(None),
-            ~Enrollment.user_id.in_(
-                db.session.query(Certificate.user_id).filter_by(course_id=course_id)
-            )
-        ).all()
-        
-        if not completed_enrollments:
-            return jsonify({
-                'message': 'No eligible enrollments found for certificate generation',
-                'certificates_generated': 0
-            }), 200
-        
-        certificate_service = CertificateService()
-        certificates_generated = []
-        
-        for enrollment in completed_enrollments:
-            try:
-                # Generate unique certificate number
-                certificate_number = f"AIFA-{course_id}-{enrollment.user_id}-{uuid.uuid4().hex[:8].upper()}"
-                
-                # Create certificate record
-                certificate = Certificate(
-                    user_id=enrollment.user_id,
-                    course_id=course_id,
-                    certificate_number=certificate_number
-                )
-                
-                db.session.add(certificate)
-                db.session.flush()
-                
-                # Generate PDF certificate
-                pdf_path = certificate_service.generate_certificate_pdf(
-                    user=enrollment.user,
-                    course=course,
-                    certificate=certificate
-                )
-                
-                certificate.file_path = pdf_path
-                certificate.verification_url = f"/api/v1/certificates/verify/{certificate.certificate_number}"
-                
-                certificates_generated.append(certificate)
-                
-            except Exception as e:
-                print(f"Failed to generate certificate for user {enrollment.user_id}: {str(e)}")
-                continue
-        
+        bulk_service = BulkCertificateService()
+        job, created = bulk_service.start(course)
         db.session.commit()
         
         return jsonify({
-            'message': f'Bulk certificate generation completed',
-            'certificates_generated': len(certificates_generated),
-            'course_id': course_id,
+            'message': 'Bulk certificate generation queued' if created else 'Bulk certificate generation already in progress',
+            'status_url': f"/api/v1/certificates/admin/bulk-generate/{job.id}",
+            'job': bulk_service.status(job.id),
             'course_title': course.title
-        }), 201
+        }), 202
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
+
+""" Bulk certificate generation progress """
+@certificate_bp.route('/admin/bulk-generate/<int:job_id>', methods=['GET'])
+@admin_required
+def bulk_generate_status(job_id):
+    try:
+        status = BulkCertificateService().status(job_id)
+        if status is None:
+            return jsonify({'error': 'Bulk generation not found'}), 404
+        
+        return jsonify({'job': status}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
     
 """ Get certifications for the specific courses  """
 @certificate_bp.route('/course/<int:course_id>', methods=['GET'])
@@ -5,11 +5,19 @@ from models import Course, CourseModule, Lesson, User, Enrollment, UserRole, Cou
 from auth import get_current_user, instructor_required
 from utils.validators import validate_course_data
 from werkzeug.utils import secure_filename
-import uuid 
 import os 
 from models import db, LessonResource,CourseModule
 from datetime import datetime
 from services.file_service import FileService
+from serializers import CourseSerializer
+from services.search_service import CourseSearchIndex
+from services.progress_service import ProgressService
+from services.media_service import MediaService
+from services.blob_store import BlobStore
+from services.storage_index import StorageIndex
+from utils.pagination import paginate, InvalidCursor
+from utils.cache import invalidate
+from utils.decorators import cache_response
 course_bp = Blueprint('courses', __name__)
 
 
@@ -31,6 +39,7 @@ def allowed_file_lessons(filename, allowed_extensions):
 """Get courses such as archived, draft, published """
 # get courses 
 @course_bp.route('get-courses/', methods=['POST'])
+@cache_response(timeout=60, tags=('courses',), per_user=False)
 def get_courses():
     try:
         data = request.get_json()
@@ -48,8 +57,6 @@ def get_courses():
                 return {"error": f"Invalid status: {status}"}
 
         # Optional filters
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
         difficulty = request.args.get('difficulty')
         instructor_id = request.args.get('instructor_id', type=int)
         search = request.args.get('search')
@@ -60,33 +67,28 @@ def get_courses():
         if instructor_id:
             query = query.filter_by(instructor_id=instructor_id)
 
+        search_index = CourseSearchIndex()
         if search:
-            search_term = f"%{search}%"
-            query = query.filter(
-                db.or_(
-                    Course.title.ilike(search_term),
-                    Course.description.ilike(search_term),
-                    Course.short_description.ilike(search_term)
-                )
-            )
+            # Ranked by relevance first, newest first among equal matches
+            query = search_index.filter(query, search)
 
-        # Final query execution
-        courses = query.order_by(Course.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        # Final query execution; relevance ranking can't be expressed as a
+        # cursor, so searches stay on page numbers
+        courses = paginate(query, Course.created_at, Course.id, keyset=not search)
+
+        course_data = CourseSerializer.dump_many(courses.items)
+        if search:
+            snippets = search_index.snippets(search, [course.id for course in courses.items])
+            for item in course_data:
+                item['search_highlight'] = snippets.get(item['id'])
 
         return jsonify({
-            'courses': [course.to_dict() for course in courses.items],
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': courses.total,
-                'pages': courses.pages,
-                'has_next': courses.has_next,
-                'has_prev': courses.has_prev
-            }
+            'courses': course_data,
+            'pagination': courses.meta
         }), 200
 
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -96,13 +98,14 @@ def get_courses_all():
         courses = Course.query.order_by(Course.created_at.desc()).all()
 
         return jsonify({
-            "courses": [course.to_dict() for course in courses]
+            "courses": CourseSerializer.dump_many(courses)
         }), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
 @course_bp.route('/get-courses/<int:subcourse_id>', methods=['POST'])
+@cache_response(timeout=60, tags=('courses',), per_user=False)
 def get_courses_undersubcourse(subcourse_id):
     try:
         # Get the subcategory first
@@ -117,7 +120,7 @@ def get_courses_undersubcourse(subcourse_id):
 
         return jsonify({
             "subcategory": subcourse.to_dict() if hasattr(subcourse, "to_dict") else {"id": subcourse.id, "name": subcourse.name},
-            "courses": [course.to_dict(include_modules=True) for course in courses]
+            "courses": CourseSerializer.dump_many(courses, include_modules=True)
         }), 200
 
     except Exception as e:
@@ -198,14 +201,8 @@ def create_course():
 
     # Handle thumbnail upload if provided
     thumbnail_path = None
-    global UPLOAD_FOLDER
     if file and allowed_file(file.filename):  # Make sure `allowed_file` checks file extension
-        filename = secure_filename(file.filename)
-        unique_filename = f"{uuid.uuid4().hex}_{filename}"
-        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-        filepath = os.path.join(UPLOAD_FOLDER, unique_filename)
-        file.save(filepath)
-        thumbnail_path = filepath
+        thumbnail_path, _ = BlobStore(public=True).save(file, owner_id=user.id)
 
     
     # print(data.get('status'),CourseStatus(data['status']))
@@ -252,7 +249,12 @@ def create_course():
     )
 
     db.session.add(course)
+    db.session.flush()
+    if thumbnail_path:
+        StorageIndex().attribute(thumbnail_path, course_id=course.id)
+    CourseSearchIndex().index_course(course)
     db.session.commit()
+    invalidate('courses')
 
     return jsonify({
         'message': 'Course created successfully',
@@ -330,14 +332,11 @@ def update_course(course_id):
 
         # ✅ Handle thumbnail upload
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            unique_filename = f"{uuid.uuid4().hex}_{filename}"
-            os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-            filepath = os.path.join(UPLOAD_FOLDER, unique_filename)
-            file.save(filepath)
-            course.thumbnail = filepath
+            course.thumbnail, _ = BlobStore(public=True).save(file, owner_id=course.instructor_id, course_id=course.id)
 
+        CourseSearchIndex().index_course(course)
         db.session.commit()
+        invalidate('courses')
 
         return jsonify({
             'message': 'Course updated successfully',
@@ -365,11 +364,13 @@ def delete_course(course_id):
             return jsonify({'error': 'Unauthorized to delete this course'}), 403
         
         # Check if course has enrollments
-        if course.enrollments.count() > 0:
+        if course.enrolled_count > 0:
             return jsonify({'error': 'Cannot delete course with active enrollments'}), 400
         
+        CourseSearchIndex().remove_course(course.id)
         db.session.delete(course)
         db.session.commit()
+        invalidate('courses')
         
         return jsonify({'message': 'Course deleted successfully'}), 200
         
@@ -412,6 +413,7 @@ def create_module(course_id):
         
         db.session.add(module)
         db.session.commit()
+        invalidate('courses')
         
         return jsonify({
             'message': 'Module created successfully',
@@ -505,6 +507,7 @@ def update_module(course_id, module_id):
             module.is_preview = data['is_preview']
 
         db.session.commit()
+        invalidate('courses')
 
         return jsonify({
             'message': 'Module updated successfully',
@@ -532,8 +535,10 @@ def delete_module(course_id, module_id):
         if course.instructor_id != user.id and user.role != UserRole.ADMIN:
             return jsonify({'error': 'Unauthorized to delete this module'}), 403
 
+        ProgressService().lessons_removed(course_id, [lesson.id for lesson in module.lessons])
         db.session.delete(module)
         db.session.commit()
+        invalidate('courses')
 
         return jsonify({'message': 'Module deleted successfully'}), 200
 
@@ -580,45 +585,32 @@ def create_lesson(course_id, module_id):
         # Get next order number
         max_order = db.session.query(db.func.max(Lesson.order)).filter_by(module_id=module_id).scalar() or 0
 
-        # Build safe folder names
-        course_name = secure_filename(course.title)
-        module_name = secure_filename(module.title)
-        lesson_name = secure_filename(title)
-
         #case 1. local file upload 
         video_path = None
         if video_file and allowed_file_lessons(video_file.filename, ALLOWED_VIDEO_EXTENSIONS_LESSONS):
-            video_folder = os.path.join(UPLOAD_FOLDER, course_name, module_name, 'video')
-            os.makedirs(video_folder, exist_ok=True)
-            video_filename = f"{lesson_name}_{secure_filename(video_file.filename)}"
-            video_path = os.path.join(video_folder, video_filename)
-            video_file.save(video_path)
-        file_service = FileService()
-
-        duration_minutes = file_service.get_video_duration_minutes(video_path)
+            # Private, like resumable uploads: videos are only served through the
+            # enrollment-checked streaming route
+            video_path, _ = BlobStore().save(video_file, owner_id=course.instructor_id, course_id=course.id)
+
         # Case 2: YouTube or remote URL
         # elif request.form.get('video_url'):
         #     video_path = request.form.get('video_url')
-        # Create lesson entry
+        # Create lesson entry; duration is filled in by the probe_media job
         lesson = Lesson(
             module_id=module_id,
             title=title,
             content=content,
             video_url=video_path,
-            duration_minutes=duration_minutes,
             order=max_order + 1,
             is_preview=is_preview
         )
 
         db.session.add(lesson)
+        db.session.flush()
+        MediaService().enqueue_probe(lesson)
+        ProgressService().lessons_added(course_id)
         db.session.commit()
-
-        modules = CourseModule.query.all()
-
-        duration_minutes=sum([module.duration_minutes for module in modules ])
-        module.duration_minutes =  duration_minutes
-
-        db.session.commit()
+        invalidate('courses')
 
         return jsonify({
             'message': 'Lesson created successfully',
@@ -726,6 +718,7 @@ def update_lesson(course_id, module_id, lesson_id):
             lesson.is_preview = str(data['is_preview']).lower() == 'true'
 
         db.session.commit()
+        invalidate('courses')
 
         return jsonify({
             'message': 'Lesson updated successfully',
@@ -755,8 +748,10 @@ def delete_lesson(course_id, module_id, lesson_id):
         if course.instructor_id != user.id and user.role != UserRole.ADMIN:
             return jsonify({'error': 'Unauthorized to delete this lesson'}), 403
 
+        ProgressService().lessons_removed(course_id, [lesson.id])
         db.session.delete(lesson)
         db.session.commit()
+        invalidate('courses')
 
         return jsonify({'message': 'Lesson deleted successfully'}), 200
 
@@ -778,7 +773,7 @@ def get_my_courses():
             courses = Course.query.filter_by(instructor_id=user.id).all()
         
         return jsonify({
-            'courses': [course.to_dict(include_modules=True) for course in courses]
+            'courses': CourseSerializer.dump_many(courses, include_modules=True)
         }), 200
         
     except Exception as e:
@@ -809,6 +804,7 @@ def publish_course(course_id):
         
         course.status = CourseStatus.PUBLISHED
         db.session.commit()
+        invalidate('courses')
         
         return jsonify({
             'message': 'Course published successfully',
@@ -866,6 +862,7 @@ def get_course_enrollments(course_id):
 
 """ Get all courses   types = ["published", "draft", "archived"] """
 @course_bp.route('get-courses-master/', methods=['POST'])
+@cache_response(timeout=60, tags=('courses',), per_user=False)
 def get_courses_master():
     try:
         data = request.get_json()
@@ -881,8 +878,6 @@ def get_courses_master():
                 return {"error": f"Invalid status: {status}"}
 
         # Filters
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
         difficulty = request.args.get('difficulty')
         instructor_id = request.args.get('instructor_id', type=int)
         search = request.args.get('search')
@@ -893,33 +888,27 @@ def get_courses_master():
         if instructor_id:
             query = query.filter_by(instructor_id=instructor_id)
 
+        search_index = CourseSearchIndex()
         if search:
-            search_term = f"%{search}%"
-            query = query.filter(
-                db.or_(
-                    Course.title.ilike(search_term),
-                    Course.description.ilike(search_term),
-                    Course.short_description.ilike(search_term)
-                )
-            )
+            # Ranked by relevance first, newest first among equal matches
+            query = search_index.filter(query, search)
 
         # Pagination
-        courses = query.order_by(Course.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        courses = paginate(query, Course.created_at, Course.id, keyset=not search)
+
+        course_data = CourseSerializer.dump_many(courses.items)
+        if search:
+            snippets = search_index.snippets(search, [course.id for course in courses.items])
+            for item in course_data:
+                item['search_highlight'] = snippets.get(item['id'])
 
         return jsonify({
-            'courses': [course.to_dict() for course in courses.items],
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': courses.total,
-                'pages': courses.pages,
-                'has_next': courses.has_next,
-                'has_prev': courses.has_prev
-            }
+            'courses': course_data,
+            'pagination': courses.meta
         }), 200
 
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -940,6 +929,7 @@ def create_only_master_category():
         master = MasterCategory(name=data["name"].strip())
         db.session.add(master)
         db.session.commit()
+        invalidate('categories')
 
         return jsonify({
             "message": "MasterCategory created successfully",
@@ -989,6 +979,7 @@ def update_master_category_only(id):
 
         category.name = data["name"].strip()
         db.session.commit()
+        invalidate('categories')
 
         return jsonify({
             "message": "MasterCategory updated successfully",
@@ -1010,6 +1001,7 @@ def delete_master_category_only(id):
 
         db.session.delete(category)
         db.session.commit()
+        invalidate('categories', 'courses')
 
         return jsonify({
             "message": "MasterCategory deleted successfully",
@@ -1029,6 +1021,7 @@ def delete_master_category_only(id):
 # get full category → subcategory → courses hierarchy
 """Get all the Master Courses with sub categories  """
 @course_bp.route('mastercategories/', methods=['POST'])
+@cache_response(timeout=300, tags=('categories',), per_user=False)
 def get_master_categories():
     try:
         categories = MasterCategory.query.all()
@@ -1041,6 +1034,7 @@ def get_master_categories():
 
 """Get all the Master Course with specific id """
 @course_bp.route("/mastercategories/<int:category_id>", methods=["POST"])
+@cache_response(timeout=300, tags=('categories',), per_user=False)
 def get_master_category(category_id):
     try:
         category = MasterCategory.query.get_or_404(category_id)
@@ -1051,6 +1045,7 @@ def get_master_category(category_id):
 # ✅ GET all master categories with their subcategories
 """Get Master Categories with SubCategories"""
 @course_bp.route("/mastercourses_subcourses", methods=["POST"])
+@cache_response(timeout=300, tags=('categories',), per_user=False)
 def get_master_courses():
     try:
         masters = MasterCategory.query.all()
@@ -1095,6 +1090,7 @@ def create_master_category():
                 db.session.add(new_sub)
 
         db.session.commit()
+        invalidate('categories')
 
         return jsonify({"message": "MasterCategory created successfully", "category": master.to_dict()}), 201
 
@@ -1130,6 +1126,7 @@ def update_master_category(category_id):
                 db.session.add(new_sub)
 
         db.session.commit()
+        invalidate('categories')
         return jsonify({"message": "MasterCategory updated successfully", "category": category.to_dict()}), 200
 
     except Exception as e:
@@ -1148,6 +1145,7 @@ def delete_master_category(category_id):
 
         db.session.delete(category)
         db.session.commit()
+        invalidate('categories', 'courses')
         return jsonify({"message": "MasterCategory deleted successfully"}), 200
 
     except Exception as e:
@@ -1180,6 +1178,7 @@ def create_only_subcategory():
         )   
         db.session.add(subcategory)
         db.session.commit()
+        invalidate('categories')
 
         return jsonify({
             "message": "SubCategory created successfully",
@@ -1204,6 +1203,7 @@ def get_all_subcategories():
 # ✅ GET single subcategory by ID
 """ GET single subcategory by ID"""
 @course_bp.route("/only-subcategories/<int:subcategory_id>", methods=["GET"])
+@cache_response(timeout=60, tags=('categories', 'courses'), per_user=False)
 def get_subcategory(subcategory_id):
     try:
         subcategory = SubCategory.query.get_or_404(subcategory_id)
@@ -1232,6 +1232,7 @@ def update_subcategory(subcategory_id):
             subcategory.master_category_id = master.id
 
         db.session.commit()
+        invalidate('categories')
         return jsonify({
             "message": "SubCategory updated successfully",
             "subcategory": subcategory.to_dict()
@@ -1251,6 +1252,7 @@ def delete_subcategory(subcategory_id):
         subcategory = SubCategory.query.get_or_404(subcategory_id)
         db.session.delete(subcategory)
         db.session.commit()
+        invalidate('categories', 'courses')
         return jsonify({"message": "SubCategory deleted successfully"}), 200
     except Exception as e:
         db.session.rollback()
@@ -1259,6 +1261,7 @@ def delete_subcategory(subcategory_id):
 # ✅ GET all subcategories with their respective master categories
 """Get All Subcategories with their Master Categories"""
 @course_bp.route("/only-subcategories_alone", methods=["GET"])
+@cache_response(timeout=300, tags=('categories',), per_user=False)
 def get_all_subcategories_alone():
     try:
         subcategories = SubCategory.query.all()
@@ -1303,6 +1306,7 @@ def create_subcategory_with_courses():
 
         # Add Courses if provided
         if "courses" in data:
+            search_index = CourseSearchIndex()
             for c in data["courses"]:
                 new_course = Course(
                     title=c["title"],
@@ -1310,8 +1314,10 @@ def create_subcategory_with_courses():
                     subcategory_id=subcategory.id
                 )
                 db.session.add(new_course)
+                search_index.index_course(new_course)
 
         db.session.commit()
+        invalidate('courses', 'categories')
 
         return jsonify({
             "message": "SubCategory with courses created successfully",
@@ -1343,7 +1349,9 @@ def create_course_subcategory():
             subcategory_id=subcategory.id
         )
         db.session.add(course)
+        CourseSearchIndex().index_course(course)
         db.session.commit()
+        invalidate('courses', 'categories')
 
         return jsonify({
             "message": "Course created successfully",
@@ -1364,15 +1372,22 @@ def create_course_subcategory():
 
 """Get All Courses Details"""
 @course_bp.route("/categories-with-courses", methods=["PUT"])
+@cache_response(timeout=60, tags=('categories', 'courses'), per_user=False)
 def get_categories_with_courses():
     try:
         categories = MasterCategory.query.all()
         response = {}
 
+        # Serialize every course in one batch, then group them per subcategory
+        courses = Course.query.filter(Course.subcategory_id.isnot(None)).order_by(Course.id).all()
+        courses_by_subcategory = {}
+        for data, course in zip(CourseSerializer.dump_many(courses, include_modules=True), courses):
+            courses_by_subcategory.setdefault(course.subcategory_id, []).append(data)
+
         for category in categories:
             sub_dict = {}
             for sub in category.subcategories:
-                sub_dict[sub.name] = [course.to_dict(include_modules=True) for course in sub.courses]
+                sub_dict[sub.name] = courses_by_subcategory.get(sub.id, [])
             response[category.name] = sub_dict
 
         return jsonify({
@@ -1438,27 +1453,26 @@ def create_lesson_resource():
         if not allowed_file(file.filename):
             return jsonify({"error": "File type not allowed"}), 400
 
-        # 4️⃣ Create safe unique filename
+        # 4️⃣ Save file (identical files are stored once)
         filename = secure_filename(file.filename)
         extension = filename.rsplit(".", 1)[1].lower()
-        unique_filename = f"{course.id}_{module.id}_{lesson.id}_{title.replace(' ', '_')}.{extension}"
-
-        # 5️⃣ Save file
-        file_path = os.path.join(UPLOAD_FOLDER, unique_filename)
-        file.save(file_path)
+        file_path, file_size = BlobStore(public=True).save(file, filename, owner_id=course.instructor_id, course_id=course.id)
 
-        # 6️⃣ Create DB entry
+        # 5️⃣ Create DB entry
         resource = LessonResource(
             lesson_id=lesson.id,
             title=title,
-            file_path=file_path.replace("\\", "/"),
+            file_path=file_path,
             file_type=extension,
-            file_size=os.path.getsize(file_path),
+            file_size=file_size,
             created_at=datetime.utcnow()
         )
 
         db.session.add(resource) 
+        db.session.flush()
+        MediaService().enqueue_probe(resource)
         db.session.commit()
+        invalidate('courses')
     
         # Optional: Include course/module details in response
         response_data = resource.to_dict()
@@ -1544,25 +1558,22 @@ def update_resource(resource_id):
         if "file" in request.files:
             file = request.files["file"]
             if file.filename != "" and allowed_file(file.filename):
-                # Delete old file
-                if os.path.exists(resource.file_path):
-                    os.remove(resource.file_path)
-
-                course_id = request.form.get("course_id", "course")
-                module_id = request.form.get("module_id", "module")
+                # Delete old file (a stored blob is released once the
+                # resource stops pointing at it)
+                FileService().delete_file(resource.file_path)
 
                 filename = secure_filename(file.filename)
                 ext = filename.rsplit(".", 1)[1].lower()
-                unique_filename = f"{course_id}_{module_id}_{resource.lesson_id}_{title.replace(' ', '_')}.{ext}"
-
-                file_path = os.path.join(UPLOAD_FOLDER, unique_filename)
-                file.save(file_path)
 
-                resource.file_path = file_path.replace("\\", "/")
+                course = resource.lesson.module.course
+                resource.file_path, resource.file_size = BlobStore(public=True).save(
+                    file, filename, owner_id=course.instructor_id, course_id=course.id
+                )
                 resource.file_type = ext
-                resource.file_size = os.path.getsize(file_path)
+                MediaService().enqueue_probe(resource)
 
         db.session.commit()
+        invalidate('courses')
         return jsonify(resource.to_dict()), 200
 
     except Exception as e:
@@ -1581,12 +1592,13 @@ def delete_resource(resource_id):
         if not resource:
             return jsonify({"error": "Resource not found"}), 404
 
-        # Delete file from disk
-        if resource.file_path and os.path.exists(resource.file_path):
-            os.remove(resource.file_path)
+        # Delete file from disk (stored blobs are released with the row)
+        FileService().delete_file(resource.file_path)
 
+        course_id = resource.lesson.module.course_id
         db.session.delete(resource)
         db.session.commit()
+        invalidate('courses')
 
         return jsonify({"message": "Resource deleted successfully"}), 200
 
@@ -1,15 +1,20 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, send_file, current_app
 from flask_jwt_extended import jwt_required
 from werkzeug.utils import secure_filename
+from werkzeug.http import parse_content_range_header
 from app import db
-from models import LessonResource, Lesson, Course, Enrollment
+from models import LessonResource, Lesson, Course, CourseModule, Enrollment, UploadSession, UserRole
 from auth import get_current_user, instructor_required
 from services.file_service import FileService
+from services.media_service import MediaService
+from services.upload_service import UploadService, UploadOffsetConflict, LESSON_VIDEO, LESSON_RESOURCE
+from utils.cache import invalidate
 import os
 
 file_bp = Blueprint('files', __name__)
 
 ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'mp4', 'mp3', 'wav', 'doc', 'docx', 'ppt', 'pptx'}
+ALLOWED_VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv'}
 
 def allowed_file(filename):
     return '.' in filename and \
@@ -48,7 +53,9 @@ def upload_file():
         
         if file and allowed_file(file.filename):
             file_service = FileService()
-            file_path, file_size = file_service.save_file(file, 'lesson_resources')
+            file_path, file_size = file_service.save_file(
+                file, owner_id=course.instructor_id, course_id=course.id
+            )
             
             # Create lesson resource record
             resource = LessonResource(
@@ -60,6 +67,8 @@ def upload_file():
             )
             
             db.session.add(resource)
+            db.session.flush()
+            MediaService().enqueue_probe(resource)
             db.session.commit()
             
             return jsonify({
@@ -114,7 +123,45 @@ def download_file(resource_id):
             return jsonify({'error': 'Access denied. Please enroll in the course first.'}), 403
         
         file_service = FileService()
-        return file_service.send_file(resource.file_path, resource.title)
+        if not file_service.resolve_path(resource.file_path):
+            return jsonify({'error': 'File not found'}), 404
+        
+        # Media plays inline; ?download=1 forces an attachment
+        inline = False if request.args.get('download') == '1' else None
+        return file_service.send_file(resource.file_path, resource.title, inline=inline)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# stream lesson video 
+@file_bp.route('/lessons/<int:lesson_id>/video', methods=['GET'])
+@jwt_required()
+def stream_lesson_video(lesson_id):
+    """Serve a lesson's video with Range support, so players can seek"""
+    try:
+        user = get_current_user()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        lesson = Lesson.query.get(lesson_id)
+        if not lesson or not lesson.video_url:
+            return jsonify({'error': 'Video not found'}), 404
+        
+        course = lesson.module.course
+        if user.role != UserRole.ADMIN and course.instructor_id != user.id:
+            enrollment = Enrollment.query.filter_by(
+                user_id=user.id,
+                course_id=course.id,
+                is_active=True
+            ).first()
+            if not enrollment:
+                return jsonify({'error': 'Access denied. Please enroll in the course first.'}), 403
+        
+        file_service = FileService()
+        if not file_service.resolve_path(lesson.video_url):
+            return jsonify({'error': 'Video not found'}), 404
+        
+        return file_service.send_file(lesson.video_url, lesson.title, inline=True)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -150,7 +197,9 @@ def upload_course_thumbnail():
         # Check if file is an image
         if file and file.filename.rsplit('.', 1)[1].lower() in {'png', 'jpg', 'jpeg', 'gif'}:
             file_service = FileService()
-            file_path, file_size = file_service.save_file(file, 'course_thumbnails')
+            file_path, file_size = file_service.save_file(
+                file, owner_id=course.instructor_id, course_id=course.id
+            )
             
             # Update course thumbnail
             course.thumbnail = file_path
@@ -186,7 +235,7 @@ def upload_profile_picture():
         # Check if file is an image
         if file and file.filename.rsplit('.', 1)[1].lower() in {'png', 'jpg', 'jpeg', 'gif'}:
             file_service = FileService()
-            file_path, file_size = file_service.save_file(file, 'profile_pictures')
+            file_path, file_size = file_service.save_file(file, owner_id=user.id)
             
             # Update user profile picture
             user.profile_picture = file_path
@@ -281,3 +330,206 @@ def delete_resource(resource_id):
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
+
+
+# Resumable uploads
+#
+#   POST   /uploads                  start a session, returns upload_id
+#   PUT    /uploads/<id>             one chunk; Content-Range: bytes start-end/total,
+#                                    optional X-Chunk-SHA256 of the chunk
+#   GET    /uploads/<id>             current offset (also HEAD, Upload-Offset header)
+#   POST   /uploads/<id>/complete    create the lesson or resource
+#   DELETE /uploads/<id>             abandon the upload
+
+def _upload_response(session, status=200):
+    response = jsonify(session.to_dict())
+    response.status_code = status
+    response.headers['Upload-Offset'] = str(session.received_bytes)
+    response.headers['Upload-Length'] = str(session.total_size)
+    return response
+
+def _owned_upload(upload_id):
+    """The upload session, or an error response if it isn't the caller's"""
+    session = db.session.get(UploadSession, upload_id)
+    if not session:
+        return None, (jsonify({'error': 'Upload not found'}), 404)
+    
+    user = get_current_user()
+    if session.user_id != user.id and user.role != UserRole.ADMIN:
+        return None, (jsonify({'error': 'Unauthorized to access this upload'}), 403)
+    return session, None
+
+@file_bp.route('/uploads', methods=['POST'])
+@instructor_required
+def create_upload():
+    try:
+        user = get_current_user()
+        data = request.get_json() or {}
+        
+        kind = data.get('kind')
+        filename = data.get('filename') or ''
+        title = data.get('title')
+        try:
+            total_size = int(data.get('total_size'))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'total_size is required'}), 400
+        
+        max_size = current_app.config.get('UPLOAD_MAX_BYTES')
+        if total_size <= 0 or (max_size and total_size > max_size):
+            return jsonify({'error': f'total_size must be between 1 and {max_size} bytes'}), 400
+        
+        module = lesson = None
+        if kind == LESSON_VIDEO:
+            if not title:
+                return jsonify({'error': 'Lesson title is required'}), 400
+            if not allowed_file(filename) or filename.rsplit('.', 1)[1].lower() not in ALLOWED_VIDEO_EXTENSIONS:
+                return jsonify({'error': 'Video type not allowed'}), 400
+            module = db.session.get(CourseModule, data.get('module_id'))
+            if not module or str(module.course_id) != str(data.get('course_id')):
+                return jsonify({'error': 'Course or module not found'}), 404
+            course = module.course
+        elif kind == LESSON_RESOURCE:
+            if not allowed_file(filename):
+                return jsonify({'error': 'File type not allowed'}), 400
+            lesson = db.session.get(Lesson, data.get('lesson_id'))
+            if not lesson:
+                return jsonify({'error': 'Lesson not found'}), 404
+            course = lesson.module.course
+        else:
+            return jsonify({'error': f'kind must be {LESSON_VIDEO} or {LESSON_RESOURCE}'}), 400
+        
+        if course.instructor_id != user.id and user.role != UserRole.ADMIN:
+            return jsonify({'error': 'Unauthorized to modify this course'}), 403
+        
+        session = UploadService().create(
+            user.id, kind, course,
+            module=module,
+            lesson=lesson,
+            filename=filename,
+            total_size=total_size,
+            title=title or filename,
+            content=data.get('content'),
+            is_preview=bool(data.get('is_preview', False)),
+            sha256=data.get('sha256')
+        )
+        db.session.commit()
+        
+        response = _upload_response(session, 201)
+        response.headers['Location'] = f"{request.path}/{session.id}"
+        response.headers['Upload-Chunk-Max-Size'] = str(current_app.config.get('UPLOAD_CHUNK_MAX_BYTES'))
+        return response
+        
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@file_bp.route('/uploads/<upload_id>', methods=['GET'])
+@instructor_required
+def get_upload(upload_id):
+    try:
+        session, error = _owned_upload(upload_id)
+        if error:
+            return error
+        
+        return _upload_response(session)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@file_bp.route('/uploads/<upload_id>', methods=['PUT'])
+@instructor_required
+def upload_chunk(upload_id):
+    try:
+        session, error = _owned_upload(upload_id)
+        if error:
+            return error
+        
+        # The body is read from request.stream straight into the file; never
+        # touch request.data/form here, that would buffer the whole chunk
+        length = request.content_length
+        if length is None:
+            return jsonify({'error': 'Content-Length is required'}), 411
+        max_chunk = current_app.config.get('UPLOAD_CHUNK_MAX_BYTES')
+        if max_chunk and length > max_chunk:
+            return jsonify({'error': f'Chunks are limited to {max_chunk} bytes'}), 413
+        
+        content_range = parse_content_range_header(request.headers.get('Content-Range'))
+        if (not content_range or content_range.units != 'bytes'
+                or content_range.stop - content_range.start != length
+                or content_range.length not in (None, session.total_size)):
+            return jsonify({'error': 'A Content-Range of bytes start-end/total matching the body is required'}), 400
+        
+        try:
+            UploadService().write(
+                session, content_range.start, request.stream, length,
+                chunk_sha256=request.headers.get('X-Chunk-SHA256')
+            )
+        except UploadOffsetConflict as e:
+            db.session.rollback()
+            response = jsonify({'error': str(e), 'offset': e.offset})
+            response.status_code = 409
+            response.headers['Upload-Offset'] = str(e.offset)
+            return response
+        db.session.commit()
+        
+        return _upload_response(session)
+        
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@file_bp.route('/uploads/<upload_id>/complete', methods=['POST'])
+@instructor_required
+def complete_upload(upload_id):
+    try:
+        session, error = _owned_upload(upload_id)
+        if error:
+            return error
+        
+        try:
+            record = UploadService().complete(session)
+        except UploadOffsetConflict as e:
+            db.session.rollback()
+            return jsonify({'error': 'Upload is incomplete', 'offset': e.offset}), 409
+        db.session.commit()
+        invalidate('courses')
+        
+        key = 'lesson' if session.kind == LESSON_VIDEO else 'resource'
+        return jsonify({
+            'message': 'Upload completed successfully',
+            'upload': session.to_dict(),
+            key: record.to_dict()
+        }), 201
+        
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@file_bp.route('/uploads/<upload_id>', methods=['DELETE'])
+@instructor_required
+def abort_upload(upload_id):
+    try:
+        session, error = _owned_upload(upload_id)
+        if error:
+            return error
+        
+        UploadService().abort(session)
+        db.session.commit()
+        
+        return jsonify({'message': 'Upload aborted'}), 200
+        
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
@@ -4,7 +4,10 @@ from app import db
 from models import LiveSession, Course, User, Enrollment, UserRole
 from auth import get_current_user, instructor_required
 from datetime import datetime, timedelta,timezone
+from sqlalchemy.orm import joinedload
+from utils.pagination import paginate, InvalidCursor
 from services.email_service import EmailService
+from services.notification_service import announce_live_session, schedule_live_session_reminder
 
 live_session_bp = Blueprint('live_sessions', __name__)
 
@@ -18,8 +21,6 @@ def get_live_sessions():
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
         course_id = request.args.get('course_id', type=int)
         upcoming_only = request.args.get('upcoming_only', 'false').lower() == 'true'
         
@@ -41,9 +42,7 @@ def get_live_sessions():
         if upcoming_only:
             query = query.filter(LiveSession.scheduled_at > datetime.utcnow())
         
-        sessions = query.order_by(LiveSession.scheduled_at.asc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        sessions = paginate(query, LiveSession.scheduled_at, LiveSession.id, descending=False)
         
         session_data = []
         for session in sessions.items:
@@ -53,16 +52,11 @@ def get_live_sessions():
         
         return jsonify({
             'live_sessions': session_data,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': sessions.total,
-                'pages': sessions.pages,
-                'has_next': sessions.has_next,
-                'has_prev': sessions.has_prev
-            }
+            'pagination': sessions.meta
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -118,22 +112,25 @@ def create_live_session():
         )
         
         db.session.add(live_session)
-        db.session.commit()
+        db.session.flush()
         
-        # Send notifications to enrolled students
-        try:
-            email_service = EmailService()
-            enrollments = Enrollment.query.filter_by(course_id=course_id, is_active=True).all()
-            
-            for enrollment in enrollments:
-                email_service.send_live_session_notification(
-                    user=enrollment.user,
-                    course=course,
-                    session=live_session
-                )
-        except Exception as e:
-            # Log email error but don't fail the session creation
-            print(f"Failed to send session notifications: {str(e)}")
+        # Pushed to students' open streams on commit, reminded before it starts
+        announce_live_session(live_session)
+        
+        # Queue notifications to enrolled students with the session;
+        # delivered by flask deliver-emails
+        email_service = EmailService()
+        enrollments = Enrollment.query.filter_by(course_id=course_id, is_active=True)\
+            .options(joinedload(Enrollment.user)).all()
+        
+        for enrollment in enrollments:
+            email_service.send_live_session_notification(
+                user=enrollment.user,
+                course=course,
+                session=live_session
+            )
+        
+        db.session.commit()
         
         return jsonify({
             'message': 'Live session created successfully',
@@ -218,6 +215,7 @@ def update_live_session(session_id):
                 if scheduled_at <= datetime.utcnow():
                     return jsonify({'error': 'Scheduled time must be in the future'}), 400
                 session.scheduled_at = scheduled_at
+                schedule_live_session_reminder(session)
             except ValueError:
                 return jsonify({'error': 'Invalid scheduled_at format. Use ISO format.'}), 400
         if 'duration_minutes' in data:
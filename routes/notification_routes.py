@@ -1,9 +1,17 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required
+import time
+from flask import Blueprint, Response, request, jsonify, stream_with_context, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import select
 from app import db
-from models import Notification, User
+from models import Notification, User, UserRole, Course, Enrollment
 from auth import get_current_user, admin_required
 from services.email_service import EmailService
+from services.notification_service import (
+    NotificationFeed, UnreadCounter, feed_item_to_dict, broadcast_audience, send_notifications, send_broadcast,
+    UNREAD_CHANGED
+)
+from utils.event_hub import event_hub, format_event, TooManySubscriptions
+from utils.pagination import paginate, InvalidCursor
 
 notification_bp = Blueprint('notifications', __name__)
 
@@ -17,32 +25,20 @@ def get_notifications():
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
         unread_only = request.args.get('unread_only', 'false').lower() == 'true'
         
-        query = Notification.query.filter_by(user_id=user.id)
-        
-        if unread_only:
-            query = query.filter_by(is_read=False)
-        
-        notifications = query.order_by(Notification.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        # Personal notifications and the broadcasts addressed to the user
+        feed = NotificationFeed(user)
+        notifications = paginate(feed.query(unread_only), feed.items.c.created_at, feed.items.c.feed_key)
         
         return jsonify({
-            'notifications': [notification.to_dict() for notification in notifications.items],
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': notifications.total,
-                'pages': notifications.pages,
-                'has_next': notifications.has_next,
-                'has_prev': notifications.has_prev
-            },
-            'unread_count': Notification.query.filter_by(user_id=user.id, is_read=False).count()
+            'notifications': [feed_item_to_dict(item, user) for item in notifications.items],
+            'pagination': notifications.meta,
+            'unread_count': feed.unread_count()
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
@@ -61,7 +57,7 @@ def mark_notification_read(notification_id):
         if not notification or notification.user_id != user.id:
             return jsonify({'error': 'Notification not found'}), 404
         
-        notification.is_read = True
+        NotificationFeed(user).mark_read(notification)
         db.session.commit()
         
         return jsonify({
@@ -83,7 +79,7 @@ def mark_all_notifications_read():
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        Notification.query.filter_by(user_id=user.id, is_read=False).update({'is_read': True})
+        NotificationFeed(user).mark_all_read()
         db.session.commit()
         
         return jsonify({'message': 'All notifications marked as read'}), 200
@@ -106,7 +102,63 @@ def delete_notification(notification_id):
         if not notification or notification.user_id != user.id:
             return jsonify({'error': 'Notification not found'}), 404
         
-        db.session.delete(notification)
+        NotificationFeed(user).delete(notification)
+        db.session.commit()
+        
+        return jsonify({'message': 'Notification deleted successfully'}), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+# mark a broadcast as read
+""" mark a broadcast as read """
+@notification_bp.route('/broadcasts/<int:broadcast_id>/read', methods=['PUT'])
+@jwt_required()
+def mark_broadcast_read(broadcast_id):
+    try:
+        user = get_current_user()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        feed = NotificationFeed(user)
+        broadcast = feed.get_broadcast(broadcast_id)
+        if not broadcast:
+            return jsonify({'error': 'Notification not found'}), 404
+        
+        receipt = feed.mark_broadcast_read(broadcast)
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Notification marked as read',
+            'notification': {
+                **broadcast.to_dict(),
+                'source': 'broadcast',
+                'user_id': user.id,
+                'is_read': receipt.read_at is not None
+            }
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+# dismiss a broadcast from the user's feed
+""" dismiss a broadcast from the user's feed """
+@notification_bp.route('/broadcasts/<int:broadcast_id>', methods=['DELETE'])
+@jwt_required()
+def delete_broadcast(broadcast_id):
+    try:
+        user = get_current_user()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        feed = NotificationFeed(user)
+        broadcast = feed.get_broadcast(broadcast_id)
+        if not broadcast:
+            return jsonify({'error': 'Notification not found'}), 404
+        
+        feed.dismiss_broadcast(broadcast)
         db.session.commit()
         
         return jsonify({'message': 'Notification deleted successfully'}), 200
@@ -145,27 +197,12 @@ def send_notification():
         if not users:
             return jsonify({'error': 'No valid users found'}), 400
         
-        notifications_created = []
-        email_service = EmailService() if send_email else None
+        # Create notifications; pushed to open streams once committed
+        notifications_created = send_notifications(users, title, message, notification_type)
         
-        for user in users:
-            # Create notification
-            notification = Notification(
-                user_id=user.id,
-                title=title,
-                message=message,
-                type=notification_type
-            )
-            db.session.add(notification)
-            notifications_created.append(notification)
-            
-            # Send email if requested
-            if send_email and email_service:
-                try:
-                    email_service.send_notification_email(user, title, message)
-                except Exception as e:
-                    # Log email error but don't fail the whole operation
-                    print(f"Failed to send email to {user.email}: {str(e)}")
+        # Queue emails if requested; delivered by flask deliver-emails
+        if send_email:
+            EmailService().send_bulk_notification_email(users, title, message)
         
         db.session.commit()
         
@@ -198,46 +235,38 @@ def broadcast_notification():
         notification_type = data.get('type', 'general')
         send_email = data.get('send_email', False)
         user_role = data.get('user_role')  # optional: target specific role
+        course_id = data.get('course_id')  # optional: target a course's students
+        
+        try:
+            target_role = UserRole(user_role) if user_role else None
+        except ValueError:
+            return jsonify({'error': 'Invalid user_role'}), 400
+        
+        if course_id is not None and not db.session.get(Course, course_id):
+            return jsonify({'error': 'Course not found'}), 404
+        
+        # Stored once; merged into each recipient's feed when they read it
+        broadcast = send_broadcast(
+            title, message, notification_type,
+            target_role=target_role,
+            course_id=course_id,
+            created_by=get_current_user().id
+        )
         
-        # Get target users
-        query = User.query.filter_by(is_active=True)
-        if user_role:
-            from models import UserRole
-            query = query.filter_by(role=UserRole(user_role))
-        
-        users = query.all()
-        
-        if not users:
-            return jsonify({'error': 'No users found to send notifications to'}), 400
-        
-        notifications_created = []
-        email_service = EmailService() if send_email else None
-        
-        for user in users:
-            # Create notification
-            notification = Notification(
-                user_id=user.id,
-                title=title,
-                message=message,
-                type=notification_type
+        # Queue emails if requested; delivered by flask deliver-emails
+        emails_queued = 0
+        if send_email:
+            emails_queued = EmailService().send_bulk_notification_email(
+                broadcast_audience(broadcast, User.email), title, message
             )
-            db.session.add(notification)
-            notifications_created.append(notification)
-            
-            # Send email if requested
-            if send_email and email_service:
-                try:
-                    email_service.send_notification_email(user, title, message)
-                except Exception as e:
-                    # Log email error but don't fail the whole operation
-                    print(f"Failed to send email to {user.email}: {str(e)}")
         
         db.session.commit()
         
         return jsonify({
-            'message': f'Broadcast notification sent to {len(notifications_created)} users',
-            'notifications_sent': len(notifications_created),
+            'message': 'Broadcast notification sent',
+            'broadcast': broadcast.to_dict(),
             'email_sent': send_email,
+            'emails_queued': emails_queued,
             'target_role': user_role or 'all'
         }), 201
         
@@ -250,17 +279,106 @@ def broadcast_notification():
 @notification_bp.route('/unread-count', methods=['GET'])
 @jwt_required()
 def get_unread_count():
+    """Polled by every open tab: served from the cached counter without
+    loading the user, and answered 304 while the count is unchanged"""
     try:
-        user = get_current_user()
-        if not user:
+        user_id = int(get_jwt_identity())
+        unread_count = UnreadCounter().value(user_id)
+        if unread_count is None:
             return jsonify({'error': 'User not found'}), 404
         
-        unread_count = Notification.query.filter_by(user_id=user.id, is_read=False).count()
+        response = jsonify({'unread_count': unread_count})
+        response.set_etag(f"{user_id}-{unread_count}")
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response.make_conditional(request)
         
-        return jsonify({'unread_count': unread_count}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# notification event stream
+""" notification event stream """
+@notification_bp.route('/stream', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+def notification_stream():
+    """Server-sent events: ``notification``, ``unread_count``,
+    ``live_session`` and ``live_session_reminder``, replacing the list and
+    unread-count polls. EventSource can't send headers, so the token may be
+    passed as ``?jwt=``. Reconnects resume from ``Last-Event-ID``; a
+    ``resync`` event means events were missed and the client should refetch.
+
+    The database is only touched while connecting and to refresh the unread
+    count, so an idle stream holds a worker thread but no connection.
+    Streams close after ``SSE_MAX_STREAM_SECONDS`` and the client reconnects.
+    A worker holding ``SSE_MAX_STREAMS`` streams answers 503 with a retry
+    hint.
+    """
+    try:
+        user = get_current_user()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
         
+        user_id = user.id
+        course_ids = db.session.execute(
+            select(Enrollment.course_id).where(Enrollment.user_id == user_id, Enrollment.is_active == True)
+        ).scalars().all()
+        unread_count = UnreadCounter().value(user_id, user)
+        subscription, missed = event_hub.subscribe(
+            user_id, user.role.value, course_ids,
+            last_event_id=request.headers.get('Last-Event-ID') or request.args.get('last_event_id'),
+            limit=current_app.config.get('SSE_MAX_STREAMS')
+        )
+        db.session.remove()
+        
+    except TooManySubscriptions:
+        # Leave threads for ordinary requests; the client retries later
+        retry = current_app.config.get('SSE_BUSY_RETRY_SECONDS', 30)
+        return Response(f"retry: {retry * 1000}\n\n", status=503, mimetype='text/event-stream', headers={
+            'Retry-After': str(retry),
+            'Cache-Control': 'no-cache'
+        })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    
+    heartbeat = current_app.config.get('SSE_HEARTBEAT_SECONDS', 15)
+    max_seconds = current_app.config.get('SSE_MAX_STREAM_SECONDS', 300)
+    
+    def events():
+        try:
+            yield f"retry: {current_app.config.get('SSE_RETRY_MILLISECONDS', 3000)}\n\n"
+            if missed is None:
+                yield format_event('resync', {})
+            messages = missed or []
+            sent_count = None
+            deadline = time.monotonic() + max_seconds
+            while True:
+                for message in messages:
+                    if message['event'] != UNREAD_CHANGED:
+                        yield format_event(message['event'], message['data'], message['id'])
+                
+                if messages or sent_count is None:
+                    count = unread_count if sent_count is None else UnreadCounter().value(user_id)
+                    # Give the connection back while the stream waits
+                    db.session.remove()
+                    if count != sent_count:
+                        yield format_event('unread_count', {'unread_count': count})
+                        sent_count = count
+                
+                if subscription.overflowed:
+                    yield format_event('resync', {})
+                    return
+                if time.monotonic() >= deadline:
+                    return
+                
+                messages = subscription.get(timeout=min(heartbeat, max(deadline - time.monotonic(), 0)))
+                if not messages:
+                    yield ": keepalive\n\n"
+        finally:
+            subscription.close()
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
 
 # notification settings 
 """ Get notification settings """
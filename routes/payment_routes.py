@@ -1,9 +1,14 @@
+from decimal import Decimal
 from flask import Blueprint, request, jsonify, redirect
 from flask_jwt_extended import jwt_required
+from sqlalchemy import update
 from app import db
 from models import Payment, Course, Enrollment, PaymentStatus, User
 from auth import get_current_user
 from services.payment_service import PaymentService
+from services.enrollment_service import EnrollmentService
+from services.analytics_service import AnalyticsRollup
+from utils.pagination import paginate, InvalidCursor
 import os
 
 payment_bp = Blueprint('payments', __name__)
@@ -98,17 +103,12 @@ def payment_success(payment_id):
         session = payment_service.get_checkout_session(payment.stripe_session_id)
         
         if session.payment_status == 'paid':
-            # Update payment status
-            payment.status = PaymentStatus.COMPLETED
-            payment.stripe_payment_intent_id = session.payment_intent
+            # Update payment status; the webhook may have got here first
+            if _mark_completed(payment, session.payment_intent):
+                AnalyticsRollup().payment_completed(payment)
             
             # Create enrollment
-            enrollment = Enrollment(
-                user_id=user.id,
-                course_id=payment.course_id
-            )
-            
-            db.session.add(enrollment)
+            enrollment, _ = EnrollmentService().enroll(user.id, payment.course_id)
             db.session.commit()
             
             return jsonify({
@@ -164,21 +164,11 @@ def stripe_webhook():
             payment = Payment.query.filter_by(stripe_session_id=session['id']).first()
             
             if payment:
-                payment.status = PaymentStatus.COMPLETED
-                payment.stripe_payment_intent_id = session.get('payment_intent')
-                
-                # Create enrollment if not exists
-                existing_enrollment = Enrollment.query.filter_by(
-                    user_id=payment.user_id,
-                    course_id=payment.course_id
-                ).first()
+                if _mark_completed(payment, session.get('payment_intent')):
+                    AnalyticsRollup().payment_completed(payment)
                 
-                if not existing_enrollment:
-                    enrollment = Enrollment(
-                        user_id=payment.user_id,
-                        course_id=payment.course_id
-                    )
-                    db.session.add(enrollment)
+                # Create (or reactivate) the enrollment
+                EnrollmentService().enroll(payment.user_id, payment.course_id)
                 
                 db.session.commit()
         
@@ -192,11 +182,43 @@ def stripe_webhook():
                 payment.status = PaymentStatus.FAILED
                 db.session.commit()
         
+        elif event['type'] == 'charge.refunded':
+            charge = event['data']['object']
+            
+            # Find payment by payment intent, locked so a redelivered or
+            # concurrent event can't count the same refund twice
+            payment = Payment.query.filter_by(stripe_payment_intent_id=charge.get('payment_intent'))\
+                .with_for_update().first()
+            
+            # amount_refunded is the charge's running total (in cents), so
+            # only the part not seen before is a new refund
+            refunded = Decimal(charge['amount_refunded']) / 100
+            if payment and payment.status in (PaymentStatus.COMPLETED, PaymentStatus.REFUNDED) \
+                    and refunded > payment.refunded_amount:
+                AnalyticsRollup().payment_refunded(payment, amount=refunded - payment.refunded_amount)
+                payment.refunded_amount = refunded
+                if charge['amount_refunded'] == charge['amount']:
+                    payment.status = PaymentStatus.REFUNDED
+            db.session.commit()
+        
         return jsonify({'status': 'success'}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+def _mark_completed(payment, payment_intent):
+    """Mark a payment completed. Returns True only for the request that
+    changed its status, so when the success page and the webhook race the
+    payment is counted once."""
+    result = db.session.execute(
+        update(Payment)
+        .where(Payment.id == payment.id, Payment.status.notin_([PaymentStatus.COMPLETED, PaymentStatus.REFUNDED]))
+        .values(status=PaymentStatus.COMPLETED, stripe_payment_intent_id=payment_intent)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.expire(payment, ['status', 'stripe_payment_intent_id', 'updated_at'])
+    return result.rowcount == 1
+
 @payment_bp.route('/history', methods=['GET'])
 @jwt_required()
 def get_payment_history():
@@ -205,12 +227,7 @@ def get_payment_history():
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
-        
-        payments = Payment.query.filter_by(user_id=user.id)\
-            .order_by(Payment.created_at.desc())\
-            .paginate(page=page, per_page=per_page, error_out=False)
+        payments = paginate(Payment.query.filter_by(user_id=user.id), Payment.created_at, Payment.id)
         
         payment_data = []
         for payment in payments.items:
@@ -220,16 +237,11 @@ def get_payment_history():
         
         return jsonify({
             'payments': payment_data,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': payments.total,
-                'pages': payments.pages,
-                'has_next': payments.has_next,
-                'has_prev': payments.has_prev
-            }
+            'pagination': payments.meta
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1,12 +1,20 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
-from models import User, Enrollment, Course, LessonProgress, Certificate
+from models import User, Enrollment, Course, CourseModule, Lesson, LessonProgress, Certificate
 from auth import get_current_user
 from utils.validators import validate_email
+from serializers import CourseSerializer
+from services.enrollment_service import EnrollmentService
+from services.progress_service import ProgressService
+from services.watch_time_service import watch_time_buffer
 
 user_bp = Blueprint('users', __name__)
 
+# Heartbeat limits: events per request and seconds watched per event
+MAX_HEARTBEAT_EVENTS = 100
+MAX_HEARTBEAT_DELTA = 300
+
 # get profile details 
 """GET profile Details """
 @user_bp.route('/profile', methods=['GET'])
@@ -81,10 +89,11 @@ def get_enrollments():
             return jsonify({'error': 'User not found'}), 404
         
         enrollments = Enrollment.query.filter_by(user_id=user.id, is_active=True).all()
+        courses = CourseSerializer.dump_by_id(e.course_id for e in enrollments)
         
         enrollment_data = []
         for enrollment in enrollments:
-            course_data = enrollment.course.to_dict()
+            course_data = dict(courses[enrollment.course_id])
             course_data['enrollment'] = enrollment.to_dict()
             enrollment_data.append(course_data)
         
@@ -111,25 +120,19 @@ def enroll_course(course_id):
         if course.status.value != 'published':
             return jsonify({'error': 'Course is not available for enrollment'}), 400
         
-        # Check if already enrolled
-        existing_enrollment = Enrollment.query.filter_by(user_id=user.id, course_id=course_id).first()
-        if existing_enrollment:
-            if existing_enrollment.is_active:
-                return jsonify({'error': 'Already enrolled in this course'}), 409
-            else:
-                # Reactivate enrollment
-                existing_enrollment.is_active = True
-                db.session.commit()
-                return jsonify({
-                    'message': 'Successfully re-enrolled in course',
-                    'enrollment': existing_enrollment.to_dict()
-                }), 200
-        
-        # Create new enrollment
-        enrollment = Enrollment(user_id=user.id, course_id=course_id)
-        db.session.add(enrollment)
+        # Create, reactivate or reject an existing enrollment
+        enrollment, status = EnrollmentService().enroll(user.id, course_id)
+        if status == 'existing':
+            return jsonify({'error': 'Already enrolled in this course'}), 409
+        
         db.session.commit()
         
+        if status == 'reactivated':
+            return jsonify({
+                'message': 'Successfully re-enrolled in course',
+                'enrollment': enrollment.to_dict()
+            }), 200
+        
         return jsonify({
             'message': 'Successfully enrolled in course',
             'enrollment': enrollment.to_dict()
@@ -155,17 +158,27 @@ def get_course_progress(course_id):
         if not enrollment:
             return jsonify({'error': 'Not enrolled in this course'}), 404
         
-        # Get lesson progress
+        # Get lesson progress, including heartbeats this worker hasn't flushed yet
         lesson_progress = LessonProgress.query.filter_by(enrollment_id=enrollment.id).all()
-        progress_data = [
-            {
+        pending = watch_time_buffer.pending(enrollment.id)
+        progress_data = []
+        for lp in lesson_progress:
+            max_position, watched = pending.pop(lp.lesson_id, (0, 0))
+            progress_data.append({
                 'lesson_id': lp.lesson_id,
                 'completed': lp.completed,
                 'completed_at': lp.completed_at.isoformat() if lp.completed_at else None,
-                'watch_time_seconds': lp.watch_time_seconds
-            }
-            for lp in lesson_progress
-        ]
+                'watch_time_seconds': (lp.watch_time_seconds or 0) + watched,
+                'max_position_seconds': max(lp.max_position_seconds or 0, max_position)
+            })
+        for lesson_id, (max_position, watched) in pending.items():
+            progress_data.append({
+                'lesson_id': lesson_id,
+                'completed': False,
+                'completed_at': None,
+                'watch_time_seconds': watched,
+                'max_position_seconds': max_position
+            })
         
         return jsonify({
             'course_id': course_id,
@@ -193,6 +206,15 @@ def update_lesson_progress(course_id, lesson_id):
         if not enrollment:
             return jsonify({'error': 'Not enrolled in this course'}), 404
         
+        # The lesson must belong to the course; its lesson count comes along
+        lesson_count = db.session.query(Course.lesson_count)\
+            .join(CourseModule, CourseModule.course_id == Course.id)\
+            .join(Lesson, Lesson.module_id == CourseModule.id)\
+            .filter(Course.id == course_id, Lesson.id == lesson_id)\
+            .scalar()
+        if lesson_count is None:
+            return jsonify({'error': 'Lesson not found in this course'}), 404
+        
         # Get or create lesson progress
         lesson_progress = LessonProgress.query.filter_by(
             enrollment_id=enrollment.id, 
@@ -202,39 +224,31 @@ def update_lesson_progress(course_id, lesson_id):
         if not lesson_progress:
             lesson_progress = LessonProgress(
                 enrollment_id=enrollment.id,
-                lesson_id=lesson_id
+                lesson_id=lesson_id,
+                completed=False,
+                watch_time_seconds=0
             )
             db.session.add(lesson_progress)
         
-        # Update progress
+        # Update progress; the course percentage only moves when a lesson's
+        # completed flag flips
         if 'completed' in data:
-            lesson_progress.completed = data['completed']
-            if data['completed']:
-                from datetime import datetime
-                lesson_progress.completed_at = datetime.utcnow()
+            completed = data['completed']
+            if isinstance(completed, str) and completed.lower() in ('true', 'false'):
+                completed = completed.lower() == 'true'
+            if not isinstance(completed, bool):
+                return jsonify({'error': 'completed must be true or false'}), 400
+            ProgressService().set_lesson_completed(enrollment, lesson_progress, completed, lesson_count)
         
         if 'watch_time_seconds' in data:
             lesson_progress.watch_time_seconds = data['watch_time_seconds']
         
-        db.session.commit()
-        
-        # Calculate overall course progress
-        total_lessons = db.session.query(db.func.count(LessonProgress.id)).filter_by(enrollment_id=enrollment.id).scalar()
-        completed_lessons = db.session.query(db.func.count(LessonProgress.id)).filter_by(
-            enrollment_id=enrollment.id, completed=True
-        ).scalar()
+        # Mark course as completed once every lesson is
+        if lesson_count and enrollment.completed_lessons >= lesson_count and not enrollment.completed_at:
+            EnrollmentService().mark_completed(enrollment)
         
-        if total_lessons > 0:
-            enrollment.progress_percentage = (completed_lessons / total_lessons) * 100
-            
-            # Mark course as completed if 100% progress
-            if enrollment.progress_percentage == 100 and not enrollment.completed_at:
-                from datetime import datetime
-                enrollment.completed_at = datetime.utcnow()
-        
-        db.session.commit()
-        
-        return jsonify({
+        # Build the response before committing, which expires the instances
+        response = {
             'message': 'Lesson progress updated successfully',
             'lesson_progress': {
                 'lesson_id': lesson_progress.lesson_id,
@@ -243,12 +257,69 @@ def update_lesson_progress(course_id, lesson_id):
                 'watch_time_seconds': lesson_progress.watch_time_seconds
             },
             'course_progress': enrollment.progress_percentage
-        }), 200
+        }
+        
+        db.session.commit()
+        
+        return jsonify(response), 200
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+# Video heartbeat
+""" Record Watch Time Heartbeats  """
+@user_bp.route('/enrollments/<int:course_id>/heartbeat', methods=['POST'])
+@jwt_required()
+def record_watch_heartbeat(course_id):
+    """Buffered watch-time events from the video player.
+
+    Accepts a single ``{lesson_id, position, delta}`` event or
+    ``{"events": [...]}``. Events are coalesced in memory and written in
+    batches, so unlike ``update_lesson_progress`` this never writes to the
+    database in the request.
+    """
+    try:
+        data = request.get_json() or {}
+        events = data.get('events', [data])
+        if not isinstance(events, list) or not events or len(events) > MAX_HEARTBEAT_EVENTS:
+            return jsonify({'error': f'Between 1 and {MAX_HEARTBEAT_EVENTS} events are required'}), 400
+        
+        parsed = []
+        for event in events:
+            try:
+                lesson_id = int(event['lesson_id'])
+                position = int(event.get('position', 0))
+                delta = int(event.get('delta', 0))
+            except (KeyError, TypeError, ValueError):
+                return jsonify({'error': 'Each event needs an integer lesson_id, position and delta'}), 400
+            if position < 0 or not 0 <= delta <= MAX_HEARTBEAT_DELTA:
+                return jsonify({'error': f'position must be >= 0 and delta between 0 and {MAX_HEARTBEAT_DELTA}'}), 400
+            parsed.append((lesson_id, position, delta))
+        
+        # One read to check the enrollment and that every lesson is in the course
+        lesson_ids = {lesson_id for lesson_id, _, _ in parsed}
+        rows = db.session.query(Enrollment.id, Lesson.id)\
+            .join(CourseModule, CourseModule.course_id == Enrollment.course_id)\
+            .join(Lesson, Lesson.module_id == CourseModule.id)\
+            .filter(
+                Enrollment.user_id == int(get_jwt_identity()),
+                Enrollment.course_id == course_id,
+                Enrollment.is_active == True,
+                Lesson.id.in_(lesson_ids)
+            ).all()
+        if len(rows) != len(lesson_ids):
+            return jsonify({'error': 'Not enrolled in this course or lesson not found'}), 404
+        
+        enrollment_id = rows[0][0]
+        for lesson_id, position, delta in parsed:
+            watch_time_buffer.record(enrollment_id, lesson_id, position, delta)
+        
+        return jsonify({'accepted': len(parsed)}), 202
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 """ Get Student Certificates  """
 @user_bp.route('/certificates', methods=['GET'])
 @jwt_required()
@@ -292,9 +363,10 @@ def get_dashboard():
         recent_enrollments = Enrollment.query.filter_by(user_id=user.id, is_active=True)\
             .order_by(Enrollment.enrolled_at.desc()).limit(5).all()
         
+        courses = CourseSerializer.dump_by_id(e.course_id for e in recent_enrollments)
         recent_activity = []
         for enrollment in recent_enrollments:
-            course_data = enrollment.course.to_dict()
+            course_data = dict(courses[enrollment.course_id])
             course_data['enrollment'] = enrollment.to_dict()
             recent_activity.append(course_data)
         
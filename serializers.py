@@ -0,0 +1,137 @@
+from collections import defaultdict
+from app import db
+from models import Course, CourseModule, Lesson, LessonResource, User, CoursePrerequisitesCourses
+
+
+class CourseSerializer:
+    """Serialize courses in bulk using a fixed number of grouped queries.
+
+    ``Course.to_dict`` used to count enrollments, lazy-load the instructor and
+    walk the prerequisites for every row. Enrollment counts now come from the
+    denormalized course columns and the rest of the page is resolved at once,
+    so the number of queries does not depend on the page size.
+    """
+
+    @classmethod
+    def dump(cls, course, include_modules=False):
+        """Serialize a single course"""
+        return cls.dump_many([course], include_modules=include_modules)[0]
+
+    @classmethod
+    def dump_many(cls, courses, include_modules=False):
+        """Serialize a list of courses, preserving their order"""
+        courses = list(courses)
+        if not courses:
+            return []
+
+        course_ids = [course.id for course in courses]
+        instructors = cls._instructors({course.instructor_id for course in courses})
+        prerequisites = cls._prerequisites(course_ids)
+        modules = cls._modules(course_ids) if include_modules else {}
+
+        result = []
+        for course in courses:
+            instructor = instructors.get(course.instructor_id)
+            data = {
+                'id': course.id,
+                'title': course.title,
+                'description': course.description,
+                'short_description': course.short_description,
+                'instructor_id': course.instructor_id,
+                'instructor_name': f"{instructor.first_name} {instructor.last_name}" if instructor else None,
+                'price': float(course.price),
+                'currency': course.currency,
+                'duration_hours': course.duration_hours,
+                'difficulty_level': course.difficulty_level,
+                'thumbnail': course.thumbnail,
+                'status': course.status.value,
+                'max_students': course.max_students,
+                'prerequisites': course.prerequisites,
+                'learning_outcomes': course.learning_outcomes,
+                'created_at': course.created_at.isoformat(),
+                'updated_at': course.updated_at.isoformat(),
+                'enrollment_count': course.enrolled_count or 0,
+                'active_enrollment_count': course.active_enrolled_count or 0,
+                'completed_count': course.completed_count or 0,
+                'prerequisites_courses': prerequisites.get(course.id, [])
+            }
+
+            if include_modules:
+                data['modules'] = modules.get(course.id, [])
+
+            result.append(data)
+
+        return result
+
+    @classmethod
+    def dump_by_id(cls, course_ids, include_modules=False):
+        """Load and serialize courses by id, returning a ``{id: data}`` mapping"""
+        course_ids = {course_id for course_id in course_ids if course_id is not None}
+        if not course_ids:
+            return {}
+
+        courses = Course.query.filter(Course.id.in_(course_ids)).all()
+        return {
+            data['id']: data
+            for data in cls.dump_many(courses, include_modules=include_modules)
+        }
+
+    @staticmethod
+    def _instructors(instructor_ids):
+        users = User.query.filter(User.id.in_(instructor_ids)).all()
+        return {user.id: user for user in users}
+
+    @staticmethod
+    def _prerequisites(course_ids):
+        rows = db.session.query(
+            CoursePrerequisitesCourses.course_id,
+            Course.id,
+            Course.title,
+            Course.difficulty_level,
+            Course.status
+        ).join(Course, Course.id == CoursePrerequisitesCourses.prerequisite_course_id)\
+         .filter(CoursePrerequisitesCourses.course_id.in_(course_ids))\
+         .order_by(CoursePrerequisitesCourses.id).all()
+
+        prerequisites = defaultdict(list)
+        for course_id, prereq_id, title, difficulty_level, status in rows:
+            prerequisites[course_id].append({
+                'id': prereq_id,
+                'title': title,
+                'difficulty_level': difficulty_level,
+                'status': status.value if status else None
+            })
+
+        return prerequisites
+
+    @staticmethod
+    def _modules(course_ids):
+        modules = CourseModule.query.filter(CourseModule.course_id.in_(course_ids))\
+            .order_by(CourseModule.course_id, CourseModule.order).all()
+        module_ids = [module.id for module in modules]
+
+        lessons = []
+        if module_ids:
+            lessons = Lesson.query.filter(Lesson.module_id.in_(module_ids)).order_by(Lesson.order).all()
+        lesson_ids = [lesson.id for lesson in lessons]
+
+        resources_by_lesson = defaultdict(list)
+        if lesson_ids:
+            resources = LessonResource.query.filter(LessonResource.lesson_id.in_(lesson_ids))\
+                .order_by(LessonResource.id).all()
+            for resource in resources:
+                resources_by_lesson[resource.lesson_id].append(resource)
+
+        lessons_by_module = defaultdict(list)
+        for lesson in lessons:
+            lessons_by_module[lesson.module_id].append(
+                lesson.to_dict(resources=resources_by_lesson[lesson.id])
+            )
+
+        modules_by_course = defaultdict(list)
+        for module in modules:
+            modules_by_course[module.course_id].append(
+                module.to_dict(include_lessons=True, lessons=lessons_by_module[module.id])
+            )
+
+        return modules_by_course
@@ -0,0 +1,227 @@
+from collections import OrderedDict
+from datetime import datetime, date, time, timedelta
+from sqlalchemy import select, insert, update, delete, func, cast, literal, union_all, Date
+from app import db
+from models import CourseDailyStats, Course, User, Enrollment, Payment, PaymentStatus
+
+METRICS = ('revenue', 'payments', 'enrollments', 'completions', 'refunds', 'refunded_amount')
+AMOUNTS = ('revenue', 'refunded_amount')
+GRANULARITIES = ('day', 'week', 'month')
+
+
+class AnalyticsRollup:
+    """Daily per-course analytics in ``course_daily_stats``.
+
+    Payments, refunds, new enrollments and completions add to their day's
+    row with an upsert in the caller's transaction, so the counters commit
+    together with the change they count. Reports sum the daily rows and
+    re-bucket them into weeks or months in Python, which works the same on
+    every database. ``backfill`` rebuilds a date range from the source
+    tables (``flask backfill-analytics``).
+
+    Days are UTC. Revenue is counted on the payment's creation day and
+    includes payments refunded later; refunds are counted on the day they
+    happen, so net revenue is ``revenue - refunded_amount``.
+    """
+
+    def payment_completed(self, payment):
+        self.add(payment.course_id, payment.created_at, revenue=payment.amount, payments=1)
+
+    def payment_refunded(self, payment, amount=None, when=None):
+        self.add(payment.course_id, when, refunds=1,
+                 refunded_amount=payment.amount if amount is None else amount)
+
+    def enrolled(self, enrollment):
+        self.add(enrollment.course_id, enrollment.enrolled_at, enrollments=1)
+
+    def completed(self, enrollment):
+        self.add(enrollment.course_id, enrollment.completed_at, completions=1)
+
+    def add(self, course_id, when=None, **deltas):
+        """Add ``deltas`` (see METRICS) to a course's row for the day of
+        ``when`` (default today)"""
+        table = CourseDailyStats.__table__
+        day = (when or datetime.utcnow()).date()
+        row = {
+            'day': day,
+            'course_id': course_id,
+            'instructor_id': select(Course.instructor_id).where(Course.id == course_id).scalar_subquery(),
+            **deltas
+        }
+        dialect = db.session.get_bind().dialect.name
+
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+            stmt = dialect_insert(table).values(**row)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.day, table.c.course_id],
+                set_={name: table.c[name] + stmt.excluded[name] for name in deltas}
+            )
+            db.session.execute(stmt)
+            return
+
+        # No portable upsert: update, then insert if the row did not exist yet
+        result = db.session.execute(
+            update(table)
+            .where(table.c.day == day, table.c.course_id == course_id)
+            .values({name: table.c[name] + delta for name, delta in deltas.items()})
+        )
+        if result.rowcount == 0:
+            db.session.execute(insert(table).values(**row))
+
+    def series(self, granularity='day', since=None, until=None, course_id=None, instructor_id=None):
+        """Totals per day, week (starting Monday) or month, oldest first"""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+
+        query = select(
+            CourseDailyStats.day,
+            *(func.sum(CourseDailyStats.__table__.c[name]).label(name) for name in METRICS)
+        ).group_by(CourseDailyStats.day).order_by(CourseDailyStats.day)
+        query = self._filter(query, since, until, course_id, instructor_id)
+
+        buckets = OrderedDict()
+        for row in db.session.execute(query):
+            start = _bucket_start(row.day, granularity)
+            totals = buckets.setdefault(start, dict.fromkeys(METRICS, 0))
+            for name in METRICS:
+                totals[name] += row._mapping[name] or 0
+
+        return [
+            {'period': _period_label(start, granularity), **_serialize(totals)}
+            for start, totals in buckets.items()
+        ]
+
+    def leaders(self, dimension, since=None, until=None, limit=10):
+        """Totals per course or instructor over a date range, by revenue"""
+        key = {'course': CourseDailyStats.course_id, 'instructor': CourseDailyStats.instructor_id}.get(dimension)
+        if key is None:
+            raise ValueError("dimension must be 'course' or 'instructor'")
+
+        query = select(
+            key.label('id'),
+            *(func.sum(CourseDailyStats.__table__.c[name]).label(name) for name in METRICS)
+        ).where(key.isnot(None)).group_by(key)\
+         .order_by(func.sum(CourseDailyStats.revenue).desc(), func.sum(CourseDailyStats.enrollments).desc())\
+         .limit(limit)
+        rows = db.session.execute(self._filter(query, since, until)).all()
+
+        if dimension == 'course':
+            names = dict(db.session.execute(
+                select(Course.id, Course.title).where(Course.id.in_([row.id for row in rows]))
+            ).all())
+        else:
+            names = {
+                user_id: f"{first_name} {last_name}"
+                for user_id, first_name, last_name in db.session.execute(
+                    select(User.id, User.first_name, User.last_name).where(User.id.in_([row.id for row in rows]))
+                )
+            }
+
+        return [
+            {
+                f'{dimension}_id': row.id,
+                'name': names.get(row.id),
+                **_serialize({name: row._mapping[name] or 0 for name in METRICS})
+            }
+            for row in rows
+        ]
+
+    def backfill(self, since=None, until=None):
+        """Rebuild the rows for ``since``..``until`` (inclusive dates; the
+        whole history by default) from payments and enrollments. Payments
+        only keep their refunded total, so each payment's refunds are
+        rebuilt as one refund on the day it was last updated. Returns the
+        number of rows written."""
+        stats = CourseDailyStats.__table__
+        start = datetime.combine(since, time.min) if since else None
+        end = datetime.combine(until + timedelta(days=1), time.min) if until else None
+
+        def source(column, course_id, *conditions, **metrics):
+            day = _day(column).label('day')
+            columns = [day, course_id.label('course_id')] + [
+                (metrics[name] if name in metrics else literal(0)).label(name) for name in METRICS
+            ]
+            if start:
+                conditions += (column >= start,)
+            if end:
+                conditions += (column < end,)
+            return select(*columns).where(*conditions).group_by(day, course_id)
+
+        completed = (PaymentStatus.COMPLETED, PaymentStatus.REFUNDED)
+        sources = union_all(
+            source(Payment.created_at, Payment.course_id, Payment.status.in_(completed),
+                   revenue=func.sum(Payment.amount), payments=func.count(Payment.id)),
+            source(Payment.updated_at, Payment.course_id, Payment.refunded_amount > 0,
+                   refunds=func.count(Payment.id), refunded_amount=func.sum(Payment.refunded_amount)),
+            source(Enrollment.enrolled_at, Enrollment.course_id, enrollments=func.count(Enrollment.id)),
+            source(Enrollment.completed_at, Enrollment.course_id, Enrollment.completed_at.isnot(None),
+                   completions=func.count(Enrollment.id))
+        ).subquery()
+
+        rollup = select(
+            sources.c.day,
+            sources.c.course_id,
+            Course.instructor_id,
+            *(func.sum(sources.c[name]) for name in METRICS)
+        ).join(Course, Course.id == sources.c.course_id)\
+         .group_by(sources.c.day, sources.c.course_id, Course.instructor_id)
+
+        clear = delete(stats)
+        if since:
+            clear = clear.where(stats.c.day >= since)
+        if until:
+            clear = clear.where(stats.c.day <= until)
+
+        db.session.execute(clear)
+        result = db.session.execute(
+            insert(stats).from_select(['day', 'course_id', 'instructor_id', *METRICS], rollup)
+        )
+        db.session.commit()
+        return result.rowcount
+
+    def _filter(self, query, since=None, until=None, course_id=None, instructor_id=None):
+        if since:
+            query = query.where(CourseDailyStats.day >= since)
+        if until:
+            query = query.where(CourseDailyStats.day <= until)
+        if course_id:
+            query = query.where(CourseDailyStats.course_id == course_id)
+        if instructor_id:
+            query = query.where(CourseDailyStats.instructor_id == instructor_id)
+        return query
+
+
+def _day(column):
+    """The UTC date of a timestamp column, as the database can group by it"""
+    if db.session.get_bind().dialect.name == 'sqlite':
+        # CAST(... AS DATE) is numeric on SQLite; date() gives 'YYYY-MM-DD'
+        return func.date(column)
+    return cast(column, Date)
+
+
+def _bucket_start(day, granularity):
+    if isinstance(day, str):
+        day = date.fromisoformat(day)
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _period_label(start, granularity):
+    return start.strftime('%Y-%m') if granularity == 'month' else start.isoformat()
+
+
+def _serialize(totals):
+    values = {
+        name: float(value) if name in AMOUNTS else int(value)
+        for name, value in totals.items()
+    }
+    values['net_revenue'] = values['revenue'] - values['refunded_amount']
+    return values
@@ -0,0 +1,246 @@
+import hashlib
+import os
+import uuid
+from flask import current_app
+from sqlalchemy import select, update, delete, event, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from werkzeug.utils import secure_filename
+from app import db
+from models import StoredBlob, StoredFile, Course, Lesson, LessonResource, User
+from services.file_service import CHUNK_BLOCK_SIZE
+from services.storage_index import StorageIndex, index_key
+
+
+class BlobStore:
+    """Content-addressed, reference-counted file storage.
+
+    Files are stored once per SHA-256 under ``<root>/<aa>/<sha256><ext>``;
+    the hash is computed while the upload is streamed to a temporary file in
+    the same root, which is then either renamed into place or dropped as a
+    duplicate. ``stored_blobs.ref_count`` counts the records pointing at a
+    blob. References are taken by ``save``/``adopt`` in the caller's
+    transaction and released automatically when a tracked column
+    (``Course.thumbnail``, ``Lesson.video_url``, ``LessonResource.file_path``,
+    ``User.profile_picture``) changes or its row is deleted; the file goes
+    once the last reference is committed away. A file stored by a
+    transaction that rolls back is removed again (an adopted one is moved
+    back where it came from).
+
+    Public blobs live under ``static/`` like the files the course routes have
+    always written there; private ones under the upload folder are only
+    served through the access-checked download routes. Identical files are
+    shared within each store, never across them.
+    """
+
+    def __init__(self, public=False):
+        self.public = public
+        key = 'BLOB_STORE_PUBLIC_FOLDER' if public else 'BLOB_STORE_FOLDER'
+        self.root = current_app.config[key].rstrip('/\\')
+
+    def save(self, file, filename=None, owner_id=None, course_id=None):
+        """Store an uploaded FileStorage (or any readable stream).
+        Returns ``(path, size)`` like ``FileService.save_file``. The owner
+        and course are recorded in the storage index for new blobs."""
+        stream = getattr(file, 'stream', file)
+        filename = filename or getattr(file, 'filename', None) or ''
+
+        os.makedirs(os.path.join(self.root, 'tmp'), exist_ok=True)
+        temp_path = os.path.join(self.root, 'tmp', uuid.uuid4().hex)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(temp_path, 'wb') as f:
+                for block in iter(lambda: stream.read(CHUNK_BLOCK_SIZE), b''):
+                    f.write(block)
+                    digest.update(block)
+                    size += len(block)
+            blob = self._store(temp_path, digest.hexdigest(), size, filename, owner_id, course_id)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return blob.path, blob.size
+
+    def adopt(self, file_path, filename=None, sha256=None, owner_id=None, course_id=None):
+        """Move a file that is already on disk (e.g. a finished resumable
+        upload) into the store. Returns ``(path, size)``."""
+        if sha256 is None:
+            digest = hashlib.sha256()
+            with open(file_path, 'rb') as f:
+                for block in iter(lambda: f.read(CHUNK_BLOCK_SIZE), b''):
+                    digest.update(block)
+            sha256 = digest.hexdigest()
+
+        blob = self._store(file_path, sha256, os.path.getsize(file_path), filename or file_path, owner_id, course_id,
+                           restore_to=file_path)
+        if os.path.exists(file_path) and os.path.abspath(file_path) != os.path.abspath(blob.path):
+            # A duplicate: the original goes once the new reference commits
+            db.session.info.setdefault('discarded_blob_sources', set()).add(file_path)
+        return blob.path, blob.size
+
+    def acquire(self, path):
+        """Take another reference to a stored path, e.g. when copying a record.
+        Returns False for paths that aren't in a blob store."""
+        result = db.session.execute(
+            update(StoredBlob)
+            .where(StoredBlob.path == path)
+            .values(ref_count=StoredBlob.ref_count + 1)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount > 0
+
+    def _store(self, source_path, sha256, size, filename, owner_id=None, course_id=None, restore_to=None):
+        existing = db.session.execute(
+            update(StoredBlob)
+            .where(StoredBlob.sha256 == sha256, StoredBlob.public == self.public)
+            .values(ref_count=StoredBlob.ref_count + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if existing.rowcount:
+            return db.session.execute(
+                select(StoredBlob).where(StoredBlob.sha256 == sha256, StoredBlob.public == self.public)
+            ).scalar_one()
+
+        ext = os.path.splitext(secure_filename(os.path.basename(filename)))[1].lower()
+        folder = os.path.join(self.root, sha256[:2])
+        os.makedirs(folder, exist_ok=True)
+        blob = StoredBlob(
+            sha256=sha256,
+            public=self.public,
+            path=os.path.join(folder, sha256 + ext).replace("\\", "/"),
+            size=size,
+            ref_count=1
+        )
+        try:
+            with db.session.begin_nested():
+                db.session.add(blob)
+        except IntegrityError:
+            # Stored concurrently by another request: share theirs
+            db.session.execute(
+                update(StoredBlob)
+                .where(StoredBlob.sha256 == sha256, StoredBlob.public == self.public)
+                .values(ref_count=StoredBlob.ref_count + 1)
+                .execution_options(synchronize_session=False)
+            )
+            return db.session.execute(
+                select(StoredBlob).where(StoredBlob.sha256 == sha256, StoredBlob.public == self.public)
+            ).scalar_one()
+
+        os.replace(source_path, blob.path)
+        # Until commit the file has no committed row; a rollback removes it
+        # again, or moves an adopted file back where it came from
+        db.session.info.setdefault('created_blob_paths', {})[blob.path] = restore_to
+        StorageIndex().record(blob.path, size, owner_id=owner_id, course_id=course_id)
+        return blob
+
+
+def is_blob_path(path):
+    """Whether a stored path belongs to one of the blob stores"""
+    if not path:
+        return False
+    path = path.replace("\\", "/")
+    return any(
+        path.startswith(current_app.config[key].rstrip('/\\').replace("\\", "/") + '/')
+        for key in ('BLOB_STORE_FOLDER', 'BLOB_STORE_PUBLIC_FOLDER')
+    )
+
+
+# Columns holding paths that may point at blobs
+TRACKED_COLUMNS = (
+    (Course, 'thumbnail'),
+    (Lesson, 'video_url'),
+    (LessonResource, 'file_path'),
+    (User, 'profile_picture'),
+)
+
+
+def _release(connection, target, path):
+    if not is_blob_path(path):
+        return
+
+    connection.execute(
+        update(StoredBlob).where(StoredBlob.path == path).values(ref_count=StoredBlob.ref_count - 1)
+    )
+    remaining = connection.execute(select(StoredBlob.ref_count).where(StoredBlob.path == path)).scalar()
+    if remaining is not None and remaining <= 0:
+        connection.execute(delete(StoredBlob).where(StoredBlob.path == path))
+        session = Session.object_session(target)
+        if session is not None:
+            session.info.setdefault('released_blob_paths', set()).add(path)
+
+
+def _track(model, attribute):
+    @event.listens_for(model, 'after_update')
+    def release_replaced(mapper, connection, target):
+        history = inspect(target).attrs[attribute].history
+        current = getattr(target, attribute)
+        for old_path in history.deleted or ():
+            if old_path and old_path != current:
+                _release(connection, target, old_path)
+
+    @event.listens_for(model, 'after_delete')
+    def release_deleted(mapper, connection, target):
+        _release(connection, target, getattr(target, attribute))
+
+
+for _model, _attribute in TRACKED_COLUMNS:
+    _track(_model, _attribute)
+
+
+@event.listens_for(Session, 'after_commit')
+def _remove_released_blobs(session):
+    session.info.pop('created_blob_paths', None)
+    for path in session.info.pop('discarded_blob_sources', ()):
+        _remove(path)
+
+    paths = session.info.pop('released_blob_paths', None)
+    if not paths:
+        return
+
+    # A concurrent upload may have stored the same content again since
+    with db.engine.begin() as connection:
+        still_stored = set(connection.execute(
+            select(StoredBlob.path).where(StoredBlob.path.in_(paths))
+        ).scalars())
+        removed = paths - still_stored
+        if removed:
+            connection.execute(delete(StoredFile).where(StoredFile.path.in_([index_key(path) for path in removed])))
+    for path in removed:
+        _remove(path)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_released_blobs(session, previous_transaction):
+    # A failed savepoint (e.g. the duplicate insert in _store) rolls back
+    # only part of the transaction; what was recorded outside it stands
+    if previous_transaction.parent is not None:
+        return
+
+    session.info.pop('released_blob_paths', None)
+    session.info.pop('discarded_blob_sources', None)
+    created = session.info.pop('created_blob_paths', None)
+    if not created:
+        return
+
+    # Another request may have stored the same content since the rollback
+    with db.engine.begin() as connection:
+        still_stored = set(connection.execute(
+            select(StoredBlob.path).where(StoredBlob.path.in_(list(created)))
+        ).scalars())
+    for path, restore_to in created.items():
+        if path in still_stored:
+            continue
+        if restore_to is not None and not os.path.exists(restore_to):
+            try:
+                os.replace(path, restore_to)
+                continue
+            except OSError:
+                pass
+        _remove(path)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
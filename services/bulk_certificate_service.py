@@ -0,0 +1,154 @@
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from app import db
+from models import Certificate, Course, Enrollment, User, Job, JobStatus
+from services.certificate_service import CertificateService
+from services.job_queue import JobQueue, job_handler
+
+BULK_KIND = 'bulk_certificates'
+BATCH_KIND = 'certificate_batch'
+
+_UNFINISHED = (JobStatus.QUEUED, JobStatus.RUNNING)
+
+
+class BulkCertificateService:
+    """Certificates for a whole cohort, generated by background jobs.
+
+    ``start`` queues a ``bulk_certificates`` job that splits the course's
+    completed enrollments without a certificate into batches of
+    ``CERTIFICATE_BATCH_SIZE``, each its own ``certificate_batch`` job. The
+    worker pool (``flask run-jobs``) renders batches in parallel and commits
+    each one on its own. A student gets at most one certificate per course,
+    so a re-run or a retried batch only fills in the gaps a crash left.
+    """
+
+    def start(self, course):
+        """Queue bulk generation for a course, or return the run already in
+        progress. Returns ``(job, created)``."""
+        running = self._active(course.id)
+        if running is not None:
+            return running, False
+
+        job = JobQueue().enqueue(BULK_KIND, {'course_id': course.id})
+        db.session.flush()
+        return job, True
+
+    def status(self, job_id):
+        """Progress of a bulk run, or None if there is no such run"""
+        job = db.session.get(Job, job_id)
+        if job is None or job.kind != BULK_KIND:
+            return None
+
+        batches = Job.query.filter_by(parent_id=job.id).order_by(Job.id).all()
+        generated = skipped = 0
+        failures = []
+        for batch in batches:
+            if batch.result:
+                generated += batch.result['generated']
+                skipped += batch.result['skipped']
+                failures.extend(batch.result['failed'])
+            elif batch.status == JobStatus.FAILED:
+                failures.extend(
+                    {'enrollment_id': enrollment_id, 'errors': [batch.last_error]}
+                    for enrollment_id in batch.payload['enrollment_ids']
+                )
+
+        if job.status in _UNFINISHED or job.status == JobStatus.FAILED:
+            status = job.status.value
+        elif any(batch.status in _UNFINISHED for batch in batches):
+            status = JobStatus.RUNNING.value
+        else:
+            status = JobStatus.DONE.value
+
+        finished_at = None
+        if status != JobStatus.RUNNING.value and job.finished_at:
+            finished_at = max([job.finished_at] + [batch.finished_at for batch in batches if batch.finished_at])
+
+        return {
+            'job_id': job.id,
+            'course_id': job.payload['course_id'],
+            'status': status,
+            'total': job.result['total'] if job.result else None,
+            'processed': generated + skipped + len(failures),
+            'certificates_generated': generated,
+            'already_issued': skipped,
+            'failed': failures,
+            'batches': len(batches),
+            'batches_done': sum(1 for batch in batches if batch.status == JobStatus.DONE),
+            'error': job.last_error,
+            'created_at': job.created_at.isoformat() if job.created_at else None,
+            'finished_at': finished_at.isoformat() if finished_at else None
+        }
+
+    def _active(self, course_id):
+        # Runs are rare; filter the JSON payload in Python to stay portable
+        unfinished = Job.query.filter(Job.kind.in_((BULK_KIND, BATCH_KIND)), Job.status.in_(_UNFINISHED)).all()
+        for job in unfinished:
+            if job.payload.get('course_id') == course_id:
+                return job if job.kind == BULK_KIND else db.session.get(Job, job.parent_id)
+        return None
+
+
+@job_handler(BULK_KIND, bind=True)
+def plan_bulk_certificates(job, payload):
+    course_id = payload['course_id']
+    enrollment_ids = db.session.execute(
+        select(Enrollment.id)
+        .where(
+            Enrollment.course_id == course_id,
+            Enrollment.completed_at.isnot(None),
+            ~Enrollment.user_id.in_(select(Certificate.user_id).where(Certificate.course_id == course_id))
+        )
+        .order_by(Enrollment.id)
+    ).scalars().all()
+
+    batch_size = current_app.config.get('CERTIFICATE_BATCH_SIZE', 50)
+    queue = JobQueue()
+    for start in range(0, len(enrollment_ids), batch_size):
+        queue.enqueue(
+            BATCH_KIND,
+            {'course_id': course_id, 'enrollment_ids': enrollment_ids[start:start + batch_size]},
+            parent=job
+        )
+    return {'total': len(enrollment_ids)}
+
+
+@job_handler(BATCH_KIND)
+def generate_certificate_batch(payload):
+    course = db.session.get(Course, payload['course_id'])
+    certificate_service = CertificateService()
+    issued = set(db.session.execute(
+        select(Certificate.user_id).where(Certificate.course_id == course.id)
+    ).scalars())
+    enrollments = Enrollment.query.filter(Enrollment.id.in_(payload['enrollment_ids'])).all()
+    users = {user.id: user for user in User.query.filter(User.id.in_([e.user_id for e in enrollments]))}
+
+    result = {'generated': 0, 'skipped': 0, 'failed': []}
+    for enrollment in enrollments:
+        user = users.get(enrollment.user_id)
+        if enrollment.user_id in issued:
+            result['skipped'] += 1
+            continue
+
+        errors = certificate_service.validate_certificate_data(user, course, enrollment)
+        if not errors:
+            try:
+                with db.session.begin_nested():
+                    certificate_service.issue_certificate(user, course)
+                result['generated'] += 1
+                continue
+            except IntegrityError:
+                # Issued concurrently, e.g. by the student themselves
+                result['skipped'] += 1
+                continue
+            except Exception as e:
+                errors = [str(e)]
+
+        result['failed'].append({
+            'enrollment_id': enrollment.id,
+            'user_id': enrollment.user_id,
+            'user': f"{user.first_name} {user.last_name}" if user else "Unknown",
+            'errors': errors
+        })
+    return result
@@ -0,0 +1,197 @@
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from reportlab import rl_config
+from reportlab.graphics import renderPDF
+from reportlab.graphics.barcode.qr import QrCodeWidget
+from reportlab.graphics.shapes import Drawing
+from reportlab.lib.colors import Color, black, blue
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import inch
+from reportlab.lib.rl_accel import fp_str
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN = inch
+TEXT_WIDTH = PAGE_WIDTH - 2 * MARGIN
+GREY = Color(0.5, 0.5, 0.5)
+QR_CODE_SIZE = 72
+
+ACADEMY_NAME = "AI First Academy"
+
+
+class CertificateLayout:
+    """The parts of a course's certificate that are the same for every
+    student, laid out once.
+
+    Static text is wrapped, measured and compiled into ``background``, the
+    page's PDF drawing operators, which each certificate adds verbatim.
+    ``slots`` holds the font and baseline of the variable fields (student
+    name, issue date, certificate number and verification URL); ``fonts``
+    the fonts the background refers to, in the order a fresh canvas must
+    register them to get the same internal names.
+    """
+
+    def __init__(self, course):
+        self.lines = []
+        self.slots = {}
+        self._y = PAGE_HEIGHT - MARGIN
+
+        self._space(0.5 * inch)
+        self._text("CERTIFICATE OF COMPLETION", 'Helvetica-Bold', 28, blue, space_after=30)
+        self._space(0.3 * inch)
+        self._text(ACADEMY_NAME, 'Helvetica-Bold', 18, black, space_after=20)
+        self._space(0.5 * inch)
+        self._text("This is to certify that", 'Helvetica', 14, black, space_after=12)
+        self._space(0.2 * inch)
+        self._slot('name', 'Helvetica-Bold', 24, blue, space_after=20)
+        self._text("has successfully completed the course", 'Helvetica', 14, black, space_after=12)
+        self._space(0.2 * inch)
+        self._text(course.title, 'Helvetica-Bold', 20, black, space_after=20)
+        if course.duration_hours:
+            self._text(f"Duration: {course.duration_hours} hours", 'Helvetica', 14, black, space_after=12)
+        if course.difficulty_level:
+            self._text(f"Level: {course.difficulty_level.title()}", 'Helvetica', 14, black, space_after=12)
+        self._space(0.3 * inch)
+        self._slot('issued', 'Helvetica', 16, black, space_after=15)
+        self._space(0.2 * inch)
+        self._slot('number', 'Helvetica', 14, black, space_after=12)
+        self._space(0.4 * inch)
+
+        # Instructor and academy signatures side by side
+        instructor = course.instructor
+        signature_y = self._y - 12
+        for x, name, role in (
+            (PAGE_WIDTH / 4, f"{instructor.first_name} {instructor.last_name}", "Course Instructor"),
+            (3 * PAGE_WIDTH / 4, ACADEMY_NAME, "Certificate Authority"),
+        ):
+            self.lines.append(('rule', x, signature_y))
+            self.lines.append(('Helvetica', 12, black, x, signature_y - 20, name))
+            self.lines.append(('Helvetica', 12, black, x, signature_y - 35, role))
+        self._y = signature_y - 35 - 0.4 * inch
+
+        self._slot('verification', 'Helvetica', 10, GREY, space_after=0)
+        self._compile()
+
+    def _compile(self):
+        scratch = canvas.Canvas(BytesIO(), pagesize=A4)
+        code = []
+        text = scratch.beginText()
+        for line in self.lines:
+            if line[0] == 'rule':
+                _, x, y = line
+                code.append(f"{fp_str(x - 80, y)} m {fp_str(x + 80, y)} l S")
+                continue
+            font, size, colour, x, y, value = line
+            text.setFont(font, size)
+            text.setFillColor(colour)
+            text.setTextOrigin(x - stringWidth(value, font, size) / 2, y)
+            text.textOut(value)
+        code.append(text.getCode())
+
+        self.background = '\n'.join(code)
+        # A canvas starts out with its base font, then names fonts by first use
+        self.fonts = list(dict.fromkeys(
+            [rl_config.canvas_basefontname] + [line[0] for line in self.lines if line[0] != 'rule']
+        ))
+
+    def _space(self, height):
+        self._y -= height
+
+    def _text(self, text, font, size, colour, space_after):
+        for line in simpleSplit(text, font, size, TEXT_WIDTH):
+            self._y -= size
+            self.lines.append((font, size, colour, PAGE_WIDTH / 2, self._y, line))
+            self._y -= size * 0.2
+        self._y -= space_after
+
+    def _slot(self, name, font, size, colour, space_after):
+        self._y -= size
+        self.slots[name] = (font, size, colour, self._y)
+        self._y -= size * 0.2 + space_after
+
+
+class CertificateRenderer:
+    """Renders certificate PDFs straight onto a canvas from a cached
+    ``CertificateLayout``, so issuing a certificate only draws the
+    precomputed page and overlays the four variable fields.
+
+    Layouts are kept per course (and its last update) in a small LRU shared
+    by all renderers in the process.
+    """
+
+    max_layouts = 256
+
+    _layouts = OrderedDict()
+    _lock = threading.Lock()
+
+    def layout(self, course):
+        instructor = course.instructor
+        key = (course.id, course.updated_at, instructor.first_name, instructor.last_name)
+        with self._lock:
+            layout = self._layouts.get(key)
+            if layout is not None:
+                self._layouts.move_to_end(key)
+                return layout
+
+        layout = CertificateLayout(course)
+        with self._lock:
+            self._layouts[key] = layout
+            while len(self._layouts) > self.max_layouts:
+                self._layouts.popitem(last=False)
+        return layout
+
+    def render(self, file_path, layout, student_name, issued_on, certificate_number, verification_url, qr_url=None):
+        c = canvas.Canvas(file_path, pagesize=A4)
+        c.setTitle(f"Certificate - {student_name}")
+        c.setStrokeColor(black)
+        c.setLineWidth(0.5)
+
+        for font in layout.fonts:
+            c.setFont(font, 12)
+        c.saveState()
+        c.addLiteral(layout.background)
+        c.restoreState()
+
+        fields = {
+            'name': student_name,
+            'issued': f"Issued on: {issued_on}",
+            'number': f"Certificate Number: {certificate_number}",
+            'verification': f"This certificate can be verified at: {verification_url}",
+        }
+        for slot, text in fields.items():
+            font, size, colour, y = layout.slots[slot]
+            _draw(c, font, _fit(text, font, size), colour, PAGE_WIDTH / 2, y, text)
+
+        if qr_url:
+            _draw_qr_code(c, qr_url)
+
+        c.showPage()
+        c.save()
+        return file_path
+
+
+def _draw(c, font, size, colour, x, y, text):
+    c.setFont(font, size)
+    c.setFillColor(colour)
+    c.drawCentredString(x, y, text)
+
+
+def _draw_qr_code(c, url, size=QR_CODE_SIZE):
+    """Draw a QR code for ``url`` in the bottom right corner"""
+    widget = QrCodeWidget(url, barLevel='M')
+    x0, y0, x1, y1 = widget.getBounds()
+    drawing = Drawing(size, size, transform=[size / (x1 - x0), 0, 0, size / (y1 - y0), 0, 0])
+    drawing.add(widget)
+    # Below the verification line, clear of its centred text
+    renderPDF.draw(drawing, c, PAGE_WIDTH - MARGIN / 2 - size, 20)
+
+
+def _fit(text, font, size, min_size=8):
+    """Shrink ``size`` until ``text`` fits on one line"""
+    width = stringWidth(text, font, size)
+    if width <= TEXT_WIDTH:
+        return size
+    return max(min_size, size * TEXT_WIDTH / width)
@@ -1,14 +1,16 @@
 from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
 from reportlab.lib.colors import Color, black, blue
 from reportlab.pdfgen import canvas
-from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
 import os
 import uuid
 from datetime import datetime
 from io import BytesIO
+from flask import current_app, request, has_request_context
+from app import db
+from models import Certificate
+from services.certificate_renderer import CertificateRenderer
+from services.certificate_verification import CertificateVerifier
+from services.storage_index import StorageIndex
 
 class CertificateService:
     def __init__(self):
@@ -18,162 +20,63 @@ class CertificateService:
         # Create certificates directory if it doesn't exist
         os.makedirs(self.certificates_folder, exist_ok=True)
     
+    def issue_certificate(self, user, course):
+        """Create a user's certificate for a course and render its PDF, in the
+        caller's transaction. Raises IntegrityError if one already exists."""
+        certificate = Certificate(
+            user_id=user.id,
+            course_id=course.id,
+            # Whole seconds, as signed into the certificate number
+            issued_at=datetime.utcnow().replace(microsecond=0),
+            # Placeholder until the ID is known
+            certificate_number=f"pending-{uuid.uuid4().hex}"
+        )
+        db.session.add(certificate)
+        db.session.flush()  # Get the certificate ID
+        certificate.certificate_number = CertificateVerifier().sign(certificate)
+        certificate.verification_url = f"/api/v1/certificates/verify/{certificate.certificate_number}"
+        
+        certificate.file_path = self.generate_certificate_pdf(user=user, course=course, certificate=certificate)
+        return certificate
+    
     def generate_certificate_pdf(self, user, course, certificate):
-        """Generate a PDF certificate for course completion"""
+        """Generate a PDF certificate for course completion.
+
+        The course's static layout is built once and cached
+        (``CertificateRenderer``); only the student's details are drawn per
+        certificate.
+        """
         try:
-            # Generate unique filename
             filename = f"certificate_{certificate.id}_{uuid.uuid4().hex[:8]}.pdf"
             file_path = os.path.join(self.certificates_folder, filename).replace("\\", "/")
             
-            # Create the PDF document
-            doc = SimpleDocTemplate(file_path, pagesize=A4)
-            
-            # Get styles
-            styles = getSampleStyleSheet()
-            
-            # Custom styles
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=28,
-                spaceAfter=30,
-                alignment=TA_CENTER,
-                textColor=blue
-            )
-            
-            subtitle_style = ParagraphStyle(
-                'CustomSubtitle',
-                parent=styles['Heading2'],
-                fontSize=18,
-                spaceAfter=20,
-                alignment=TA_CENTER,
-                textColor=black
-            )
-            
-            body_style = ParagraphStyle(
-                'CustomBody',
-                parent=styles['Normal'],
-                fontSize=14,
-                spaceAfter=12,
-                alignment=TA_CENTER,
-                textColor=black
-            )
-            
-            large_body_style = ParagraphStyle(
-                'LargeBody',
-                parent=styles['Normal'],
-                fontSize=16,
-                spaceAfter=15,
-                alignment=TA_CENTER,
-                textColor=black
-            )
-            
-            # Build the content
-            content = []
-            
-            # Add some space from top
-            content.append(Spacer(1, 0.5*inch))
-            
-            # Certificate header
-            content.append(Paragraph("CERTIFICATE OF COMPLETION", title_style))
-            content.append(Spacer(1, 0.3*inch))
-            
-            # Subtitle
-            content.append(Paragraph("AI First Academy", subtitle_style))
-            content.append(Spacer(1, 0.5*inch))
-            
-            # This certifies that
-            content.append(Paragraph("This is to certify that", body_style))
-            content.append(Spacer(1, 0.2*inch))
-            
-            # Student name (larger, bold)
-            student_name_style = ParagraphStyle(
-                'StudentName',
-                parent=styles['Normal'],
-                fontSize=24,
-                spaceAfter=20,
-                alignment=TA_CENTER,
-                textColor=blue,
-                fontName='Helvetica-Bold'
-            )
-            content.append(Paragraph(f"{user.first_name} {user.last_name}", student_name_style))
-            
-            # Has successfully completed
-            content.append(Paragraph("has successfully completed the course", body_style))
-            content.append(Spacer(1, 0.2*inch))
-            
-            # Course name (larger, bold)
-            course_name_style = ParagraphStyle(
-                'CourseName',
-                parent=styles['Normal'],
-                fontSize=20,
-                spaceAfter=20,
-                alignment=TA_CENTER,
-                textColor=black,
-                fontName='Helvetica-Bold'
+            renderer = CertificateRenderer()
+            renderer.render(
+                file_path,
+                renderer.layout(course),
+                student_name=f"{user.first_name} {user.last_name}",
+                issued_on=certificate.issued_at.strftime("%B %d, %Y"),
+                certificate_number=certificate.certificate_number,
+                verification_url=certificate.verification_url,
+                qr_url=self.verification_link(certificate)
             )
-            content.append(Paragraph(course.title, course_name_style))
-            
-            # Course details
-            if course.duration_hours:
-                content.append(Paragraph(f"Duration: {course.duration_hours} hours", body_style))
-            
-            if course.difficulty_level:
-                content.append(Paragraph(f"Level: {course.difficulty_level.title()}", body_style))
-            
-            content.append(Spacer(1, 0.3*inch))
-            
-            # Issue date
-            issue_date = certificate.issued_at.strftime("%B %d, %Y")
-            content.append(Paragraph(f"Issued on: {issue_date}", large_body_style))
-            content.append(Spacer(1, 0.2*inch))
-            
-            # Certificate number
-            content.append(Paragraph(f"Certificate Number: {certificate.certificate_number}", body_style))
-            content.append(Spacer(1, 0.4*inch))
-            
-            # Instructor signature section
-            signature_style = ParagraphStyle(
-                'Signature',
-                parent=styles['Normal'],
-                fontSize=12,
-                spaceAfter=8,
-                alignment=TA_CENTER,
-                textColor=black
-            )
-            
-            content.append(Paragraph("_" * 40, signature_style))
-            content.append(Paragraph(f"{course.instructor.first_name} {course.instructor.last_name}", signature_style))
-            content.append(Paragraph("Course Instructor", signature_style))
-            content.append(Spacer(1, 0.3*inch))
-            
-            # Academy signature
-            content.append(Paragraph("_" * 40, signature_style))
-            content.append(Paragraph("AI First Academy", signature_style))
-            content.append(Paragraph("Certificate Authority", signature_style))
-            content.append(Spacer(1, 0.2*inch))
-            
-            # Verification note
-            verification_style = ParagraphStyle(
-                'Verification',
-                parent=styles['Normal'],
-                fontSize=10,
-                alignment=TA_CENTER,
-                textColor=Color(0.5, 0.5, 0.5)
-            )
-            content.append(Paragraph(
-                f"This certificate can be verified at: {certificate.verification_url}",
-                verification_style
-            ))
-            
-            # Build the PDF
-            doc.build(content)
+            StorageIndex().record(file_path, os.path.getsize(file_path), owner_id=user.id, course_id=course.id, new=True)
             
             return file_path
             
         except Exception as e:
             raise Exception(f"Certificate generation error: {str(e)}")
     
+    def verification_link(self, certificate):
+        """Absolute verification URL for the certificate's QR code, or None
+        when QR codes are off or no public base URL is known"""
+        if not current_app.config.get('CERTIFICATE_QR_CODE') or not certificate.verification_url:
+            return None
+        base_url = current_app.config.get('PUBLIC_BASE_URL') or (request.url_root if has_request_context() else None)
+        if not base_url:
+            return None
+        return base_url.rstrip('/') + certificate.verification_url
+    
     def generate_simple_certificate_pdf(self, user, course, certificate):
         """Generate a simple certificate using canvas for more control"""
         try:
@@ -277,6 +180,7 @@ class CertificateService:
             
             # Save the PDF
             c.save()
+            StorageIndex().record(file_path, os.path.getsize(file_path), owner_id=user.id, course_id=course.id)
             
             return file_path
             
@@ -288,6 +192,7 @@ class CertificateService:
         try:
             if file_path and os.path.exists(file_path):
                 os.remove(file_path)
+                StorageIndex().forget(file_path)
                 return True
             return False
         except Exception as e:
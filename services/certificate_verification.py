@@ -0,0 +1,111 @@
+import base64
+import calendar
+import hashlib
+import hmac
+import re
+from datetime import datetime
+from flask import current_app
+from models import Certificate
+from utils.cache import ResponseCache
+
+# AIFA-{course_id}-{user_id}-{certificate_id}-{issued_at, base 36 epoch seconds}-{signature}
+SIGNED_NUMBER = re.compile(r'^AIFA-(\d+)-(\d+)-(\d+)-([0-9A-Z]{1,13})-([A-Z2-7]{16})$')
+
+ISSUER = 'AI First Academy'
+
+verification_cache = ResponseCache(max_entries=1024)
+
+
+class CertificateVerifier:
+    """Signed certificate numbers and cached public verification.
+
+    A signed number carries the certificate, user and course ids and the
+    issue time with an HMAC-SHA256 over them (``CERTIFICATE_SIGNING_KEY``),
+    so a forged or mistyped number is rejected without touching the
+    database. Verification payloads for genuine numbers are looked up once
+    and kept in a per-process LRU for ``CERTIFICATE_VERIFY_CACHE_SECONDS``.
+    Numbers issued before signing was introduced are still looked up.
+    """
+
+    def sign(self, certificate):
+        """Signed number for a flushed certificate (id and issued_at set)"""
+        issued = calendar.timegm(certificate.issued_at.utctimetuple())
+        message = f"{certificate.course_id}-{certificate.user_id}-{certificate.id}-{_base36(issued)}"
+        return f"AIFA-{message}-{self._signature(message)}"
+
+    def claims(self, certificate_number):
+        """What a signed number vouches for, or None if it isn't a validly
+        signed number"""
+        match = SIGNED_NUMBER.match(certificate_number or '')
+        if not match:
+            return None
+
+        course_id, user_id, certificate_id, issued, signature = match.groups()
+        message = f"{course_id}-{user_id}-{certificate_id}-{issued}"
+        if not hmac.compare_digest(signature, self._signature(message)):
+            return None
+
+        return {
+            'certificate_id': int(certificate_id),
+            'user_id': int(user_id),
+            'course_id': int(course_id),
+            'issued_at': datetime.utcfromtimestamp(int(issued, 36))
+        }
+
+    def is_signed(self, certificate_number):
+        return SIGNED_NUMBER.match(certificate_number or '') is not None
+
+    def verify(self, certificate_number):
+        """Public verification payload, or None if the number is not genuine"""
+        claims = None
+        if self.is_signed(certificate_number):
+            claims = self.claims(certificate_number)
+            if claims is None:
+                return None
+
+        payload = verification_cache.get(certificate_number)
+        if payload is not None:
+            return payload
+
+        certificate = Certificate.query.filter_by(certificate_number=certificate_number).first()
+        if certificate is None:
+            return None
+        if claims is not None and (claims['certificate_id'], claims['user_id'], claims['course_id']) != \
+                (certificate.id, certificate.user_id, certificate.course_id):
+            return None
+
+        course = certificate.course
+        payload = {
+            'certificate_number': certificate.certificate_number,
+            'issued_at': certificate.issued_at.isoformat(),
+            'user_name': f"{certificate.user.first_name} {certificate.user.last_name}",
+            'course_title': course.title,
+            'instructor_name': f"{course.instructor.first_name} {course.instructor.last_name}",
+            'issued_by': ISSUER,
+            'signed': claims is not None
+        }
+        verification_cache.set(
+            certificate_number, payload,
+            current_app.config.get('CERTIFICATE_VERIFY_CACHE_SECONDS', 600),
+            tags=(f'certificate:{certificate.id}',)
+        )
+        return payload
+
+    def invalidate(self, certificate_id):
+        """Drop a certificate's cached verification, e.g. after regenerating it"""
+        verification_cache.invalidate(f'certificate:{certificate_id}')
+
+    def _signature(self, message):
+        key = current_app.config['CERTIFICATE_SIGNING_KEY'].encode()
+        digest = hmac.new(key, message.encode(), hashlib.sha256).digest()
+        return base64.b32encode(digest[:10]).decode()
+
+
+def _base36(number):
+    digits = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    encoded = ''
+    while True:
+        number, remainder = divmod(number, 36)
+        encoded = digits[remainder] + encoded
+        if not number:
+            return encoded
@@ -0,0 +1,148 @@
+import os
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import select, func, case, true
+from sqlalchemy.orm import joinedload
+from app import db
+from models import User, Course, Enrollment, Payment, UserRole, CourseStatus, PaymentStatus, MasterCategory, SubCategory
+from serializers import CourseSerializer
+
+
+def dashboard_statistics():
+    """The dashboard's scalar metrics in one query: each table is aggregated
+    once with conditional sums, and the one-row results are joined"""
+    month_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    def count_if(condition):
+        return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+    def sum_if(condition, value):
+        return func.coalesce(func.sum(case((condition, value), else_=0)), 0)
+
+    completed = Payment.status == PaymentStatus.COMPLETED
+    users = select(
+        func.count(User.id).label('total_users'),
+        count_if(User.role == UserRole.STUDENT).label('total_students'),
+        count_if(User.role == UserRole.INSTRUCTOR).label('total_instructors')
+    ).subquery()
+    master_categories = select(func.count(MasterCategory.id).label('master_categories')).subquery()
+    subcategories = select(func.count(SubCategory.id).label('subcategories')).subquery()
+    courses = select(
+        func.count(Course.id).label('total_courses'),
+        count_if(Course.status == CourseStatus.PUBLISHED).label('published_courses')
+    ).subquery()
+    enrollments = select(count_if(Enrollment.is_active == True).label('total_enrollments')).subquery()
+    payments = select(
+        sum_if(completed, Payment.amount).label('total_revenue'),
+        sum_if(completed & (Payment.created_at >= month_start), Payment.amount).label('this_month_revenue')
+    ).subquery()
+
+    query = select(users, master_categories, subcategories, courses, enrollments, payments).select_from(
+        users.join(master_categories, true())
+        .join(subcategories, true())
+        .join(courses, true())
+        .join(enrollments, true())
+        .join(payments, true())
+    )
+    row = db.session.execute(query).mappings().one()
+
+    statistics = {name: int(value) for name, value in row.items()}
+    statistics['total_revenue'] = float(row['total_revenue'])
+    statistics['this_month_revenue'] = float(row['this_month_revenue'])
+    return statistics
+
+
+def recent_activity(limit=10):
+    recent_users = User.query.order_by(User.created_at.desc()).limit(limit).all()
+    recent_enrollments = Enrollment.query.options(joinedload(Enrollment.user))\
+        .order_by(Enrollment.enrolled_at.desc()).limit(limit).all()
+    recent_payments = Payment.query.order_by(Payment.created_at.desc()).limit(limit).all()
+    recent_courses = CourseSerializer.dump_by_id(e.course_id for e in recent_enrollments)
+
+    return {
+        'users': [user.to_dict() for user in recent_users],
+        'enrollments': [
+            {
+                'enrollment': enrollment.to_dict(),
+                'user': enrollment.user.to_dict(),
+                'course': recent_courses.get(enrollment.course_id)
+            }
+            for enrollment in recent_enrollments
+        ],
+        'payments': [payment.to_dict() for payment in recent_payments]
+    }
+
+
+class DashboardSnapshot:
+    """The admin dashboard, computed in the background and served from memory.
+
+    The first request in a process computes the snapshot and starts a
+    refresher thread that recomputes it every ``DASHBOARD_SNAPSHOT_SECONDS``.
+    Requests return the latest snapshot and its age without touching the
+    database. The thread stops once nobody has asked for the dashboard for
+    ``DASHBOARD_SNAPSHOT_IDLE_SECONDS``; a snapshot older than two refresh
+    intervals is then recomputed by the next request.
+    """
+
+    def __init__(self):
+        self._snapshot = None
+        self._computed_at = None
+        self._refreshed = 0.0
+        self._last_read = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._app = None
+        self._pid = None
+
+    def init_app(self, app):
+        self._app = app
+
+    def get(self):
+        """Returns ``(snapshot, computed_at, age_seconds)``"""
+        interval = self._app.config.get('DASHBOARD_SNAPSHOT_SECONDS', 60)
+        self._last_read = time.monotonic()
+        if self._snapshot is None or time.monotonic() - self._refreshed > 2 * interval:
+            self.refresh()
+        self._ensure_refresher(interval)
+
+        with self._lock:
+            snapshot, computed_at, refreshed = self._snapshot, self._computed_at, self._refreshed
+        return snapshot, computed_at, time.monotonic() - refreshed
+
+    def refresh(self):
+        """Recompute the snapshot now"""
+        with self._refresh_lock:
+            with self._app.app_context():
+                try:
+                    snapshot = {'statistics': dashboard_statistics(), 'recent_activity': recent_activity()}
+                finally:
+                    db.session.remove()
+            with self._lock:
+                self._snapshot, self._computed_at, self._refreshed = snapshot, datetime.utcnow(), time.monotonic()
+
+    def _ensure_refresher(self, interval):
+        # Threads don't survive a fork, so each worker starts its own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, args=(interval,), name='dashboard-snapshot', daemon=True).start()
+
+    def _run(self, interval):
+        idle = self._app.config.get('DASHBOARD_SNAPSHOT_IDLE_SECONDS', 900)
+        while True:
+            time.sleep(interval)
+            if time.monotonic() - self._last_read > idle:
+                with self._lock:
+                    self._pid = None
+                return
+            try:
+                self.refresh()
+            except Exception as e:
+                self._app.logger.error(f"Dashboard snapshot refresh failed: {e}")
+
+
+dashboard_snapshot = DashboardSnapshot()
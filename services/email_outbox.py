@@ -0,0 +1,224 @@
+import smtplib
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from flask_mail import Message, BadHeaderError
+from sqlalchemy import select, update, insert, literal, Text
+from app import db, mail
+from models import OutboxEmail, EmailStatus
+
+# The server rejected the message itself; sending it again won't help
+PERMANENT_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, BadHeaderError, AssertionError)
+
+# The connection is gone; reconnect before sending anything else. Checked
+# after the per-message SMTP errors, which are OSErrors too.
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError)
+
+
+class EmailOutbox:
+    """Persistent outbox for outgoing email.
+
+    Request handlers only ``enqueue`` (in their own transaction, so a mail
+    goes out only if the change it announces is committed). ``flask
+    deliver-emails`` claims due messages in batches with a conditional
+    ``UPDATE`` (``SKIP LOCKED`` on PostgreSQL, so several workers can run)
+    and sends them over one reused SMTP connection. A failed message is
+    retried with exponential backoff until ``max_attempts``; messages the
+    server rejects outright fail immediately.
+    """
+
+    def enqueue(self, recipient, subject, body, html_body=None, sender=None):
+        email = OutboxEmail(
+            recipient=recipient,
+            sender=sender or _default_sender(),
+            subject=subject,
+            body=body,
+            html_body=html_body,
+            status=EmailStatus.PENDING,
+            attempts=0,
+            send_after=datetime.utcnow()
+        )
+        db.session.add(email)
+        return email
+
+    def enqueue_many(self, messages, sender=None):
+        """Queue ``(recipient, subject, body, html_body)`` tuples with one
+        multi-row INSERT. Returns the number queued."""
+        sender = sender or _default_sender()
+        rows = [{
+            'recipient': recipient,
+            'sender': sender,
+            'subject': subject,
+            'body': body,
+            'html_body': html_body
+        } for recipient, subject, body, html_body in messages]
+        if rows:
+            db.session.execute(insert(OutboxEmail), rows)
+        return len(rows)
+
+    def enqueue_select(self, recipients, subject, body, html_body=None, sender=None):
+        """Queue one message to every address a ``select(...)`` of email
+        addresses returns, with a single INSERT ... SELECT. Returns the
+        number queued."""
+        recipients = recipients.subquery()
+        query = select(
+            recipients.c[0],
+            literal(sender or _default_sender()),
+            literal(subject),
+            literal(body),
+            literal(html_body, Text)
+        )
+        result = db.session.execute(
+            insert(OutboxEmail).from_select(
+                ['recipient', 'sender', 'subject', 'body', 'html_body'], query
+            )
+        )
+        return result.rowcount
+
+    def claim(self, limit):
+        """Mark up to ``limit`` due messages as sending and return their ids"""
+        now = datetime.utcnow()
+        query = select(OutboxEmail.id)\
+            .where(OutboxEmail.status == EmailStatus.PENDING, OutboxEmail.send_after <= now)\
+            .order_by(OutboxEmail.send_after, OutboxEmail.id)\
+            .limit(limit)
+
+        with db.engine.begin() as connection:
+            if connection.dialect.name == 'postgresql':
+                query = query.with_for_update(skip_locked=True)
+            ids = connection.execute(query).scalars().all()
+            if not ids:
+                return []
+            # Another worker may have taken some since the SELECT; the lock
+            # time doubles as this claim's token
+            connection.execute(
+                update(OutboxEmail)
+                .where(OutboxEmail.id.in_(ids), OutboxEmail.status == EmailStatus.PENDING)
+                .values(status=EmailStatus.SENDING, locked_at=now)
+            )
+            return connection.execute(
+                select(OutboxEmail.id).where(
+                    OutboxEmail.id.in_(ids), OutboxEmail.status == EmailStatus.SENDING, OutboxEmail.locked_at == now
+                )
+            ).scalars().all()
+
+    def deliver(self, connection, ids, stats):
+        """Send claimed messages over an open ``mail.connect()`` connection.
+        Raises the connection error, after releasing the unsent messages, if
+        the connection drops."""
+        emails = OutboxEmail.query.filter(OutboxEmail.id.in_(ids)).order_by(OutboxEmail.id).all()
+        sent = []
+        try:
+            for email in emails:
+                try:
+                    message = Message(
+                        subject=email.subject,
+                        sender=email.sender,
+                        recipients=[email.recipient],
+                        body=email.body,
+                        html=email.html_body
+                    )
+                    connection.send(message)
+                    sent.append(email.id)
+                except PERMANENT_ERRORS as e:
+                    self._failed(email, e, permanent=True)
+                    stats['failed'] += 1
+                except smtplib.SMTPResponseException as e:
+                    if isinstance(e, smtplib.SMTPConnectError):
+                        raise
+                    failed = self._failed(email, e, permanent=e.smtp_code >= 500)
+                    stats['failed' if failed else 'retried'] += 1
+                except CONNECTION_ERRORS:
+                    # Not this message's fault: it goes back to the queue untried
+                    raise
+                except Exception as e:
+                    # The message can't be built or encoded; retrying won't help,
+                    # and letting it escape would stop the worker on it every time
+                    self._failed(email, e, permanent=True)
+                    stats['failed'] += 1
+        finally:
+            if sent:
+                db.session.execute(
+                    update(OutboxEmail).where(OutboxEmail.id.in_(sent))
+                    .values(status=EmailStatus.SENT, sent_at=datetime.utcnow(), locked_at=None, last_error=None)
+                    .execution_options(synchronize_session=False)
+                )
+                stats['sent'] += len(sent)
+            db.session.commit()
+            # Whatever wasn't attempted goes back to the queue as is
+            self.release(ids)
+
+    def release(self, ids):
+        """Return claimed messages that weren't attempted to the queue"""
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(OutboxEmail)
+                .where(OutboxEmail.id.in_(ids), OutboxEmail.status == EmailStatus.SENDING)
+                .values(status=EmailStatus.PENDING, locked_at=None)
+            )
+
+    def requeue_stale(self, timeout_seconds):
+        """Release messages whose worker died while sending them"""
+        cutoff = datetime.utcnow() - timedelta(seconds=timeout_seconds)
+        with db.engine.begin() as connection:
+            result = connection.execute(
+                update(OutboxEmail)
+                .where(OutboxEmail.status == EmailStatus.SENDING, OutboxEmail.locked_at < cutoff)
+                .values(status=EmailStatus.PENDING, locked_at=None)
+            )
+        return result.rowcount
+
+    def _failed(self, email, error, permanent=False):
+        """Record a failed attempt. Returns True if the message won't be retried."""
+        email.attempts += 1
+        email.last_error = f"{type(error).__name__}: {error}"[:1000]
+        email.locked_at = None
+        if permanent or email.attempts >= email.max_attempts:
+            email.status = EmailStatus.FAILED
+            return True
+        email.status = EmailStatus.PENDING
+        email.send_after = datetime.utcnow() + timedelta(seconds=min(3600, 60 * 2 ** (email.attempts - 1)))
+        return False
+
+
+def run_delivery(batch_size=200, poll_interval=5.0, once=False, report=None):
+    """Deliver queued email until interrupted; with ``once``, stop when
+    nothing is due. One SMTP connection is kept open while there is work.
+    ``report(stats)`` is called after every batch. Returns the totals."""
+    outbox = EmailOutbox()
+    timeout = current_app.config.get('EMAIL_OUTBOX_TIMEOUT_SECONDS', 300)
+    stats = {'sent': 0, 'failed': 0, 'retried': 0, 'seconds': 0.0}
+    started = time.monotonic()
+
+    try:
+        while True:
+            outbox.requeue_stale(timeout)
+            ids = outbox.claim(batch_size)
+            if not ids:
+                if once:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            try:
+                with mail.connect() as connection:
+                    while ids:
+                        outbox.deliver(connection, ids, stats)
+                        stats['seconds'] = time.monotonic() - started
+                        if report:
+                            report(stats)
+                        ids = outbox.claim(batch_size)
+            except CONNECTION_ERRORS as e:
+                current_app.logger.warning(f"SMTP connection failed, reconnecting: {e}")
+                db.session.rollback()
+                outbox.release(ids)
+                time.sleep(poll_interval)
+    finally:
+        db.session.remove()
+
+    stats['seconds'] = time.monotonic() - started
+    return stats
+
+
+def _default_sender():
+    return current_app.config.get('MAIL_DEFAULT_SENDER')
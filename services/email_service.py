@@ -1,30 +1,36 @@
-from flask_mail import Message
-from app import mail
 from flask import current_app
+from markupsafe import escape
+from sqlalchemy import Select
 import os
 from datetime import datetime
+from services.email_outbox import EmailOutbox
 
 class EmailService:
+    """Compose emails and queue them in the outbox (services/email_outbox.py).
+
+    Nothing is sent from the request: messages are added to the caller's
+    transaction and delivered by ``flask deliver-emails`` once committed.
+    """
     def __init__(self):
         self.sender = os.environ.get('MAIL_DEFAULT_SENDER', 'mohammed.ehtesham@aimtechnologies.in')
+        self.outbox = EmailOutbox()
     
     def send_email(self, recipient, subject, body, html_body=None):
-        """Send email using Flask-Mail"""
-        try:
-            msg = Message(
-                subject=subject,
-                sender=self.sender,
-                recipients=[recipient] if isinstance(recipient, str) else recipient
-            )
-            msg.body = body
-            if html_body:
-                msg.html = html_body
-            
-            mail.send(msg)
-            return True
-        except Exception as e:
-            print(f"Failed to send email to {recipient}: {str(e)}")
-            return False
+        """Queue an email to one or more recipients"""
+        recipients = [recipient] if isinstance(recipient, str) else recipient
+        for address in recipients:
+            self.outbox.enqueue(address, subject, body, html_body, sender=self.sender)
+        return True
+    
+    def send_bulk_email(self, recipients, subject, body, html_body=None):
+        """Queue the same email to many recipients with one INSERT.
+        ``recipients`` is a list of addresses or a ``select()`` of them."""
+        if isinstance(recipients, Select):
+            return self.outbox.enqueue_select(recipients, subject, body, html_body, sender=self.sender)
+        return self.outbox.enqueue_many(
+            ((address, subject, body, html_body) for address in recipients),
+            sender=self.sender
+        )
     
     def send_welcome_email(self, user):
         """Send welcome email to new users"""
@@ -75,3 +81,85 @@ The AI First Python Training Management System Team</p>
 """
         
         return self.send_email(user.email, subject, body, html_body)
+    
+    def send_notification_email(self, user, title, message):
+        """Queue a notification email to a user"""
+        return self.send_email(user.email, title, *self._notification_bodies(user.first_name, title, message))
+    
+    def send_bulk_notification_email(self, users, title, message):
+        """Queue a notification email to many users, or to a ``select()`` of
+        email addresses. The greeting is generic so every recipient shares
+        one message body."""
+        body, html_body = self._notification_bodies(None, title, message)
+        if not isinstance(users, Select):
+            users = [user.email for user in users]
+        return self.send_bulk_email(users, title, body, html_body)
+    
+    def send_live_session_notification(self, user, course, session):
+        """Queue the announcement of a scheduled live session"""
+        scheduled = session.scheduled_at.strftime("%B %d, %Y at %H:%M UTC")
+        subject = f"Live session scheduled: {session.title}"
+        
+        body = f"""
+Dear {user.first_name},
+
+A live session has been scheduled for {course.title}.
+
+Session: {session.title}
+When: {scheduled}
+Duration: {session.duration_minutes} minutes
+{f"Join: {session.meeting_url}" if session.meeting_url else ""}
+
+Best regards,
+The AI First Academy Team
+"""
+        
+        html_body = f"""
+<html>
+<body>
+<p>Dear {escape(user.first_name)},</p>
+
+<p>A live session has been scheduled for <strong>{escape(course.title)}</strong>.</p>
+
+<ul>
+    <li>Session: {escape(session.title)}</li>
+    <li>When: {scheduled}</li>
+    <li>Duration: {session.duration_minutes} minutes</li>
+</ul>
+{f'<p><a href="{escape(session.meeting_url)}">Join the session</a></p>' if session.meeting_url else ""}
+
+<p>Best regards,<br>
+The AI First Academy Team</p>
+</body>
+</html>
+"""
+        
+        return self.send_email(user.email, subject, body, html_body)
+    
+    def _notification_bodies(self, first_name, title, message):
+        greeting = f"Dear {first_name}," if first_name else "Hello,"
+        
+        body = f"""
+{greeting}
+
+{message}
+
+Best regards,
+The AI First Academy Team
+"""
+        
+        html_body = f"""
+<html>
+<body>
+<h2>{escape(title)}</h2>
+
+<p>{escape(greeting)}</p>
+
+<p>{escape(message)}</p>
+
+<p>Best regards,<br>
+The AI First Academy Team</p>
+</body>
+</html>
+"""
+        return body, html_body
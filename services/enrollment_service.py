@@ -0,0 +1,90 @@
+from datetime import datetime
+from sqlalchemy import update, select, func
+from app import db
+from models import Course, Enrollment
+from services.notification_service import UnreadCounter
+from services.analytics_service import AnalyticsRollup
+
+
+class EnrollmentService:
+    """Create and update enrollments while keeping the course counters in sync.
+
+    ``Course.enrolled_count``, ``active_enrolled_count`` and ``completed_count``
+    are adjusted with atomic ``UPDATE`` statements in the caller's transaction,
+    so they are committed (or rolled back) together with the enrollment row.
+    """
+
+    def enroll(self, user_id, course_id):
+        """Enroll a user, reactivating an old enrollment if there is one.
+
+        Returns ``(enrollment, status)`` where status is ``'created'``,
+        ``'reactivated'`` or ``'existing'``.
+        """
+        enrollment = Enrollment.query.filter_by(user_id=user_id, course_id=course_id).first()
+
+        if enrollment:
+            if enrollment.is_active:
+                return enrollment, 'existing'
+
+            enrollment.is_active = True
+            self._bump(course_id, active_enrolled_count=1)
+            UnreadCounter().audience_changed([user_id])
+            return enrollment, 'reactivated'
+
+        enrollment = Enrollment(user_id=user_id, course_id=course_id)
+        db.session.add(enrollment)
+        self._bump(course_id, enrolled_count=1, active_enrolled_count=1)
+        UnreadCounter().audience_changed([user_id])
+        AnalyticsRollup().enrolled(enrollment)
+        return enrollment, 'created'
+
+    def deactivate(self, enrollment):
+        """Deactivate an enrollment"""
+        if not enrollment.is_active:
+            return False
+
+        enrollment.is_active = False
+        self._bump(enrollment.course_id, active_enrolled_count=-1)
+        UnreadCounter().audience_changed([enrollment.user_id])
+        return True
+
+    def mark_completed(self, enrollment, completed_at=None):
+        """Mark an enrollment as completed"""
+        if enrollment.completed_at:
+            return False
+
+        enrollment.completed_at = completed_at or datetime.utcnow()
+        self._bump(enrollment.course_id, completed_count=1)
+        AnalyticsRollup().completed(enrollment)
+        return True
+
+    def reconcile_counters(self, course_ids=None):
+        """Rebuild the course counters from the enrollments table"""
+        def count_where(*conditions):
+            return select(func.count(Enrollment.id)).where(
+                Enrollment.course_id == Course.id, *conditions
+            ).scalar_subquery()
+
+        stmt = update(Course).values(
+            enrolled_count=count_where(),
+            active_enrolled_count=count_where(Enrollment.is_active == True),
+            completed_count=count_where(Enrollment.completed_at.isnot(None)),
+            # Counters aren't edits to the course; keep onupdate off updated_at
+            updated_at=Course.updated_at
+        )
+        if course_ids:
+            stmt = stmt.where(Course.id.in_(course_ids))
+
+        result = db.session.execute(stmt.execution_options(synchronize_session=False))
+        db.session.commit()
+        return result.rowcount
+
+    def _bump(self, course_id, **deltas):
+        values = {
+            name: getattr(Course, name) + delta
+            for name, delta in deltas.items()
+        }
+        db.session.execute(
+            update(Course).where(Course.id == course_id)
+            .values(**values, updated_at=Course.updated_at)
+        )
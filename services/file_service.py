@@ -1,12 +1,20 @@
 import os
-import uuid
-from werkzeug.utils import secure_filename
-from flask import send_file, abort
+import hashlib
+from datetime import timedelta
+from urllib.parse import quote
+from werkzeug.utils import secure_filename, send_file as werkzeug_send_file
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+from flask import send_file, abort, request, current_app
 import mimetypes
 # from moviepy.editor import VideoFileClip
-import os
 import cv2
 
+# Read/write size when streaming upload chunks
+CHUNK_BLOCK_SIZE = 1024 * 1024
+
+# Served inline (playable/viewable in the browser) rather than as a download
+INLINE_MIME_PREFIXES = ('video/', 'audio/', 'image/')
+
 class FileService:
     def __init__(self):
         self.upload_folder = os.environ.get('UPLOAD_FOLDER', 'uploads')
@@ -15,8 +23,13 @@ class FileService:
         # Create upload directory if it doesn't exist
         os.makedirs(self.upload_folder, exist_ok=True)
     
-    def save_file(self, file, subfolder=None):
-        """Save uploaded file and return file path and size"""
+    def save_file(self, file, owner_id=None, course_id=None):
+        """Save uploaded file and return file path and size.
+
+        Files go to the private content-addressed store, so re-uploading the
+        same content reuses the stored copy.
+        """
+        from services.blob_store import BlobStore
         try:
             if not file or not file.filename:
                 raise ValueError("No file provided")
@@ -31,45 +44,64 @@ class FileService:
             if not filename:
                 raise ValueError("Invalid filename")
             
-            # Generate unique filename to avoid conflicts
-            name, ext = os.path.splitext(filename)
-            unique_filename = f"{name}_{uuid.uuid4().hex[:8]}{ext}"
-            
-            # Create subfolder if specified
-            if subfolder:
-                folder_path = os.path.join(self.upload_folder, subfolder)
-                os.makedirs(folder_path, exist_ok=True)
-                file_path = os.path.join(folder_path, unique_filename)
-                relative_path = os.path.join(subfolder, unique_filename)
-            else:
-                file_path = os.path.join(self.upload_folder, unique_filename)
-                relative_path = unique_filename
-            
-            # Save the file
-            file.save(file_path)
-            
-            # Get file size
-            file_size = os.path.getsize(file_path)
-            
-            return relative_path, file_size
+            return BlobStore().save(file, filename, owner_id=owner_id, course_id=course_id)
             
         except Exception as e:
             raise Exception(f"File save error: {str(e)}")
-    
+
+    def write_chunk(self, full_path, offset, stream, length, expected_sha256=None):
+        """Copy ``length`` bytes from ``stream`` into ``full_path`` at ``offset``.
+
+        The request body is streamed straight into the destination file, so a
+        chunk is never buffered or copied again. Raises ValueError when the
+        body is short or does not match ``expected_sha256``; the bytes written
+        are then simply overwritten by the retry.
+        """
+        digest = hashlib.sha256()
+        written = 0
+        with open(full_path, 'r+b') as f:
+            f.seek(offset)
+            while written < length:
+                block = stream.read(min(CHUNK_BLOCK_SIZE, length - written))
+                if not block:
+                    break
+                f.write(block)
+                digest.update(block)
+                written += len(block)
+            f.flush()
+            os.fsync(f.fileno())
+
+        if written != length:
+            raise ValueError(f"Expected {length} bytes, received {written}")
+        if expected_sha256 and digest.hexdigest() != expected_sha256.lower():
+            raise ValueError("Chunk checksum mismatch")
+        return written
+
+    def file_sha256(self, full_path):
+        """SHA-256 hex digest of a file, read in blocks"""
+        digest = hashlib.sha256()
+        with open(full_path, 'rb') as f:
+            for block in iter(lambda: f.read(CHUNK_BLOCK_SIZE), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
     def delete_file(self, file_path):
         """Delete file from filesystem"""
+        from services.blob_store import is_blob_path
+        from services.storage_index import StorageIndex
         try:
             if not file_path:
                 return False
             
-            # Construct full path
-            if not os.path.isabs(file_path):
-                full_path = os.path.join(self.upload_folder, file_path)
-            else:
-                full_path = file_path
+            # Blobs are reference counted and removed when the last record
+            # pointing at them goes away
+            if is_blob_path(file_path):
+                return False
             
-            if os.path.exists(full_path):
-                os.remove(full_path)
+            located = self.locate(file_path)
+            if located:
+                os.remove(located)
+                StorageIndex().forget(located)
                 return True
             
             return False
@@ -78,36 +110,105 @@ class FileService:
             print(f"Error deleting file {file_path}: {str(e)}")
             return False
     
-    def send_file(self, file_path, download_name=None):
-        """Send file for download"""
-        try:
-            print("file path recieved to file service",file_path)
+    def resolve_path(self, file_path):
+        """Absolute path of a stored file, or None if it doesn't exist.
 
-            if not file_path:
-                abort(404, "File not found")
-            
-            # # Construct full path
-            # if not os.path.isabs(file_path):
-            #     full_path = os.path.join(self.upload_folder, file_path)
-            # else:
-            #     full_path = file_path
-            #     full_path = file_path.replace("\\", "/")
-            full_path = file_path
-            if not os.path.exists(full_path):
-                abort(404, "File not found")
-            
-            # Determine MIME type
-            mime_type, _ = mimetypes.guess_type(full_path)
-            
-            return send_file(
+        Paths from ``save_file`` are relative to the upload folder; the
+        course routes store paths relative to the working directory.
+        """
+        located = self.locate(file_path)
+        return os.path.abspath(located) if located else None
+
+    def locate(self, file_path):
+        """Like ``resolve_path``, but keeps the path as stored (relative to
+        the working directory when it was)"""
+        if not file_path:
+            return None
+        candidates = [file_path]
+        if not os.path.isabs(file_path):
+            candidates.append(os.path.join(self.upload_folder, file_path))
+        for candidate in candidates:
+            if os.path.isfile(candidate):
+                return candidate
+        return None
+
+    def send_file(self, file_path, download_name=None, inline=None):
+        """Send a file, honouring conditional and range requests.
+
+        Responses carry an ETag and Last-Modified, answer If-None-Match /
+        If-Modified-Since with 304 and Range with 206, so a player can seek
+        and re-watch without downloading from byte zero. Audio, video and
+        images are served inline unless ``inline`` says otherwise.
+
+        With ``FILE_OFFLOAD`` set to ``x-accel`` (nginx) or ``x-sendfile``
+        (Apache, lighttpd) only the headers are sent and the front-end server
+        streams the bytes; do the access checks before calling this.
+        """
+        full_path = self.resolve_path(file_path)
+        if not full_path:
+            abort(404, "File not found")
+
+        mime_type, _ = mimetypes.guess_type(full_path)
+        if inline is None:
+            inline = (mime_type or '').startswith(INLINE_MIME_PREFIXES)
+        download_name = download_name or os.path.basename(full_path)
+        if not os.path.splitext(download_name)[1]:
+            download_name += os.path.splitext(full_path)[1]
+
+        offload = current_app.config.get('FILE_OFFLOAD')
+        if offload:
+            response = self._offload(offload, full_path, mime_type, download_name, inline)
+            if response is not None:
+                return response
+
+        try:
+            response = send_file(
                 full_path,
-                as_attachment=True,
-                download_name=download_name or os.path.basename(full_path),
-                mimetype=mime_type
+                mimetype=mime_type,
+                as_attachment=not inline,
+                download_name=download_name,
+                conditional=True,
+                etag=True,
+                max_age=current_app.config.get('FILE_MAX_AGE', 0)
             )
-            
-        except Exception as e:
-            abort(500, f"Error serving file: {str(e)}")
+        except RequestedRangeNotSatisfiable as e:
+            # Return the 416 rather than raising it into the route's
+            # catch-all exception handler
+            return e.get_response()
+
+        # Access-checked content: browsers may cache it, shared caches may not
+        response.cache_control.public = False
+        response.cache_control.private = True
+        return response
+
+    def _offload(self, mode, full_path, mime_type, download_name, inline):
+        # werkzeug builds the X-Sendfile response (headers, no body); nginx
+        # wants a URI under an internal location instead of a path
+        response = werkzeug_send_file(
+            full_path,
+            request.environ,
+            mimetype=mime_type,
+            as_attachment=not inline,
+            download_name=download_name,
+            conditional=False,
+            use_x_sendfile=True
+        )
+        response.cache_control.private = True
+        if mode == 'x-sendfile':
+            return response
+
+        if mode == 'x-accel':
+            root = os.path.abspath(current_app.config.get('FILE_OFFLOAD_ROOT') or os.getcwd())
+            relative = os.path.relpath(full_path, root)
+            if relative.startswith(os.pardir):
+                current_app.logger.warning(f"{full_path} is outside FILE_OFFLOAD_ROOT, serving it directly")
+                return None
+            prefix = current_app.config.get('FILE_OFFLOAD_PREFIX', '/protected/').rstrip('/')
+            del response.headers['X-Sendfile']
+            response.headers['X-Accel-Redirect'] = f"{prefix}/{quote(relative.replace(os.sep, '/'))}"
+            return response
+
+        raise ValueError(f"Unsupported FILE_OFFLOAD: {mode}")
     
     def get_file_info(self, file_path):
         """Get file information"""
@@ -165,32 +266,26 @@ class FileService:
             return False
     
     def list_files(self, subfolder=None):
-        """List files in upload directory or subfolder"""
+        """List files in upload directory or subfolder (from the storage index)"""
+        from services.storage_index import StorageIndex
         try:
             if subfolder:
                 folder_path = os.path.join(self.upload_folder, subfolder)
             else:
                 folder_path = self.upload_folder
             
-            if not os.path.exists(folder_path):
-                return []
-            
             files = []
-            for filename in os.listdir(folder_path):
-                file_path = os.path.join(folder_path, filename)
-                if os.path.isfile(file_path):
-                    stat_info = os.stat(file_path)
-                    mime_type, _ = mimetypes.guess_type(file_path)
-                    
-                    relative_path = os.path.join(subfolder, filename) if subfolder else filename
-                    
-                    files.append({
-                        'filename': filename,
-                        'path': relative_path,
-                        'size': stat_info.st_size,
-                        'modified': stat_info.st_mtime,
-                        'mime_type': mime_type
-                    })
+            for stored in StorageIndex().list_folder(folder_path):
+                filename = os.path.basename(stored.path)
+                relative_path = os.path.join(subfolder, filename) if subfolder else filename
+                
+                files.append({
+                    'filename': filename,
+                    'path': relative_path,
+                    'size': stored.size,
+                    'modified': stored.created_at.timestamp() if stored.created_at else None,
+                    'mime_type': stored.mime_type
+                })
             
             return files
             
@@ -198,27 +293,15 @@ class FileService:
             print(f"Error listing files: {str(e)}")
             return []
     
-    def get_upload_stats(self):
-        """Get upload statistics"""
+    def get_upload_stats(self, group_by=None, owner_id=None, course_id=None):
+        """Get upload statistics, in total or grouped by owner, course or
+        mime_type (aggregate queries on the storage index)"""
+        from services.storage_index import StorageIndex
         try:
-            total_files = 0
-            total_size = 0
-            
-            for root, dirs, files in os.walk(self.upload_folder):
-                total_files += len(files)
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    try:
-                        total_size += os.path.getsize(file_path)
-                    except OSError:
-                        continue
-            
-            return {
-                'total_files': total_files,
-                'total_size': total_size,
-                'total_size_mb': total_size / (1024 * 1024)
-            }
+            return StorageIndex().stats(group_by=group_by, owner_id=owner_id, course_id=course_id)
             
+        except ValueError:
+            raise
         except Exception as e:
             print(f"Error getting upload stats: {str(e)}")
             return {
@@ -228,33 +311,20 @@ class FileService:
             }
     
     def cleanup_old_files(self, days=30):
-        """Clean up files older than specified days"""
+        """Clean up unreferenced files older than specified days.
+
+        Files still referenced by a lesson, resource, certificate, course,
+        user or upload session are kept however old they are
+        (see ``StorageCollector``).
+        """
+        from services.storage_gc import StorageCollector
         try:
-            import time
-            
-            current_time = time.time()
-            cutoff_time = current_time - (days * 24 * 60 * 60)
-            
-            deleted_count = 0
-            deleted_size = 0
-            
-            for root, dirs, files in os.walk(self.upload_folder):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    try:
-                        stat_info = os.stat(file_path)
-                        if stat_info.st_mtime < cutoff_time:
-                            file_size = stat_info.st_size
-                            os.remove(file_path)
-                            deleted_count += 1
-                            deleted_size += file_size
-                    except OSError:
-                        continue
+            result = StorageCollector().collect(roots=[self.upload_folder], min_age=timedelta(days=days))
             
             return {
-                'deleted_files': deleted_count,
-                'deleted_size': deleted_size,
-                'deleted_size_mb': deleted_size / (1024 * 1024)
+                'deleted_files': result['deleted_files'],
+                'deleted_size': result['reclaimed_size'],
+                'deleted_size_mb': result['reclaimed_size_mb']
             }
             
         except Exception as e:
@@ -266,13 +336,40 @@ class FileService:
             }
     
 
-    def get_video_duration_minutes(file_path):
+    @staticmethod
+    def probe_media(file_path):
+        """Read duration, fps, resolution and codec from a video's container.
+
+        Returns None when OpenCV cannot open the file as video. This opens the
+        whole container, so call it from a background job (``probe_media``
+        in services/media_service.py), not from a request.
+        """
         cap = cv2.VideoCapture(file_path)
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
-        cap.release()
-        if fps > 0:
-            duration_seconds = frame_count / fps
-            return round(duration_seconds / 60, 2)
+        try:
+            if not cap.isOpened():
+                return None
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+            fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        finally:
+            cap.release()
+
+        if fps <= 0:
+            return None
+        codec = ''.join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)).strip('\x00 ') or None
+        return {
+            'duration_seconds': round(frame_count / fps, 2),
+            'fps': round(fps, 3),
+            'width': width,
+            'height': height,
+            'codec': codec
+        }
+
+    @staticmethod
+    def get_video_duration_minutes(file_path):
+        info = FileService.probe_media(file_path)
+        if info:
+            return round(info['duration_seconds'] / 60, 2)
         return None
-        
\ No newline at end of file
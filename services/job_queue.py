@@ -0,0 +1,248 @@
+import importlib
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, update
+from app import db
+from models import Job, JobStatus
+
+# Modules that register job handlers, imported by the worker
+HANDLER_MODULES = ('services.media_service', 'services.bulk_certificate_service', 'services.notification_service')
+
+_handlers = {}
+
+
+def job_handler(kind, on_failure=None, bind=False):
+    """Register ``f(payload)`` as the handler for jobs of ``kind``; with
+    ``bind``, ``f(job, payload)``. A JSON-serializable return value is saved
+    as the job's ``result``.
+
+    ``on_failure(payload, error)`` runs once the job has used up its
+    attempts, in the same transaction that marks it failed.
+    """
+    def decorator(f):
+        _handlers[kind] = (f, on_failure, bind)
+        return f
+    return decorator
+
+
+class JobQueue:
+    """Database-backed background jobs.
+
+    Jobs are rows in ``jobs``: ``enqueue`` adds one in the caller's
+    transaction, so a job never runs before the records it refers to are
+    committed. ``flask run-jobs`` claims due jobs with a conditional
+    ``UPDATE`` (and ``SKIP LOCKED`` on PostgreSQL) and runs them in a pool of
+    worker processes. A failing job is retried with exponential backoff until
+    ``max_attempts``; a job whose worker died is requeued after
+    ``JOB_TIMEOUT_SECONDS``.
+
+    Each claim is identified by the job's ``attempts`` at the time. A run
+    only records its outcome while the job still carries that claim, so a
+    slow run that was requeued and claimed again can't finish the job twice.
+    """
+
+    def enqueue(self, kind, payload=None, max_attempts=3, run_after=None, parent=None):
+        """Add a job; ``parent`` groups it under another job (e.g. one batch
+        of a larger run)"""
+        job = Job(
+            kind=kind,
+            payload=payload or {},
+            parent_id=parent.id if parent is not None else None,
+            status=JobStatus.QUEUED,
+            attempts=0,
+            max_attempts=max_attempts,
+            run_after=run_after or datetime.utcnow()
+        )
+        db.session.add(job)
+        return job
+
+    def claim(self, limit):
+        """Mark up to ``limit`` due jobs as running and return
+        ``(job_id, attempt)`` pairs"""
+        if limit <= 0:
+            return []
+
+        now = datetime.utcnow()
+        query = select(Job.id)\
+            .where(Job.status == JobStatus.QUEUED, Job.run_after <= now)\
+            .order_by(Job.run_after, Job.id)\
+            .limit(limit)
+
+        claimed = []
+        with db.engine.begin() as connection:
+            if connection.dialect.name == 'postgresql':
+                query = query.with_for_update(skip_locked=True)
+            for job_id in connection.execute(query).scalars().all():
+                # Another worker may have taken it since the SELECT
+                result = connection.execute(
+                    update(Job)
+                    .where(Job.id == job_id, Job.status == JobStatus.QUEUED)
+                    .values(status=JobStatus.RUNNING, locked_at=now, attempts=Job.attempts + 1)
+                    .returning(Job.attempts)
+                )
+                attempt = result.scalar()
+                if attempt is not None:
+                    claimed.append((job_id, attempt))
+        return claimed
+
+    def run(self, job_id, attempt):
+        """Run a claimed job. The handler's writes and the job's completion
+        are committed together, and only while the claim still holds."""
+        job = db.session.get(Job, job_id)
+        if job is None or job.status != JobStatus.RUNNING or job.attempts != attempt:
+            return False
+
+        kind = job.kind
+        handler, on_failure, bind = _handlers.get(kind, (None, None, False))
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job kind '{kind}'")
+            result = handler(job, job.payload) if bind else handler(job.payload)
+            finished = db.session.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.status == JobStatus.RUNNING, Job.attempts == attempt)
+                .values(status=JobStatus.DONE, result=result, finished_at=datetime.utcnow(), last_error=None)
+                .execution_options(synchronize_session=False)
+            )
+            if finished.rowcount != 1:
+                db.session.rollback()
+                current_app.logger.warning(f"Job {job_id} ({kind}) timed out and was requeued; discarding this run")
+                return False
+            db.session.commit()
+            return True
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.warning(f"Job {job_id} ({kind}) failed: {e}")
+            self._failed(job_id, attempt, on_failure, f"{type(e).__name__}: {e}")
+            return False
+
+    def requeue_stale(self, timeout_seconds):
+        """Requeue running jobs whose worker has not finished them in time"""
+        cutoff = datetime.utcnow() - timedelta(seconds=timeout_seconds)
+        stale = (Job.status == JobStatus.RUNNING, Job.locked_at < cutoff)
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(Job).where(*stale, Job.attempts >= Job.max_attempts)
+                .values(status=JobStatus.FAILED, last_error='Timed out', finished_at=datetime.utcnow())
+            )
+            result = connection.execute(
+                update(Job).where(*stale).values(status=JobStatus.QUEUED, locked_at=None)
+            )
+        return result.rowcount
+
+    def _failed(self, job_id, attempt, on_failure, error):
+        job = db.session.get(Job, job_id, with_for_update=True)
+        if job is None or job.status != JobStatus.RUNNING or job.attempts != attempt:
+            # Requeued after a timeout; the current claim decides
+            db.session.rollback()
+            return
+        job.last_error = error
+        job.locked_at = None
+        if job.attempts >= job.max_attempts:
+            job.status = JobStatus.FAILED
+            job.finished_at = datetime.utcnow()
+            if on_failure:
+                on_failure(job.payload, error)
+        else:
+            job.status = JobStatus.QUEUED
+            job.run_after = datetime.utcnow() + timedelta(seconds=30 * 2 ** (job.attempts - 1))
+        db.session.commit()
+
+    def release(self, job_ids, error):
+        """Requeue running jobs whose worker process died, or fail the ones
+        that have used up their attempts"""
+        running = (Job.id.in_(job_ids), Job.status == JobStatus.RUNNING)
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(Job).where(*running, Job.attempts >= Job.max_attempts)
+                .values(status=JobStatus.FAILED, last_error=error, locked_at=None, finished_at=datetime.utcnow())
+            )
+            connection.execute(
+                update(Job).where(*running).values(status=JobStatus.QUEUED, last_error=error, locked_at=None)
+            )
+
+
+def run_worker(processes=2, poll_interval=2.0, once=False):
+    """Claim and run jobs until interrupted; with ``once``, stop when no job
+    is due. Returns the number of jobs run."""
+    global _worker_app
+
+    queue = JobQueue()
+    timeout = current_app.config.get('JOB_TIMEOUT_SECONDS', 600)
+    _worker_app = current_app._get_current_object()
+
+    processed = 0
+    running = {}
+    pool = ProcessPoolExecutor(max_workers=processes, initializer=_init_worker)
+    try:
+        while True:
+            queue.requeue_stale(timeout)
+            for job_id, attempt in queue.claim(processes - len(running)):
+                running[pool.submit(_run_job, job_id, attempt)] = job_id
+
+            if not running:
+                if once:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            done, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            broken = []
+            for future in done:
+                job_id = running.pop(future)
+                try:
+                    future.result()
+                    processed += 1
+                except BrokenProcessPool:
+                    broken.append(job_id)
+                except Exception as e:
+                    # run() handles the job's own errors; this is e.g. a
+                    # result that couldn't be sent back from the child
+                    current_app.logger.error(f"Job {job_id} did not report back: {type(e).__name__}: {e}")
+
+            if broken:
+                # A child died (killed, out of memory, crashed in native
+                # code): every job it was sharing the pool with fails too.
+                # Start a new pool and put those jobs back in the queue.
+                broken += running.values()
+                current_app.logger.error(f"Job worker pool broke, restarting it and requeueing jobs {broken}")
+                pool.shutdown(wait=False, cancel_futures=True)
+                queue.release(broken, 'Worker process died')
+                running = {}
+                pool = ProcessPoolExecutor(max_workers=processes, initializer=_init_worker)
+    finally:
+        pool.shutdown()
+
+    return processed
+
+
+_worker_app = None
+_worker_context = None
+
+
+def _init_worker():
+    global _worker_context
+
+    app = _worker_app
+    if app is None:
+        # Spawned rather than forked: nothing was inherited from the parent
+        from app import create_app
+        app = create_app()
+    _worker_context = app.app_context()
+    _worker_context.push()
+    # A forked worker inherits the parent's pooled connections; start a fresh
+    # pool without closing the parent's sockets
+    db.engine.dispose(close=False)
+
+    for module in HANDLER_MODULES:
+        importlib.import_module(module)
+
+
+def _run_job(job_id, attempt):
+    try:
+        return JobQueue().run(job_id, attempt)
+    finally:
+        db.session.remove()
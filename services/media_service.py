@@ -0,0 +1,76 @@
+import math
+import os
+from sqlalchemy import select, func
+from app import db
+from models import Lesson, LessonResource, CourseModule
+from services.file_service import FileService
+from services.job_queue import JobQueue, job_handler
+
+VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv'}
+
+_models = {'lesson': Lesson, 'resource': LessonResource}
+
+
+class MediaService:
+    """Probe uploaded videos in the background.
+
+    Uploads only record the file and queue a ``probe_media`` job; the worker
+    (``flask run-jobs``) reads duration, fps, resolution and codec, fills in
+    ``duration_minutes`` and ``media_info`` and flips ``media_status`` from
+    ``pending`` to ``ready`` or ``failed``.
+    """
+
+    def enqueue_probe(self, record):
+        """Queue a probe for a Lesson's video or a video LessonResource.
+        Returns False for records without a video. The record must be flushed."""
+        if isinstance(record, Lesson):
+            kind, path = 'lesson', record.video_url
+        else:
+            kind, path = 'resource', record.file_path
+            if (record.file_type or '').lower() not in VIDEO_EXTENSIONS:
+                return False
+        if not path:
+            return False
+
+        record.media_status = 'pending'
+        JobQueue().enqueue('probe_media', {'model': kind, 'id': record.id})
+        return True
+
+
+def _resolve(path):
+    # FileService.save_file stores paths relative to the upload folder, the
+    # course routes relative to the working directory
+    if os.path.exists(path):
+        return path
+    return os.path.join(FileService().upload_folder, path)
+
+
+def _mark_failed(payload, error):
+    record = db.session.get(_models[payload['model']], payload['id'])
+    if record:
+        record.media_status = 'failed'
+
+
+@job_handler('probe_media', on_failure=_mark_failed)
+def probe_media(payload):
+    record = db.session.get(_models[payload['model']], payload['id'])
+    if record is None:
+        return
+
+    path = record.video_url if isinstance(record, Lesson) else record.file_path
+    info = FileService.probe_media(_resolve(path))
+    if info is None:
+        # Not a readable video; retrying won't change that
+        record.media_status = 'failed'
+        return
+
+    record.media_info = info
+    record.duration_minutes = math.ceil(info['duration_seconds'] / 60)
+    record.media_status = 'ready'
+
+    if isinstance(record, Lesson):
+        db.session.flush()
+        module = db.session.get(CourseModule, record.module_id)
+        module.duration_minutes = db.session.scalar(
+            select(func.coalesce(func.sum(Lesson.duration_minutes), 0)).where(Lesson.module_id == module.id)
+        )
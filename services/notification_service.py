@@ -0,0 +1,458 @@
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import select, insert, update, delete, and_, or_, case, func, literal, union_all
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.attributes import set_committed_value
+from app import db
+from models import Notification, BroadcastNotification, BroadcastReceipt, NotificationCounter, Enrollment, User, LiveSession
+from services.job_queue import JobQueue, job_handler
+from utils.event_hub import event_hub
+
+NOTIFICATION = 'notification'
+BROADCAST = 'broadcast'
+
+# Event stream (GET /notifications/stream) event names; UNREAD_CHANGED only
+# tells the stream to send the user's new unread count
+NOTIFICATION_EVENT = 'notification'
+UNREAD_CHANGED = 'unread_changed'
+LIVE_SESSION_EVENT = 'live_session'
+LIVE_SESSION_REMINDER_EVENT = 'live_session_reminder'
+
+REMINDER_KIND = 'live_session_reminder'
+
+
+class NotificationFeed:
+    """A user's notifications: their own rows plus the broadcasts addressed
+    to them, merged at read time.
+
+    A broadcast is stored once (``BroadcastNotification``) for a role and/or
+    the students of a course, so sending one is a single INSERT however
+    large the audience. A ``BroadcastReceipt`` is only written when a user
+    reads or dismisses a broadcast; an absent receipt means unread. Users
+    don't see broadcasts sent before their account existed.
+
+    Every change to what's unread goes through here so the cached count
+    (``UnreadCounter``) stays in step, in the caller's transaction.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.items = self._items()
+
+    def query(self, unread_only=False):
+        """Query over ``items`` for ``paginate``, which orders it by
+        ``items.c.created_at, items.c.feed_key``"""
+        query = db.session.query(self.items)
+        if unread_only:
+            query = query.filter(self.items.c.is_read == False)
+        return query
+
+    def _items(self):
+        """The merged feed as a subquery with ``id``, ``source``, ``title``,
+        ``message``, ``type``, ``is_read``, ``created_at`` and ``feed_key``
+        (unique across both sources: notifications even, broadcasts odd)"""
+        personal = select(
+            Notification.id,
+            literal(NOTIFICATION).label('source'),
+            Notification.title,
+            Notification.message,
+            Notification.type,
+            Notification.is_read,
+            Notification.created_at,
+            (Notification.id * 2).label('feed_key')
+        ).where(Notification.user_id == self.user.id)
+
+        broadcasts = self._broadcasts(
+            BroadcastNotification.id,
+            literal(BROADCAST),
+            BroadcastNotification.title,
+            BroadcastNotification.message,
+            BroadcastNotification.type,
+            case((BroadcastReceipt.read_at.isnot(None), True), else_=False),
+            BroadcastNotification.created_at,
+            BroadcastNotification.id * 2 + 1
+        ).where(BroadcastReceipt.dismissed_at.is_(None))
+
+        return union_all(personal, broadcasts).subquery('feed')
+
+    def unread_count(self):
+        return UnreadCounter().value(self.user.id, self.user)
+
+    def count_unread_notifications(self):
+        return db.session.execute(
+            select(func.count()).select_from(Notification)
+            .where(Notification.user_id == self.user.id, Notification.is_read == False)
+        ).scalar()
+
+    def count_unread_broadcasts(self, up_to=None):
+        query = self._broadcasts(func.count()).where(BroadcastReceipt.read_at.is_(None))
+        if up_to is not None:
+            query = query.where(BroadcastNotification.id <= up_to)
+        return db.session.execute(query).scalar()
+
+    def mark_read(self, notification):
+        # Conditional, so of two concurrent requests only one decrements
+        result = db.session.execute(
+            update(Notification)
+            .where(Notification.id == notification.id, Notification.is_read == False)
+            .values(is_read=True)
+            .execution_options(synchronize_session=False)
+        )
+        set_committed_value(notification, 'is_read', True)
+        if result.rowcount == 1:
+            UnreadCounter().add([self.user.id], -1)
+            self._changed()
+
+    def delete(self, notification):
+        # The row's state as deleted, not as loaded: it may have been read
+        # (or deleted) by a concurrent request since
+        deleted = db.session.execute(
+            delete(Notification)
+            .where(Notification.id == notification.id)
+            .returning(Notification.is_read)
+        ).first()
+        if deleted is not None and not deleted.is_read:
+            UnreadCounter().add([self.user.id], -1)
+            self._changed()
+
+    def get_broadcast(self, broadcast_id):
+        """A broadcast in this user's feed (not dismissed), or None"""
+        return db.session.execute(
+            self._broadcasts(BroadcastNotification).where(
+                BroadcastNotification.id == broadcast_id,
+                BroadcastReceipt.dismissed_at.is_(None)
+            )
+        ).scalar()
+
+    def mark_broadcast_read(self, broadcast):
+        receipt = self._receipt(broadcast)
+        if receipt.read_at is None:
+            receipt.read_at = datetime.utcnow()
+            UnreadCounter().broadcast_read(self.user.id, broadcast.id)
+            self._changed()
+        return receipt
+
+    def dismiss_broadcast(self, broadcast):
+        receipt = self._receipt(broadcast)
+        receipt.dismissed_at = datetime.utcnow()
+        if receipt.read_at is None:
+            receipt.read_at = receipt.dismissed_at
+            UnreadCounter().broadcast_read(self.user.id, broadcast.id)
+            self._changed()
+        return receipt
+
+    def mark_all_read(self):
+        """Mark everything read: one UPDATE for the user's own notifications,
+        receipts only for the broadcasts still unread"""
+        now = datetime.utcnow()
+        Notification.query.filter_by(user_id=self.user.id, is_read=False)\
+            .update({'is_read': True}, synchronize_session=False)
+        db.session.execute(
+            update(BroadcastReceipt)
+            .where(BroadcastReceipt.user_id == self.user.id, BroadcastReceipt.read_at.is_(None))
+            .values(read_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        unreceipted = self._broadcasts(
+            BroadcastNotification.id, literal(self.user.id), literal(now)
+        ).where(BroadcastReceipt.broadcast_id.is_(None))
+        db.session.execute(
+            insert(BroadcastReceipt).from_select(['broadcast_id', 'user_id', 'read_at'], unreceipted)
+        )
+        UnreadCounter().clear(self.user.id)
+        self._changed()
+
+    def _broadcasts(self, *columns):
+        """``select(*columns)`` over the broadcasts addressed to this user,
+        outer-joined to their receipts"""
+        user = self.user
+        query = select(*columns).select_from(BroadcastNotification).outerjoin(
+            BroadcastReceipt,
+            and_(BroadcastReceipt.broadcast_id == BroadcastNotification.id, BroadcastReceipt.user_id == user.id)
+        ).where(
+            or_(BroadcastNotification.target_role.is_(None), BroadcastNotification.target_role == user.role),
+            or_(
+                BroadcastNotification.course_id.is_(None),
+                BroadcastNotification.course_id.in_(
+                    select(Enrollment.course_id).where(Enrollment.user_id == user.id, Enrollment.is_active == True)
+                )
+            )
+        )
+        if user.created_at:
+            query = query.where(BroadcastNotification.created_at >= user.created_at)
+        return query
+
+    def _changed(self):
+        # The user's other tabs refresh their unread count
+        event_hub.publish_on_commit(db.session, {'user_id': self.user.id}, UNREAD_CHANGED, {})
+
+    def _receipt(self, broadcast):
+        key = (broadcast.id, self.user.id)
+        receipt = db.session.get(BroadcastReceipt, key)
+        if receipt is None:
+            try:
+                with db.session.begin_nested():
+                    receipt = BroadcastReceipt(broadcast_id=broadcast.id, user_id=self.user.id)
+                    db.session.add(receipt)
+            except IntegrityError:
+                # Written concurrently by another request of the same user
+                receipt = db.session.get(BroadcastReceipt, key)
+        return receipt
+
+
+class UnreadCounter:
+    """Cached unread counts, one ``NotificationCounter`` row per user, so the
+    unread-count poll is a primary key lookup instead of two ``COUNT(*)``.
+
+    The row is built on first read. Personal notifications are counted
+    exactly, adjusted with atomic UPDATEs as they are created, read or
+    deleted. Broadcasts are counted up to the newest broadcast id seen,
+    noting how many broadcasts existed then. When a newer one exists, one
+    with a lower id committed late (the total moved), or the user's
+    audience changes (role or enrollments), that part is recounted on the
+    next read. A missing row means "count on next read", so adjustments
+    skip users without one.
+    """
+
+    def value(self, user_id, user=None):
+        """The user's unread count, or None if there is no such user"""
+        latest = select(func.coalesce(func.max(BroadcastNotification.id), 0)).scalar_subquery()
+        total = select(func.count(BroadcastNotification.id)).scalar_subquery()
+        row = db.session.execute(
+            select(
+                NotificationCounter.unread,
+                NotificationCounter.unread_broadcasts,
+                NotificationCounter.broadcasts_counted_to,
+                NotificationCounter.broadcasts_seen,
+                latest.label('latest'),
+                total.label('total')
+            ).where(NotificationCounter.user_id == user_id)
+        ).first()
+        if row is not None and row.unread_broadcasts is not None \
+                and row.broadcasts_counted_to >= row.latest and row.broadcasts_seen == row.total:
+            return row.unread + row.unread_broadcasts
+
+        user = user or db.session.get(User, user_id)
+        if user is None:
+            return None
+        return self._refresh(user, row)
+
+    def add(self, user_ids, delta):
+        """Adjust the personal unread count of ``user_ids`` by ``delta``"""
+        db.session.execute(
+            update(NotificationCounter)
+            .where(NotificationCounter.user_id.in_(user_ids))
+            .values(unread=NotificationCounter.unread + delta)
+            .execution_options(synchronize_session=False)
+        )
+
+    def broadcast_read(self, user_id, broadcast_id):
+        # Only broadcasts already counted are in unread_broadcasts
+        db.session.execute(
+            update(NotificationCounter)
+            .where(
+                NotificationCounter.user_id == user_id,
+                NotificationCounter.unread_broadcasts > 0,
+                NotificationCounter.broadcasts_counted_to >= broadcast_id
+            )
+            .values(unread_broadcasts=NotificationCounter.unread_broadcasts - 1)
+            .execution_options(synchronize_session=False)
+        )
+
+    def clear(self, user_id):
+        """Everything has been read"""
+        db.session.execute(
+            update(NotificationCounter)
+            .where(NotificationCounter.user_id == user_id)
+            .values(unread=0, unread_broadcasts=0)
+            .execution_options(synchronize_session=False)
+        )
+
+    def audience_changed(self, user_ids):
+        """Recount broadcasts for users whose role or enrollments changed"""
+        db.session.execute(
+            update(NotificationCounter)
+            .where(NotificationCounter.user_id.in_(user_ids))
+            .values(unread_broadcasts=None)
+            .execution_options(synchronize_session=False)
+        )
+
+    def reconcile(self, user_ids=None):
+        """Recount personal notifications and drop the broadcast counts, which
+        are rebuilt on next read. Returns the number of counters updated."""
+        stmt = update(NotificationCounter).values(
+            unread=select(func.count(Notification.id)).where(
+                Notification.user_id == NotificationCounter.user_id, Notification.is_read == False
+            ).scalar_subquery(),
+            unread_broadcasts=None
+        )
+        if user_ids:
+            stmt = stmt.where(NotificationCounter.user_id.in_(user_ids))
+
+        result = db.session.execute(stmt.execution_options(synchronize_session=False))
+        db.session.commit()
+        return result.rowcount
+
+    def _refresh(self, user, row):
+        feed = NotificationFeed(user)
+        # Taken before counting: a broadcast committing in between is then
+        # at worst counted early, and the total tells the next read to recount
+        latest, total = db.session.execute(
+            select(func.coalesce(func.max(BroadcastNotification.id), 0), func.count(BroadcastNotification.id))
+        ).one()
+        unread_broadcasts = feed.count_unread_broadcasts(up_to=latest)
+        where = NotificationCounter.user_id == user.id
+
+        # Written on the side so read-only requests don't need to commit
+        try:
+            with db.engine.begin() as connection:
+                if row is None:
+                    # Counted inside the INSERT: an add() between a separate
+                    # count and the insert would find no row and be lost
+                    unread = select(func.count(Notification.id)).where(
+                        Notification.user_id == user.id, Notification.is_read == False
+                    ).scalar_subquery()
+                    connection.execute(insert(NotificationCounter).from_select(
+                        ['user_id', 'unread', 'unread_broadcasts', 'broadcasts_counted_to', 'broadcasts_seen'],
+                        select(literal(user.id), unread, literal(unread_broadcasts), literal(latest), literal(total))
+                    ))
+                else:
+                    # Personal counts only move through add(); writing back
+                    # the value read earlier could undo one made since
+                    connection.execute(
+                        update(NotificationCounter).where(where)
+                        .values(unread_broadcasts=unread_broadcasts, broadcasts_counted_to=latest, broadcasts_seen=total)
+                    )
+                unread = connection.execute(select(NotificationCounter.unread).where(where)).scalar()
+        except IntegrityError:
+            # Another request built the row first
+            with db.engine.connect() as connection:
+                unread = connection.execute(select(NotificationCounter.unread).where(where)).scalar()
+        return unread + unread_broadcasts
+
+
+def send_notifications(users, title, message, notification_type='general'):
+    """Create a personal notification for each user, in the caller's
+    transaction, and push it to their open streams once committed"""
+    notifications = [
+        Notification(user_id=user.id, title=title, message=message, type=notification_type)
+        for user in users
+    ]
+    db.session.add_all(notifications)
+    db.session.flush()
+    UnreadCounter().add([user.id for user in users], 1)
+
+    for notification in notifications:
+        event_hub.publish_on_commit(
+            db.session, {'user_id': notification.user_id}, NOTIFICATION_EVENT,
+            {**notification.to_dict(), 'source': NOTIFICATION}
+        )
+    return notifications
+
+
+def send_broadcast(title, message, notification_type='general', target_role=None, course_id=None, created_by=None):
+    """Store a broadcast, in the caller's transaction, and push it to the
+    open streams of its audience once committed"""
+    broadcast = BroadcastNotification(
+        title=title,
+        message=message,
+        type=notification_type,
+        target_role=target_role,
+        course_id=course_id,
+        created_by=created_by
+    )
+    db.session.add(broadcast)
+    db.session.flush()
+
+    event_hub.publish_on_commit(
+        db.session, _segment(broadcast), NOTIFICATION_EVENT, {
+            'id': broadcast.id,
+            'source': BROADCAST,
+            'title': broadcast.title,
+            'message': broadcast.message,
+            'type': broadcast.type,
+            'is_read': False,
+            'created_at': broadcast.created_at.isoformat()
+        }
+    )
+    return broadcast
+
+
+def announce_live_session(session):
+    """Push a newly scheduled live session to the course's students and
+    queue its reminder, in the caller's transaction"""
+    event_hub.publish_on_commit(db.session, {'course_id': session.course_id}, LIVE_SESSION_EVENT, session.to_dict())
+    schedule_live_session_reminder(session)
+
+
+def schedule_live_session_reminder(session):
+    """Queue the "starting soon" reminder, LIVE_SESSION_REMINDER_MINUTES
+    before the session. A reminder for a time the session has since been
+    moved from is skipped when it runs."""
+    scheduled_at = _utc(session.scheduled_at)
+    minutes = current_app.config.get('LIVE_SESSION_REMINDER_MINUTES', 15)
+    JobQueue().enqueue(
+        REMINDER_KIND,
+        {'session_id': session.id, 'scheduled_at': scheduled_at.isoformat()},
+        run_after=max(datetime.utcnow(), scheduled_at - timedelta(minutes=minutes))
+    )
+
+
+@job_handler(REMINDER_KIND)
+def send_live_session_reminder(payload):
+    session = db.session.get(LiveSession, payload['session_id'])
+    if session is None or _utc(session.scheduled_at).isoformat() != payload['scheduled_at']:
+        return {'sent': False}
+
+    starts = _utc(session.scheduled_at).strftime("%H:%M UTC")
+    broadcast = send_broadcast(
+        f"Starting soon: {session.title}",
+        f"The live session \"{session.title}\" starts at {starts}.",
+        notification_type='live_session',
+        course_id=session.course_id
+    )
+    event_hub.publish_on_commit(
+        db.session, {'course_id': session.course_id}, LIVE_SESSION_REMINDER_EVENT,
+        {'live_session': session.to_dict(), 'notification_id': broadcast.id}
+    )
+    return {'sent': True, 'broadcast_id': broadcast.id}
+
+
+def feed_item_to_dict(row, user):
+    return {
+        'id': row.id,
+        'source': row.source,
+        'user_id': user.id,
+        'title': row.title,
+        'message': row.message,
+        'type': row.type,
+        'is_read': bool(row.is_read),
+        'created_at': row.created_at.isoformat()
+    }
+
+
+def broadcast_audience(broadcast, *columns):
+    """``select(*columns)`` over the active users a broadcast is addressed
+    to, e.g. their email addresses for the announcement email"""
+    query = select(*columns).where(User.is_active == True)
+    if broadcast.target_role is not None:
+        query = query.where(User.role == broadcast.target_role)
+    if broadcast.course_id is not None:
+        query = query.where(User.id.in_(
+            select(Enrollment.user_id).where(Enrollment.course_id == broadcast.course_id, Enrollment.is_active == True)
+        ))
+    return query
+
+
+def _segment(broadcast):
+    return {
+        'role': broadcast.target_role.value if broadcast.target_role else None,
+        'course_id': broadcast.course_id
+    }
+
+
+def _utc(value):
+    """Naive UTC, however the datetime was stored"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
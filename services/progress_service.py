@@ -0,0 +1,134 @@
+from datetime import datetime
+from sqlalchemy import update, select, func, case, literal
+from sqlalchemy.orm.attributes import set_committed_value
+from app import db
+from models import Course, CourseModule, Lesson, Enrollment, LessonProgress
+
+
+class ProgressService:
+    """Maintain course progress incrementally.
+
+    ``Course.lesson_count`` caches the number of lessons in a course and
+    ``Enrollment.completed_lessons`` the number the student has completed, so
+    ``progress_percentage`` is derived from two counters instead of counting
+    ``lesson_progress`` rows on every update. Like ``EnrollmentService``, all
+    changes go through atomic ``UPDATE`` statements in the caller's
+    transaction.
+    """
+
+    def set_lesson_completed(self, enrollment, lesson_progress, completed, lesson_count):
+        """Apply a lesson's completed flag. The enrollment's counter and
+        percentage only change when the flag actually flips; the flip is a
+        conditional ``UPDATE``, so of two concurrent requests only one
+        counts it."""
+        if lesson_progress.id is None:
+            db.session.flush()
+
+        completed_at = datetime.utcnow() if completed else None
+        flipped = db.session.execute(
+            update(LessonProgress)
+            .where(LessonProgress.id == lesson_progress.id, func.coalesce(LessonProgress.completed, False) != completed)
+            .values(completed=completed, completed_at=completed_at)
+            .execution_options(synchronize_session=False)
+        ).rowcount == 1
+        if not flipped:
+            db.session.refresh(lesson_progress, ['completed', 'completed_at'])
+            return False
+
+        set_committed_value(lesson_progress, 'completed', completed)
+        set_committed_value(lesson_progress, 'completed_at', completed_at)
+
+        completed_lessons = Enrollment.completed_lessons + (1 if completed else -1)
+        row = db.session.execute(
+            update(Enrollment)
+            .where(Enrollment.id == enrollment.id)
+            .values(
+                completed_lessons=completed_lessons,
+                progress_percentage=_percentage(completed_lessons, lesson_count)
+            )
+            .returning(Enrollment.completed_lessons, Enrollment.progress_percentage)
+            .execution_options(synchronize_session=False)
+        ).one()
+
+        set_committed_value(enrollment, 'completed_lessons', row.completed_lessons)
+        set_committed_value(enrollment, 'progress_percentage', float(row.progress_percentage))
+        return True
+
+    def lessons_added(self, course_id, count=1):
+        """Account for new lessons in a course"""
+        self._adjust_lesson_count(course_id, count)
+
+    def lessons_removed(self, course_id, lesson_ids):
+        """Account for lessons about to be deleted (call before the delete)"""
+        lesson_ids = list(lesson_ids)
+        if not lesson_ids:
+            return
+
+        completed_here = select(func.count(LessonProgress.id)).where(
+            LessonProgress.enrollment_id == Enrollment.id,
+            LessonProgress.lesson_id.in_(lesson_ids),
+            LessonProgress.completed == True
+        ).scalar_subquery()
+
+        db.session.execute(
+            update(Enrollment)
+            .where(Enrollment.course_id == course_id)
+            .values(completed_lessons=Enrollment.completed_lessons - completed_here)
+            .execution_options(synchronize_session=False)
+        )
+        self._adjust_lesson_count(course_id, -len(lesson_ids))
+
+    def reconcile(self, course_ids=None):
+        """Rebuild lesson counts, completed-lesson counters and percentages"""
+        lesson_count = select(func.count(Lesson.id)).join(CourseModule, Lesson.module_id == CourseModule.id)\
+            .where(CourseModule.course_id == Course.id).scalar_subquery()
+        # Counters aren't edits to the course; keep onupdate off updated_at
+        stmt = update(Course).values(lesson_count=lesson_count, updated_at=Course.updated_at)
+        if course_ids:
+            stmt = stmt.where(Course.id.in_(course_ids))
+        result = db.session.execute(stmt.execution_options(synchronize_session=False))
+
+        completed_lessons = select(func.count(LessonProgress.id))\
+            .join(Lesson, LessonProgress.lesson_id == Lesson.id)\
+            .join(CourseModule, Lesson.module_id == CourseModule.id)\
+            .where(
+                LessonProgress.enrollment_id == Enrollment.id,
+                LessonProgress.completed == True,
+                CourseModule.course_id == Enrollment.course_id
+            ).scalar_subquery()
+        stmt = update(Enrollment).values(completed_lessons=completed_lessons)
+        if course_ids:
+            stmt = stmt.where(Enrollment.course_id.in_(course_ids))
+        db.session.execute(stmt.execution_options(synchronize_session=False))
+
+        self._rescale(course_ids)
+        db.session.commit()
+        return result.rowcount
+
+    def _adjust_lesson_count(self, course_id, delta):
+        db.session.execute(
+            update(Course)
+            .where(Course.id == course_id)
+            .values(lesson_count=Course.lesson_count + delta, updated_at=Course.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+        # Every enrollment's percentage is relative to the lesson count
+        self._rescale([course_id])
+
+    def _rescale(self, course_ids=None):
+        lesson_count = select(Course.lesson_count).where(Course.id == Enrollment.course_id).scalar_subquery()
+        stmt = update(Enrollment).values(
+            progress_percentage=case(
+                (lesson_count > 0, Enrollment.completed_lessons * 100.0 / lesson_count),
+                else_=literal(0.0)
+            )
+        )
+        if course_ids:
+            stmt = stmt.where(Enrollment.course_id.in_(course_ids))
+        db.session.execute(stmt.execution_options(synchronize_session=False))
+
+
+def _percentage(completed_lessons, lesson_count):
+    if not lesson_count:
+        return literal(0.0)
+    return completed_lessons * 100.0 / lesson_count
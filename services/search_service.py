@@ -0,0 +1,208 @@
+import html
+import re
+from sqlalchemy import text, literal_column, func, Integer, Float
+from app import db
+from models import Course
+
+# Weighted document used by the Postgres expression index. The query must use
+# the exact same expression for the GIN index to be picked up.
+POSTGRES_VECTOR_SQL = (
+    "(setweight(to_tsvector('english', coalesce(courses.title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(courses.short_description, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(courses.description, '')), 'C'))"
+)
+
+POSTGRES_DOCUMENT_SQL = (
+    "coalesce(courses.title, '') || ' ' || coalesce(courses.short_description, '') || ' ' || "
+    "coalesce(courses.description, '')"
+)
+
+# pg_advisory_xact_lock key serializing ensure_schema across workers
+SEARCH_SCHEMA_LOCK = 7305129461
+
+SNIPPET_START = '<mark>'
+SNIPPET_END = '</mark>'
+
+# Placeholders (Unicode private use) the database wraps matches in, so the
+# course text can be escaped before the real tags go in
+HIGHLIGHT_START = '\ue000'
+HIGHLIGHT_END = '\ue001'
+
+
+class CourseSearchIndex:
+    """Full-text search over course title, short description and description.
+
+    Postgres uses a weighted ``tsvector`` GIN expression index, which the
+    database keeps up to date on its own. SQLite uses an FTS5 table keyed by
+    course id that has to be written on course create/update/delete. Any other
+    backend falls back to the old ``ILIKE`` scan.
+    """
+
+    def __init__(self):
+        self.dialect = db.engine.dialect.name
+
+    @property
+    def backend(self):
+        if self.dialect == 'postgresql':
+            return 'postgresql'
+        if self.dialect == 'sqlite' and _sqlite_has_fts5():
+            return 'sqlite'
+        return 'ilike'
+
+    def ensure_schema(self):
+        """Create the index if it does not exist yet. Safe to run from several
+        workers starting at once."""
+        if self.backend == 'postgresql':
+            # IF NOT EXISTS alone still fails when two sessions create the
+            # index concurrently; the lock is held until commit
+            db.session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {'key': SEARCH_SCHEMA_LOCK})
+            db.session.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_courses_search ON courses USING GIN ({POSTGRES_VECTOR_SQL})"
+            ))
+            db.session.commit()
+        elif self.backend == 'sqlite':
+            db.session.execute(text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS courses_fts USING fts5("
+                "title, short_description, description, tokenize = 'porter unicode61')"
+            ))
+            # A new (or never filled) index; rebuilding is idempotent, so it
+            # doesn't matter if another worker does it too
+            unindexed = db.session.execute(text(
+                "SELECT 1 FROM courses WHERE NOT EXISTS (SELECT 1 FROM courses_fts) LIMIT 1"
+            )).first()
+            if unindexed:
+                self.rebuild()
+            else:
+                db.session.commit()
+
+    def rebuild(self):
+        """Re-index every course"""
+        if self.backend == 'postgresql':
+            db.session.execute(text("REINDEX INDEX ix_courses_search"))
+        elif self.backend == 'sqlite':
+            db.session.execute(text("DELETE FROM courses_fts"))
+            db.session.execute(text(
+                "INSERT INTO courses_fts (rowid, title, short_description, description) "
+                "SELECT id, coalesce(title, ''), coalesce(short_description, ''), coalesce(description, '') "
+                "FROM courses"
+            ))
+        db.session.commit()
+
+    def index_course(self, course):
+        """Add or refresh a course in the index (within the current transaction)"""
+        if self.backend != 'sqlite':
+            return
+
+        if course.id is None:
+            db.session.flush()
+
+        self.remove_course(course.id)
+        db.session.execute(text(
+            "INSERT INTO courses_fts (rowid, title, short_description, description) "
+            "VALUES (:id, :title, :short_description, :description)"
+        ), {
+            'id': course.id,
+            'title': course.title or '',
+            'short_description': course.short_description or '',
+            'description': course.description or ''
+        })
+
+    def remove_course(self, course_id):
+        """Drop a course from the index (within the current transaction)"""
+        if self.backend != 'sqlite':
+            return
+
+        db.session.execute(text("DELETE FROM courses_fts WHERE rowid = :id"), {'id': course_id})
+
+    def filter(self, query, search):
+        """Restrict a ``Course`` query to matches, ordered by relevance"""
+        backend = self.backend
+
+        if backend == 'ilike':
+            search_term = f"%{search}%"
+            return query.filter(
+                db.or_(
+                    Course.title.ilike(search_term),
+                    Course.description.ilike(search_term),
+                    Course.short_description.ilike(search_term)
+                )
+            )
+
+        terms = _terms(search)
+        if not terms:
+            return query
+
+        if backend == 'postgresql':
+            vector = literal_column(POSTGRES_VECTOR_SQL)
+            ts_query = func.to_tsquery('english', _postgres_query(terms))
+            return query.filter(vector.op('@@')(ts_query))\
+                .order_by(func.ts_rank_cd(vector, ts_query).desc())
+
+        hits = text(
+            "SELECT rowid AS course_id, -bm25(courses_fts, 10.0, 4.0, 1.0) AS rank "
+            "FROM courses_fts WHERE courses_fts MATCH :match"
+        ).bindparams(match=_sqlite_query(terms)).columns(course_id=Integer, rank=Float).subquery('search_hits')
+
+        return query.join(hits, hits.c.course_id == Course.id).order_by(hits.c.rank.desc())
+
+    def snippets(self, search, course_ids):
+        """Highlighted snippets for the given courses, as ``{course_id: snippet}``.
+        The course text is HTML-escaped; only the ``<mark>`` tags are markup."""
+        terms = _terms(search)
+        if not terms or not course_ids or self.backend == 'ilike':
+            return {}
+
+        if self.backend == 'postgresql':
+            rows = db.session.execute(text(
+                f"SELECT id, ts_headline('english', {POSTGRES_DOCUMENT_SQL}, to_tsquery('english', :query), :options) "
+                "FROM courses WHERE id = ANY(:ids)"
+            ), {
+                'query': _postgres_query(terms),
+                'options': f'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, MaxWords=25, MinWords=10',
+                'ids': list(course_ids)
+            }).all()
+        else:
+            placeholders = ', '.join(f':id{i}' for i in range(len(course_ids)))
+            params = {f'id{i}': course_id for i, course_id in enumerate(course_ids)}
+            params.update(match=_sqlite_query(terms), start=HIGHLIGHT_START, end=HIGHLIGHT_END)
+            rows = db.session.execute(text(
+                "SELECT rowid, snippet(courses_fts, -1, :start, :end, '...', 16) "
+                f"FROM courses_fts WHERE courses_fts MATCH :match AND rowid IN ({placeholders})"
+            ), params).all()
+
+        return {course_id: _highlight(snippet) for course_id, snippet in rows}
+
+
+def _highlight(snippet):
+    # Instructor-written text: escape it, then add the markup
+    return html.escape(snippet or '').replace(HIGHLIGHT_START, SNIPPET_START).replace(HIGHLIGHT_END, SNIPPET_END)
+
+
+def _terms(search):
+    return re.findall(r'\w+', search or '', re.UNICODE)[:16]
+
+
+def _sqlite_query(terms):
+    # Quote every term so user input cannot inject FTS5 syntax; prefix-match
+    # so partially typed words still hit
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _postgres_query(terms):
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+_fts5_available = None
+
+
+def _sqlite_has_fts5():
+    global _fts5_available
+    if _fts5_available is None:
+        try:
+            db.session.execute(text("CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x)"))
+            db.session.execute(text("DROP TABLE temp._fts5_probe"))
+            _fts5_available = True
+        except Exception:
+            db.session.rollback()
+            _fts5_available = False
+    return _fts5_available
@@ -0,0 +1,130 @@
+import os
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, union_all
+from app import db
+from models import (
+    StoredBlob, Course, Lesson, LessonResource, User, Certificate, UploadSession, UploadStatus
+)
+from services.file_service import FileService
+from services.storage_index import StorageIndex, scan_files
+
+
+class StorageCollector:
+    """Mark-and-sweep garbage collection of stored files.
+
+    Deleting a lesson, module, course or resource removes its rows but, for
+    files written before the blob store, leaves the file behind. The mark
+    phase collects every path still referenced from ``Lesson.video_url``,
+    ``LessonResource.file_path``, ``Certificate.file_path``,
+    ``Course.thumbnail``, ``User.profile_picture``, live blobs and pending
+    upload sessions; the sweep streams through the storage roots with
+    ``os.scandir`` and deletes the rest in rate-limited batches.
+
+    Files younger than ``min_age`` are never swept: a request may have
+    written one without having committed the row that points at it yet.
+    """
+
+    def __init__(self):
+        self.upload_folder = FileService().upload_folder
+
+    def referenced(self):
+        """Normalized absolute paths of every file still in use"""
+        query = union_all(
+            select(Lesson.video_url.label('path')).where(Lesson.video_url.isnot(None)),
+            select(LessonResource.file_path).where(LessonResource.file_path.isnot(None)),
+            select(Certificate.file_path).where(Certificate.file_path.isnot(None)),
+            select(Course.thumbnail).where(Course.thumbnail.isnot(None)),
+            select(User.profile_picture).where(User.profile_picture.isnot(None)),
+            select(StoredBlob.path),
+            select(UploadSession.file_path).where(UploadSession.status == UploadStatus.PENDING),
+        )
+
+        paths = set()
+        for path in db.session.execute(query).scalars():
+            # Stored paths are relative to the working directory or to the
+            # upload folder; keep both readings
+            paths.add(_key(path))
+            if not os.path.isabs(path):
+                paths.add(_key(os.path.join(self.upload_folder, path)))
+        return paths
+
+    def collect(self, roots=None, dry_run=False, min_age=timedelta(hours=24),
+                batch_size=100, max_per_second=None):
+        """Delete unreferenced files under ``roots`` (default
+        ``STORAGE_INDEX_ROOTS``) that are older than ``min_age``.
+
+        With ``dry_run`` nothing is deleted. ``max_per_second`` caps the
+        delete rate. Returns counts and the reclaimed size.
+        """
+        roots = roots or current_app.config['STORAGE_INDEX_ROOTS']
+        referenced = self.referenced()
+        cutoff = (datetime.utcnow() - min_age).timestamp() if min_age else None
+        # referenced() only read; don't hold its transaction open while sweeping
+        db.session.commit()
+
+        result = {'scanned_files': 0, 'orphaned_files': 0, 'deleted_files': 0, 'reclaimed_size': 0}
+        seen = set()
+        batch = []
+        for root in roots:
+            for entry in scan_files(root):
+                key = _key(entry.path)
+                if key in seen:
+                    continue
+                seen.add(key)
+                result['scanned_files'] += 1
+                if key in referenced:
+                    continue
+
+                stat = entry.stat(follow_symlinks=False)
+                if cutoff is not None and _utc_timestamp(stat.st_mtime) > cutoff:
+                    continue
+
+                result['orphaned_files'] += 1
+                if dry_run:
+                    result['reclaimed_size'] += stat.st_size
+                    continue
+
+                batch.append((entry.path, stat.st_size))
+                if len(batch) >= batch_size:
+                    self._sweep(batch, result, max_per_second)
+                    batch = []
+        if batch:
+            self._sweep(batch, result, max_per_second)
+
+        result['reclaimed_size_mb'] = result['reclaimed_size'] / (1024 * 1024)
+        return result
+
+    def _sweep(self, batch, result, max_per_second):
+        started = time.monotonic()
+        deleted = []
+        for path, size in batch:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                current_app.logger.warning(f"Could not delete orphaned file {path}: {e}")
+                continue
+            deleted.append(path)
+            result['reclaimed_size'] += size
+
+        StorageIndex().forget(*deleted)
+        db.session.commit()
+        result['deleted_files'] += len(deleted)
+
+        if max_per_second:
+            remaining = len(batch) / max_per_second - (time.monotonic() - started)
+            if remaining > 0:
+                time.sleep(remaining)
+
+
+def _key(path):
+    return os.path.normpath(os.path.abspath(path))
+
+
+def _utc_timestamp(mtime):
+    # datetime.utcnow().timestamp() treats UTC as local time; compare mtimes
+    # on the same footing
+    return datetime.utcfromtimestamp(mtime).timestamp()
@@ -0,0 +1,187 @@
+import mimetypes
+import os
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import select, update, delete, insert, func, null
+from app import db
+from models import StoredFile, Course, CourseModule, Lesson, LessonResource, User, Certificate, UploadSession, UploadStatus
+
+GROUP_COLUMNS = {
+    'owner': StoredFile.owner_id,
+    'course': StoredFile.course_id,
+    'mime_type': StoredFile.mime_type,
+}
+
+
+def index_key(path):
+    """Normalized form of a stored path, as used in ``stored_files.path``"""
+    return os.path.normpath(path)
+
+
+class StorageIndex:
+    """Index of the files kept on disk, so storage stats and listings come
+    from aggregate queries instead of walking and stat-ing the upload tree.
+
+    Every code path that writes or deletes a stored file updates it in the
+    caller's transaction (blob removals right after their commit).
+    ``flask rebuild-storage-index`` re-creates it from disk with
+    ``os.scandir``.
+    """
+
+    def record(self, path, size, owner_id=None, course_id=None, mime_type=None, new=False):
+        """Add or update a file's entry. With ``new``, the path is known not
+        to be indexed yet (e.g. a freshly generated unique name) and isn't
+        looked up."""
+        key = index_key(path)
+        mime_type = mime_type or mimetypes.guess_type(key)[0]
+        stored = None
+        if not new:
+            stored = db.session.execute(select(StoredFile).where(StoredFile.path == key)).scalar_one_or_none()
+        if stored is None:
+            stored = StoredFile(path=key)
+            db.session.add(stored)
+        stored.size = size
+        stored.mime_type = mime_type
+        stored.owner_id = owner_id if owner_id is not None else stored.owner_id
+        stored.course_id = course_id if course_id is not None else stored.course_id
+        return stored
+
+    def attribute(self, path, owner_id=None, course_id=None):
+        """Fill in a missing owner/course, e.g. once a new course has an id"""
+        values = {}
+        if owner_id is not None:
+            values['owner_id'] = func.coalesce(StoredFile.owner_id, owner_id)
+        if course_id is not None:
+            values['course_id'] = func.coalesce(StoredFile.course_id, course_id)
+        if values:
+            db.session.execute(
+                update(StoredFile).where(StoredFile.path == index_key(path)).values(**values)
+                .execution_options(synchronize_session=False)
+            )
+
+    def forget(self, *paths):
+        keys = [index_key(path) for path in paths if path]
+        if keys:
+            db.session.execute(
+                delete(StoredFile).where(StoredFile.path.in_(keys)).execution_options(synchronize_session=False)
+            )
+
+    def stats(self, group_by=None, owner_id=None, course_id=None):
+        """File count and bytes, in total or per ``owner``, ``course`` or ``mime_type``"""
+        columns = [func.count(StoredFile.id), func.coalesce(func.sum(StoredFile.size), 0)]
+        group_column = GROUP_COLUMNS.get(group_by) if group_by else None
+        if group_by and group_column is None:
+            raise ValueError(f"group_by must be one of {', '.join(GROUP_COLUMNS)}")
+
+        query = select(group_column, *columns) if group_column is not None else select(*columns)
+        if owner_id is not None:
+            query = query.where(StoredFile.owner_id == owner_id)
+        if course_id is not None:
+            query = query.where(StoredFile.course_id == course_id)
+
+        if group_column is None:
+            total_files, total_size = db.session.execute(query).one()
+            return _totals(total_files, total_size)
+
+        rows = db.session.execute(
+            query.group_by(group_column).order_by(func.sum(StoredFile.size).desc())
+        ).all()
+        return [dict(_totals(total_files, total_size), **{group_by: key}) for key, total_files, total_size in rows]
+
+    def list_folder(self, folder):
+        """Files directly inside ``folder``"""
+        prefix = index_key(folder) + os.sep
+        files = db.session.execute(
+            select(StoredFile).where(StoredFile.path.startswith(prefix, autoescape=True)).order_by(StoredFile.path)
+        ).scalars()
+        return [stored for stored in files if os.sep not in stored.path[len(prefix):]]
+
+    def rebuild(self, roots=None, batch_size=1000):
+        """Replace the index with what is on disk under ``roots``. Returns the
+        number of files indexed."""
+        roots = roots or current_app.config['STORAGE_INDEX_ROOTS']
+        owners = self._owners()
+        pending = {
+            index_key(path) for path in db.session.execute(
+                select(UploadSession.file_path).where(UploadSession.status == UploadStatus.PENDING)
+            ).scalars()
+        }
+
+        db.session.execute(delete(StoredFile))
+        seen = set()
+        batch = []
+        for root in roots:
+            for entry in scan_files(root):
+                key = index_key(entry.path)
+                if key in seen or key in pending:
+                    continue
+                seen.add(key)
+                owner_id, course_id = owners.get(key, (None, None))
+                stat = entry.stat()
+                batch.append({
+                    'path': key,
+                    'size': stat.st_size,
+                    'mime_type': mimetypes.guess_type(key)[0],
+                    'owner_id': owner_id,
+                    'course_id': course_id,
+                    'created_at': datetime.utcfromtimestamp(stat.st_mtime)
+                })
+                if len(batch) >= batch_size:
+                    db.session.execute(insert(StoredFile), batch)
+                    batch = []
+        if batch:
+            db.session.execute(insert(StoredFile), batch)
+
+        db.session.commit()
+        return len(seen)
+
+    def _owners(self):
+        """Map stored paths to ``(owner_id, course_id)`` from the records pointing at them"""
+        from services.file_service import FileService
+        file_service = FileService()
+
+        referencing = [
+            select(Course.thumbnail, Course.instructor_id, Course.id).where(Course.thumbnail.isnot(None)),
+            select(Lesson.video_url, Course.instructor_id, Course.id)
+                .join(CourseModule, Lesson.module_id == CourseModule.id)
+                .join(Course, CourseModule.course_id == Course.id)
+                .where(Lesson.video_url.isnot(None)),
+            select(LessonResource.file_path, Course.instructor_id, Course.id)
+                .join(Lesson, LessonResource.lesson_id == Lesson.id)
+                .join(CourseModule, Lesson.module_id == CourseModule.id)
+                .join(Course, CourseModule.course_id == Course.id),
+            select(Certificate.file_path, Certificate.user_id, Certificate.course_id).where(Certificate.file_path.isnot(None)),
+            select(User.profile_picture, User.id, null()).where(User.profile_picture.isnot(None)),
+        ]
+
+        owners = {}
+        for query in referencing:
+            for path, owner_id, course_id in db.session.execute(query):
+                located = file_service.locate(path)
+                if located:
+                    owners.setdefault(index_key(located), (owner_id, course_id))
+        return owners
+
+
+def _totals(total_files, total_size):
+    return {
+        'total_files': total_files,
+        'total_size': total_size,
+        'total_size_mb': total_size / (1024 * 1024)
+    }
+
+
+def scan_files(root):
+    """Yield the files under ``root`` as ``os.DirEntry``s, skipping temp
+    folders (in-progress blob writes)"""
+    try:
+        entries = os.scandir(root)
+    except FileNotFoundError:
+        return
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name != 'tmp':
+                    yield from scan_files(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
@@ -0,0 +1,113 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, delete
+from app import db
+from models import TokenBlacklist
+
+# Rows committed slightly out of created_at order (long transactions, clock
+# skew between workers) are still picked up by re-reading this far back
+WATERMARK_OVERLAP = timedelta(seconds=60)
+
+
+class RevokedTokenCache:
+    """Per-process set of revoked JTIs for the JWT blocklist check.
+
+    The set is loaded once and then topped up incrementally from
+    ``token_blacklist`` by ``created_at`` watermark at most every
+    ``REVOKED_TOKEN_REFRESH_SECONDS``, so checking a token that is not revoked
+    never touches the database. Logouts handled by this process are added
+    immediately; other workers see them on their next refresh.
+
+    Once a revocation is older than ``JWT_REFRESH_TOKEN_EXPIRES`` the token it
+    names has expired anyway, so those rows are dropped from the cache and
+    purged from the table every ``REVOKED_TOKEN_PURGE_SECONDS``.
+    """
+
+    def __init__(self):
+        self._jtis = {}
+        self._watermark = None
+        self._loaded = False
+        self._next_refresh = 0
+        self._next_purge = 0
+        self._lock = threading.Lock()
+
+    def is_revoked(self, jti):
+        self._maybe_refresh()
+        return jti in self._jtis
+
+    def add(self, jti, created_at=None):
+        with self._lock:
+            self._jtis[jti] = created_at or datetime.utcnow()
+
+    def purge(self):
+        """Delete revocations that have outlived every token. Returns the row count."""
+        horizon = _horizon()
+        if horizon is None:
+            return 0
+
+        # Own connection and transaction: this can run from inside a request
+        # that has uncommitted work in the session
+        with db.engine.begin() as connection:
+            result = connection.execute(delete(TokenBlacklist).where(TokenBlacklist.created_at < horizon))
+
+        with self._lock:
+            self._jtis = {jti: created_at for jti, created_at in self._jtis.items() if created_at >= horizon}
+
+        return result.rowcount
+
+    def _maybe_refresh(self):
+        now = time.monotonic()
+        if now < self._next_refresh:
+            return
+
+        # Until the first load has finished every check has to wait for it;
+        # afterwards a concurrent refresh just means this check uses the
+        # current set
+        if not self._lock.acquire(blocking=not self._loaded):
+            return
+        try:
+            if now < self._next_refresh:
+                return
+            self._refresh()
+            self._next_refresh = now + current_app.config.get('REVOKED_TOKEN_REFRESH_SECONDS', 5)
+        finally:
+            self._lock.release()
+
+        if now >= self._next_purge:
+            self._next_purge = now + current_app.config.get('REVOKED_TOKEN_PURGE_SECONDS', 3600)
+            try:
+                self.purge()
+            except Exception as e:
+                current_app.logger.warning(f"Revoked token purge failed: {e}")
+
+    def _refresh(self):
+        since = _horizon()
+        if self._watermark is not None:
+            resume = self._watermark - WATERMARK_OVERLAP
+            since = max(since, resume) if since else resume
+
+        query = select(TokenBlacklist.jti, TokenBlacklist.created_at)
+        if since is not None:
+            query = query.where(TokenBlacklist.created_at >= since)
+
+        with db.engine.connect() as connection:
+            rows = connection.execute(query).all()
+
+        for jti, created_at in rows:
+            created_at = created_at or datetime.utcnow()
+            self._jtis[jti] = created_at
+            if self._watermark is None or created_at > self._watermark:
+                self._watermark = created_at
+        self._loaded = True
+
+
+def _horizon():
+    lifetime = current_app.config.get('JWT_REFRESH_TOKEN_EXPIRES')
+    if not isinstance(lifetime, timedelta):
+        return None
+    return datetime.utcnow() - lifetime
+
+
+revoked_tokens = RevokedTokenCache()
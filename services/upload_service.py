@@ -0,0 +1,201 @@
+import os
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import update
+from sqlalchemy.orm.attributes import set_committed_value
+from werkzeug.utils import secure_filename
+from app import db
+from models import Course, Lesson, LessonResource, UploadSession, UploadStatus
+from services.file_service import FileService
+from services.progress_service import ProgressService
+from services.media_service import MediaService
+from services.blob_store import BlobStore
+
+LESSON_VIDEO = 'lesson_video'
+LESSON_RESOURCE = 'lesson_resource'
+
+
+class UploadOffsetConflict(Exception):
+    """A chunk did not start at the session's current offset"""
+
+    def __init__(self, offset):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+
+class UploadService:
+    """Resumable, chunked uploads for lesson videos and resources.
+
+    A session fixes the destination file up front; each chunk is streamed
+    from the request body directly into that file at its offset, and the
+    session's ``received_bytes`` only moves forward once the chunk is on
+    disk. A dropped connection therefore costs at most one chunk: the client
+    asks for the current offset and carries on from there. Completing the
+    session creates the lesson (videos) or lesson resource.
+    """
+
+    def __init__(self):
+        self.file_service = FileService()
+
+    def create(self, user_id, kind, course, module=None, lesson=None, filename=None,
+               total_size=0, title=None, content=None, is_preview=False, sha256=None):
+        upload_id = uuid.uuid4().hex
+        filename = secure_filename(filename or '')
+        if not filename:
+            raise ValueError("Invalid filename")
+
+        if kind == LESSON_VIDEO:
+            subfolder = os.path.join('lesson_videos', secure_filename(course.title), secure_filename(module.title))
+            stored_name = f"{secure_filename(title)}_{upload_id[:8]}_{filename}"
+        else:
+            name, ext = os.path.splitext(filename)
+            subfolder = 'lesson_resources'
+            stored_name = f"{course.id}_{lesson.module_id}_{lesson.id}_{name}_{upload_id[:8]}{ext}"
+
+        folder = os.path.join(self.file_service.upload_folder, subfolder)
+        os.makedirs(folder, exist_ok=True)
+        file_path = os.path.join(folder, stored_name).replace("\\", "/")
+        # Chunks are written in place with r+b, so the file has to exist
+        open(file_path, 'wb').close()
+
+        session = UploadSession(
+            id=upload_id,
+            user_id=user_id,
+            kind=kind,
+            course_id=course.id,
+            module_id=module.id if module else lesson.module_id,
+            lesson_id=lesson.id if lesson else None,
+            title=title,
+            content=content,
+            is_preview=is_preview,
+            filename=filename,
+            file_path=file_path,
+            total_size=total_size,
+            received_bytes=0,
+            sha256=sha256.lower() if sha256 else None,
+            status=UploadStatus.PENDING,
+            expires_at=_expiry()
+        )
+        db.session.add(session)
+        return session
+
+    def write(self, session, start, stream, length, chunk_sha256=None):
+        """Write one chunk and return the new offset.
+
+        Re-sending a chunk that was already stored (the response to it got
+        lost) is accepted without writing anything.
+        """
+        if session.status != UploadStatus.PENDING:
+            raise ValueError(f"Upload is {session.status.value}")
+        if start + length > session.total_size:
+            raise ValueError("Chunk runs past the end of the upload")
+
+        offset = session.received_bytes
+        if start + length <= offset:
+            return offset
+        if start != offset:
+            raise UploadOffsetConflict(offset)
+
+        self.file_service.write_chunk(session.file_path, start, stream, length, chunk_sha256)
+
+        # Only the request that wrote from the current offset may advance it
+        expires_at = _expiry()
+        result = db.session.execute(
+            update(UploadSession)
+            .where(UploadSession.id == session.id, UploadSession.received_bytes == start)
+            .values(received_bytes=start + length, expires_at=expires_at)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            db.session.refresh(session)
+            raise UploadOffsetConflict(session.received_bytes)
+
+        set_committed_value(session, 'received_bytes', start + length)
+        set_committed_value(session, 'expires_at', expires_at)
+        return start + length
+
+    def complete(self, session):
+        """Create the lesson or resource from a fully received upload.
+
+        Returns the created record; completing twice returns the same one.
+        """
+        if session.status == UploadStatus.COMPLETED:
+            return self._result(session)
+        if session.status != UploadStatus.PENDING:
+            raise ValueError(f"Upload is {session.status.value}")
+        if session.received_bytes != session.total_size:
+            raise UploadOffsetConflict(session.received_bytes)
+
+        # Drop anything left past the end by an interrupted write
+        os.truncate(session.file_path, session.total_size)
+        sha256 = self.file_service.file_sha256(session.file_path)
+        if session.sha256 and sha256 != session.sha256:
+            raise ValueError("File checksum mismatch")
+
+        # Move the finished file into the content-addressed store, where a
+        # re-upload of the same video or document shares the existing copy
+        course = db.session.get(Course, session.course_id)
+        session.file_path, _ = BlobStore().adopt(
+            session.file_path, session.filename, sha256=sha256,
+            owner_id=course.instructor_id, course_id=course.id
+        )
+
+        if session.kind == LESSON_VIDEO:
+            max_order = db.session.query(db.func.max(Lesson.order)).filter_by(module_id=session.module_id).scalar() or 0
+            record = Lesson(
+                module_id=session.module_id,
+                title=session.title,
+                content=session.content,
+                video_url=session.file_path,
+                order=max_order + 1,
+                is_preview=session.is_preview
+            )
+            db.session.add(record)
+            ProgressService().lessons_added(session.course_id)
+        else:
+            record = LessonResource(
+                lesson_id=session.lesson_id,
+                title=session.title,
+                file_path=session.file_path,
+                file_type=session.filename.rsplit('.', 1)[-1].lower(),
+                file_size=session.total_size
+            )
+            db.session.add(record)
+
+        db.session.flush()
+        MediaService().enqueue_probe(record)
+        session.status = UploadStatus.COMPLETED
+        session.result_id = record.id
+        return record
+
+    def abort(self, session):
+        if session.status == UploadStatus.COMPLETED:
+            raise ValueError("Upload is already completed")
+        session.status = UploadStatus.ABORTED
+        _remove(session.file_path)
+
+    def purge_expired(self):
+        """Delete expired sessions, and the partial files of unfinished ones"""
+        expired = UploadSession.query.filter(UploadSession.expires_at < datetime.utcnow()).all()
+        for session in expired:
+            if session.status == UploadStatus.PENDING:
+                _remove(session.file_path)
+            db.session.delete(session)
+        db.session.commit()
+        return len(expired)
+
+    def _result(self, session):
+        model = Lesson if session.kind == LESSON_VIDEO else LessonResource
+        return db.session.get(model, session.result_id)
+
+
+def _expiry():
+    return datetime.utcnow() + timedelta(hours=current_app.config.get('UPLOAD_SESSION_TTL_HOURS', 24))
+
+
+def _remove(file_path):
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
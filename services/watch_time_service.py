@@ -0,0 +1,153 @@
+import atexit
+import os
+import threading
+from flask import current_app
+from sqlalchemy import func, update, insert, case
+from app import db
+from models import LessonProgress
+
+
+class WatchTimeBuffer:
+    """Coalesce video heartbeats in memory and write them in batches.
+
+    Each ``(enrollment, lesson)`` pair keeps the furthest position seen and the
+    watch time added since the last flush. The buffer is written with one
+    batched upsert into ``lesson_progress`` every ``WATCH_TIME_FLUSH_SECONDS``
+    or once ``WATCH_TIME_FLUSH_EVENTS`` heartbeats have arrived, whichever
+    comes first, and again when the process exits. Writes happen on a
+    background thread; a request only appends and, when the buffer is full,
+    wakes that thread. A crash loses at most one flush window of watch time.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._events = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._app = None
+        self._pid = None
+
+    def init_app(self, app):
+        self._app = app
+        atexit.register(self.flush)
+
+    def record(self, enrollment_id, lesson_id, position, delta):
+        with self._lock:
+            key = (enrollment_id, lesson_id)
+            max_position, watched = self._pending.get(key, (0, 0))
+            self._pending[key] = (max(max_position, position), watched + delta)
+            self._events += 1
+            full = self._events >= current_app.config.get('WATCH_TIME_FLUSH_EVENTS', 500)
+
+        self._ensure_flusher()
+        if full:
+            self._wake.set()
+
+    def pending(self, enrollment_id):
+        """Unflushed ``{lesson_id: (max_position, watched)}`` for an enrollment"""
+        with self._lock:
+            return {
+                lesson_id: values
+                for (pending_enrollment_id, lesson_id), values in self._pending.items()
+                if pending_enrollment_id == enrollment_id
+            }
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of rows upserted"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending, self._events = self._pending, {}, 0
+            if not batch or self._app is None:
+                return 0
+
+            rows = [
+                {
+                    'enrollment_id': enrollment_id,
+                    'lesson_id': lesson_id,
+                    'completed': False,
+                    'max_position_seconds': max_position,
+                    'watch_time_seconds': watched
+                }
+                for (enrollment_id, lesson_id), (max_position, watched) in batch.items()
+            ]
+
+            with self._app.app_context():
+                try:
+                    # Own connection: this runs on the flusher thread or at
+                    # exit, outside any request's session
+                    with db.engine.begin() as connection:
+                        _upsert(connection, rows)
+                except Exception as e:
+                    self._app.logger.error(f"Watch time flush failed, keeping {len(rows)} rows buffered: {e}")
+                    self._requeue(batch)
+                    return 0
+
+            return len(rows)
+
+    def _requeue(self, batch):
+        with self._lock:
+            for key, (max_position, watched) in batch.items():
+                pending_position, pending_watched = self._pending.get(key, (0, 0))
+                self._pending[key] = (max(max_position, pending_position), watched + pending_watched)
+
+    def _ensure_flusher(self):
+        # Threads don't survive a fork, so each worker starts its own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._wake = threading.Event()
+            interval = self._app.config.get('WATCH_TIME_FLUSH_SECONDS', 30)
+            threading.Thread(target=self._run, args=(interval,), name='watch-time-flush', daemon=True).start()
+
+    def _run(self, interval):
+        while True:
+            self._wake.wait(interval)
+            self._wake.clear()
+            self.flush()
+
+
+def _upsert(connection, rows):
+    table = LessonProgress.__table__
+    dialect = connection.dialect.name
+
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            greatest = func.greatest
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            greatest = func.max
+
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.enrollment_id, table.c.lesson_id],
+            set_={
+                'watch_time_seconds': func.coalesce(table.c.watch_time_seconds, 0) + stmt.excluded.watch_time_seconds,
+                'max_position_seconds': greatest(
+                    func.coalesce(table.c.max_position_seconds, 0), stmt.excluded.max_position_seconds
+                )
+            }
+        )
+        connection.execute(stmt, rows)
+        return
+
+    # No portable upsert: update, then insert the rows that did not exist yet
+    for row in rows:
+        position = func.coalesce(table.c.max_position_seconds, 0)
+        result = connection.execute(
+            update(table)
+            .where(table.c.enrollment_id == row['enrollment_id'], table.c.lesson_id == row['lesson_id'])
+            .values(
+                watch_time_seconds=func.coalesce(table.c.watch_time_seconds, 0) + row['watch_time_seconds'],
+                max_position_seconds=case((position < row['max_position_seconds'], row['max_position_seconds']), else_=position)
+            )
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(table).values(**row))
+
+
+watch_time_buffer = WatchTimeBuffer()
@@ -0,0 +1,92 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+
+class ResponseCache:
+    """Size-bounded LRU cache with per-entry TTL and tag based invalidation.
+
+    Entries hold already serialized response bytes, never live ``Response``
+    objects, so a cached entry can be served any number of times. Each entry
+    carries tags such as ``courses`` or ``categories``; ``invalidate()`` drops
+    every entry with any of the given tags.
+
+    The cache lives in process memory. Invalidation only reaches the worker
+    that handled the write, so other workers may serve a stale entry until its
+    TTL runs out. Keep timeouts short on anything that changes often.
+    """
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._tags = defaultdict(set)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app, config_key='RESPONSE_CACHE_MAX_ENTRIES'):
+        self.max_entries = app.config.get(config_key, self.max_entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, tags, value = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, timeout, tags=()):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            tags = frozenset(tags)
+            self._entries[key] = (time.monotonic() + timeout, tags, value)
+            for tag in tags:
+                self._tags[tag].add(key)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, *tags):
+        """Drop every entry carrying any of ``tags``"""
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+    def _remove(self, key):
+        _, tags, _ = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+response_cache = ResponseCache()
+
+
+def invalidate(*tags):
+    """Invalidate cached responses by tag, e.g. ``invalidate('courses', 'categories')``.
+    Call it after the write has been committed."""
+    response_cache.invalidate(*tags)
@@ -2,44 +2,46 @@ from functools import wraps
 from flask import request, jsonify, current_app
 from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
 import time
-from collections import defaultdict
+import json
+import hashlib
+import math
 import re
-
-# Simple in-memory rate limiter (in production, use Redis)
-rate_limit_storage = defaultdict(list)
+from utils.cache import response_cache
+from utils.rate_limit import check as check_rate_limit
 
 def rate_limit(max_requests=60, per_seconds=60, key_func=None):
-    """Rate limiting decorator"""
+    """Rate limiting decorator.
+
+    Limits are enforced per endpoint with GCRA in the store configured by
+    ``RATELIMIT_STORAGE_URL`` (see utils/rate_limit.py), and reported in
+    ``X-RateLimit-*`` headers.
+    """
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            if not current_app.config.get('TESTING', False):  # Skip rate limiting in tests
-                # Determine the key for rate limiting
-                if key_func:
-                    key = key_func()
-                else:
-                    # Default to IP address
-                    key = request.remote_addr
-                
-                current_time = time.time()
-                
-                # Clean old requests
-                rate_limit_storage[key] = [
-                    req_time for req_time in rate_limit_storage[key]
-                    if current_time - req_time < per_seconds
-                ]
-                
-                # Check if limit exceeded
-                if len(rate_limit_storage[key]) >= max_requests:
-                    return jsonify({
-                        'error': 'Rate limit exceeded',
-                        'retry_after': per_seconds
-                    }), 429
-                
-                # Add current request
-                rate_limit_storage[key].append(current_time)
+            if current_app.config.get('TESTING', False):  # Skip rate limiting in tests
+                return f(*args, **kwargs)
             
-            return f(*args, **kwargs)
+            # Determine the key for rate limiting
+            if key_func:
+                key = key_func()
+            else:
+                # Default to IP address
+                key = request.remote_addr
+            
+            result = check_rate_limit(f"{request.endpoint}:{key}", max_requests, per_seconds)
+            
+            if not result.allowed:
+                response = jsonify({
+                    'error': 'Rate limit exceeded',
+                    'retry_after': math.ceil(result.retry_after)
+                })
+                response.status_code = 429
+            else:
+                response = current_app.make_response(f(*args, **kwargs))
+            
+            response.headers.update(result.headers)
+            return response
         return decorated_function
     return decorator
 
@@ -176,38 +178,55 @@ def sanitize_input():
         return decorated_function
     return decorator
 
-def cache_response(timeout=300):
-    """Simple response caching decorator"""
-    cache = {}
-    
+def cache_response(timeout=300, tags=(), per_user=True):
+    """Cache successful responses in the shared response cache.
+
+    The key covers the method, path, query string, JSON body and, unless
+    ``per_user`` is False, the JWT identity. ``tags`` are formatted with the
+    view arguments (e.g. ``'course:{course_id}'``) so mutations can drop the
+    entry with ``utils.cache.invalidate``.
+    """
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            # Create cache key from request
-            cache_key = f"{request.endpoint}:{request.query_string.decode()}"
-            
-            current_time = time.time()
-            
-            # Check if cached response exists and is still valid
-            if cache_key in cache:
-                cached_response, timestamp = cache[cache_key]
-                if current_time - timestamp < timeout:
-                    return cached_response
-            
-            # Execute function and cache result
-            result = f(*args, **kwargs)
-            cache[cache_key] = (result, current_time)
-            
-            # Clean old cache entries (simple cleanup)
-            if len(cache) > 1000:  # Limit cache size
-                expired_keys = [
-                    key for key, (_, timestamp) in cache.items()
-                    if current_time - timestamp > timeout
-                ]
-                for key in expired_keys:
-                    del cache[key]
-            
-            return result
+            identity = None
+            if per_user:
+                try:
+                    verify_jwt_in_request(optional=True)
+                    identity = get_jwt_identity()
+                except Exception:
+                    identity = None
+
+            body = request.get_json(silent=True) if request.is_json else None
+            key_source = json.dumps([
+                request.method,
+                request.path,
+                sorted(request.args.items(multi=True)),
+                body,
+                identity
+            ], sort_keys=True, default=str)
+            cache_key = hashlib.sha256(key_source.encode()).hexdigest()
+
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                data, status, headers = cached
+                response = current_app.response_class(data, status=status, headers=headers)
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            response = current_app.make_response(f(*args, **kwargs))
+
+            # Only plain, successful, cookie-free responses are shareable
+            if response.status_code == 200 and not response.direct_passthrough \
+                    and 'Set-Cookie' not in response.headers:
+                headers = [(name, value) for name, value in response.headers.items()
+                           if name.lower() != 'content-length']
+                response_tags = [tag.format(**kwargs) for tag in tags]
+                response_cache.set(cache_key, (response.get_data(), response.status_code, headers),
+                                   timeout, response_tags)
+
+            response.headers['X-Cache'] = 'MISS'
+            return response
         return decorated_function
     return decorator
 
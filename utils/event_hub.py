@@ -0,0 +1,255 @@
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+
+class TooManySubscriptions(Exception):
+    """This process already holds its maximum number of open streams"""
+
+
+class Subscription:
+    """One open event stream: a user's queue of pending messages.
+
+    A message's ``audience`` is either ``{'user_id': ...}`` or a
+    ``{'role': ..., 'course_id': ...}`` segment (either may be None for
+    "everyone"), matched against what the stream knew about the user when
+    it connected.
+    """
+
+    def __init__(self, hub, user_id, role=None, course_ids=(), max_pending=256):
+        self.hub = hub
+        self.user_id = user_id
+        self.role = role
+        self.course_ids = set(course_ids)
+        self.overflowed = False
+        self._queue = queue.Queue(maxsize=max_pending)
+
+    def accepts(self, message):
+        audience = message['audience']
+        if 'user_id' in audience:
+            return audience['user_id'] == self.user_id
+        role, course_id = audience.get('role'), audience.get('course_id')
+        return (role is None or role == self.role) and (course_id is None or course_id in self.course_ids)
+
+    def put(self, message):
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            # The client isn't reading; it has to resync when it reconnects
+            self.overflowed = True
+
+    def get(self, timeout):
+        """Wait up to ``timeout`` seconds for messages and return all that
+        are pending (an empty list on timeout)"""
+        try:
+            messages = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                messages.append(self._queue.get_nowait())
+            except queue.Empty:
+                return messages
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class EventHub:
+    """In-process publish/subscribe for server-sent events.
+
+    ``publish`` hands a message to every matching ``Subscription`` in this
+    process and keeps the last ``SSE_HISTORY_SIZE`` messages, so a client
+    reconnecting with ``Last-Event-ID`` gets what it missed. With
+    ``EVENT_HUB_URL=redis://...`` messages go through a Redis channel
+    instead, and every process (web workers and job runners alike) delivers
+    them to its own subscribers.
+
+    Event ids are ``{milliseconds}-{pid}-{n}``: the same in every process,
+    and ordered well enough to tell whether a resume point is still covered
+    by the history.
+    """
+
+    def __init__(self, history=1000):
+        self._history = deque(maxlen=history)
+        self._by_user = {}
+        self._segments = set()
+        self._lock = threading.Lock()
+        self._counter = itertools.count(1)
+        self._evicted_ms = self._started_ms = _now_ms()
+        self._url = 'memory://'
+        self._backend = None
+
+    def init_app(self, app):
+        self._history = deque(self._history, maxlen=app.config.get('SSE_HISTORY_SIZE', 1000))
+        self._url = app.config.get('EVENT_HUB_URL') or 'memory://'
+        app.extensions['event_hub'] = self
+
+    def publish(self, audience, event_name, data):
+        message = {
+            'id': f"{_now_ms()}-{os.getpid()}-{next(self._counter)}",
+            'audience': audience,
+            'event': event_name,
+            'data': data
+        }
+        backend = self._get_backend()
+        if backend is None:
+            self.deliver(message)
+        else:
+            backend.publish(message)
+        return message['id']
+
+    def publish_on_commit(self, session, audience, event_name, data):
+        """Publish once ``session`` commits; dropped if it rolls back"""
+        session.info.setdefault('pending_events', []).append((audience, event_name, data))
+
+    @property
+    def shared(self):
+        """Whether published messages reach other processes"""
+        return urlparse(self._url).scheme != 'memory'
+
+    def subscribe(self, user_id, role=None, course_ids=(), last_event_id=None, max_pending=256, limit=None):
+        """Open a subscription. Returns ``(subscription, missed)``: the
+        messages after ``last_event_id`` this user should have seen, or None
+        if they're no longer all in the history and the client must resync.
+        Raises ``TooManySubscriptions`` if ``limit`` subscriptions are open."""
+        self._get_backend()
+        subscription = Subscription(self, user_id, role, course_ids, max_pending)
+        with self._lock:
+            if limit is not None and len(self._segments) >= limit:
+                raise TooManySubscriptions()
+            self._by_user.setdefault(user_id, set()).add(subscription)
+            self._segments.add(subscription)
+            missed = self._missed(subscription, last_event_id) if last_event_id else []
+        return subscription, missed
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._by_user.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._by_user[subscription.user_id]
+            self._segments.discard(subscription)
+
+    def deliver(self, message):
+        """Hand a published message to this process's subscribers"""
+        with self._lock:
+            if len(self._history) == self._history.maxlen:
+                self._evicted_ms = _event_ms(self._history[0]['id'])
+            self._history.append(message)
+            if 'user_id' in message['audience']:
+                subscriptions = list(self._by_user.get(message['audience']['user_id'], ()))
+            else:
+                subscriptions = list(self._segments)
+        for subscription in subscriptions:
+            if subscription.accepts(message):
+                subscription.put(message)
+
+    def _missed(self, subscription, last_event_id):
+        ids = [message['id'] for message in self._history]
+        if last_event_id in ids:
+            later = list(self._history)[ids.index(last_event_id) + 1:]
+        else:
+            last_ms = _event_ms(last_event_id)
+            if last_ms is None or last_ms < max(self._evicted_ms, self._started_ms):
+                return None
+            later = [message for message in self._history if _event_ms(message['id']) > last_ms]
+        return [message for message in later if subscription.accepts(message)]
+
+    def _get_backend(self):
+        # Created on first use, so the listener thread starts in the worker
+        # process rather than in a gunicorn master that forks it
+        if self._backend is None and self.shared:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = create_backend(self._url, self.deliver)
+        return self._backend
+
+
+class RedisBackend:
+    """Fan messages out to every process through a Redis channel. Requires
+    the optional ``redis`` package."""
+
+    channel = 'events'
+
+    def __init__(self, url, deliver):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('EVENT_HUB_URL points at Redis but the redis package is not installed')
+
+        self._client = redis.Redis.from_url(url)
+        self._deliver = deliver
+        self._thread = threading.Thread(target=self._listen, name='event-hub', daemon=True)
+        self._thread.start()
+
+    def publish(self, message):
+        self._client.publish(self.channel, json.dumps(message))
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for item in pubsub.listen():
+                    if item['type'] == 'message':
+                        self._deliver(json.loads(item['data']))
+            except Exception as e:
+                logger.warning(f"Event hub lost its Redis subscription, reconnecting: {e}")
+                time.sleep(1)
+
+
+def create_backend(url, deliver):
+    """Build the cross-process backend for ``EVENT_HUB_URL``"""
+    parsed = urlparse(url)
+    if parsed.scheme in ('redis', 'rediss', 'unix'):
+        return RedisBackend(url, deliver)
+    raise ValueError(f'Unsupported EVENT_HUB_URL: {url}')
+
+
+def format_event(event_name, data, event_id=None):
+    """One ``text/event-stream`` frame"""
+    frame = f"id: {event_id}\n" if event_id else ''
+    return frame + f"event: {event_name}\ndata: {json.dumps(data)}\n\n"
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def _event_ms(event_id):
+    try:
+        return int(event_id.split('-', 1)[0])
+    except (AttributeError, ValueError):
+        return None
+
+
+event_hub = EventHub()
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_pending_events(session):
+    for audience, event_name, data in session.info.pop('pending_events', ()):
+        try:
+            event_hub.publish(audience, event_name, data)
+        except Exception as e:
+            # The change is committed; a lost push only delays the client
+            logger.warning(f"Could not publish {event_name} event: {e}")
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _drop_pending_events(session, previous_transaction):
+    # A failed savepoint leaves the events published outside it standing
+    if previous_transaction.parent is not None:
+        return
+    session.info.pop('pending_events', None)
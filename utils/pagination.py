@@ -0,0 +1,120 @@
+from datetime import datetime
+from flask import request, current_app
+from itsdangerous import URLSafeSerializer, BadSignature
+from sqlalchemy import and_, or_
+
+
+class InvalidCursor(ValueError):
+    """Raised when a ``cursor`` parameter is malformed, tampered with or
+    belongs to a different endpoint"""
+
+
+class Page:
+    """One page of results plus the ``pagination`` block for the response"""
+
+    def __init__(self, items, meta):
+        self.items = items
+        self.meta = meta
+
+
+def paginate(query, *columns, descending=True, keyset=True):
+    """Paginate ``query`` ordered by ``columns`` (the last one must be unique,
+    normally the primary key).
+
+    Without a ``cursor`` request argument this is the classic
+    ``?page=&per_page=`` pagination with a total count. Passing ``?cursor=``
+    (an empty value starts at the first page) switches to keyset pagination:
+    each page is fetched with a ``WHERE (columns) < (last row)`` seek instead
+    of an ``OFFSET``, so deep pages cost the same as the first one, and the
+    ``COUNT(*)`` is skipped unless ``?with_total=1`` is given.
+
+    Endpoints whose ordering cannot be expressed as a plain column key (e.g.
+    relevance-ranked search) pass ``keyset=False``; a cursor is then rejected.
+    """
+    per_page = request.args.get('per_page', 20, type=int)
+    cursor = request.args.get('cursor')
+
+    ordering = [column.desc() if descending else column.asc() for column in columns]
+    query = query.order_by(*ordering)
+
+    if cursor is None:
+        page = request.args.get('page', 1, type=int)
+        result = query.paginate(page=page, per_page=per_page, error_out=False)
+        return Page(result.items, {
+            'page': page,
+            'per_page': per_page,
+            'total': result.total,
+            'pages': result.pages,
+            'has_next': result.has_next,
+            'has_prev': result.has_prev,
+            'next_cursor': _encode(columns, result.items[-1]) if keyset and result.has_next else None
+        })
+
+    if not keyset:
+        raise InvalidCursor('Cursor pagination is not supported for this query')
+
+    per_page = max(1, min(per_page, 100))
+    with_total = request.args.get('with_total', 'false').lower() in ('1', 'true')
+    total = query.order_by(None).count() if with_total else None
+
+    if cursor:
+        query = query.filter(_seek(columns, _decode(columns, cursor), descending))
+
+    items = query.limit(per_page + 1).all()
+    has_next = len(items) > per_page
+    items = items[:per_page]
+
+    return Page(items, {
+        'per_page': per_page,
+        'total': total,
+        'has_next': has_next,
+        'has_prev': bool(cursor),
+        'next_cursor': _encode(columns, items[-1]) if has_next else None
+    })
+
+
+def _serializer():
+    # Bind cursors to the endpoint so one list's cursor can't be replayed on another
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt=f'cursor:{request.endpoint}')
+
+
+def _encode(columns, item):
+    values = []
+    for column in columns:
+        value = getattr(item, column.key)
+        values.append(value.isoformat() if isinstance(value, datetime) else value)
+    return _serializer().dumps(values)
+
+
+def _decode(columns, cursor):
+    try:
+        values = _serializer().loads(cursor)
+    except BadSignature:
+        raise InvalidCursor('Invalid cursor')
+
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise InvalidCursor('Invalid cursor')
+
+    decoded = []
+    for column, value in zip(columns, values):
+        if value is not None and column.type.python_type is datetime:
+            value = datetime.fromisoformat(value)
+        decoded.append(value)
+    return decoded
+
+
+def _seek(columns, values, descending):
+    """``(c1, c2, ...) < (v1, v2, ...)`` (or ``>``) spelled out for backends
+    without row comparisons. The extra ``c1 <= v1`` bound gives the planner
+    an index range to start from; the OR alone forces a scan and sort."""
+    def after(column, value):
+        return column < value if descending else column > value
+
+    clauses = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        equal = [prev == prev_value for prev, prev_value in zip(columns[:i], values[:i])]
+        clauses.append(and_(*equal, after(column, value)))
+
+    leading, leading_value = columns[0], values[0]
+    bound = leading <= leading_value if descending else leading >= leading_value
+    return and_(bound, or_(*clauses))
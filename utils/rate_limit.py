@@ -0,0 +1,212 @@
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from urllib.parse import urlparse, parse_qs
+from flask import current_app
+
+
+class RateLimitResult:
+    """Outcome of one rate limit check, with the values for the
+    ``X-RateLimit-*`` headers"""
+
+    def __init__(self, allowed, limit, remaining, reset_after, retry_after):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = remaining
+        self.reset_after = reset_after
+        self.retry_after = retry_after
+
+    @property
+    def headers(self):
+        headers = {
+            'X-RateLimit-Limit': str(self.limit),
+            'X-RateLimit-Remaining': str(self.remaining),
+            'X-RateLimit-Reset': str(math.ceil(self.reset_after))
+        }
+        if not self.allowed:
+            headers['Retry-After'] = str(math.ceil(self.retry_after))
+        return headers
+
+
+def _gcra(tat, now, interval, period):
+    """Generic cell rate algorithm.
+
+    ``tat`` is the key's theoretical arrival time: when it would be fully
+    replenished. Each request pushes it ``interval`` (period / limit) into
+    the future, and a request is rejected while that would put it more than
+    ``period`` ahead of now. Returns ``(allowed, tat)``, where ``tat`` is the
+    value to store. A key whose ``tat`` has passed carries no state, so it
+    can simply be dropped.
+    """
+    tat = max(tat or 0.0, now)
+    new_tat = tat + interval
+    if new_tat - period > now:
+        return False, tat
+    return True, new_tat
+
+
+def _result(allowed, tat, now, interval, period, limit):
+    if allowed:
+        remaining = int((period - (tat - now)) // interval) if interval else limit
+        return RateLimitResult(True, limit, max(remaining, 0), tat - now, 0)
+    return RateLimitResult(False, limit, 0, tat - now, tat + interval - period - now)
+
+
+class MemoryStore:
+    """Per-process store; each worker enforces its own limit"""
+
+    sweep_every = 1000
+
+    def __init__(self):
+        self._tats = {}
+        self._lock = threading.Lock()
+        self._calls = 0
+
+    def hit(self, key, interval, period):
+        now = time.time()
+        with self._lock:
+            allowed, tat = _gcra(self._tats.get(key), now, interval, period)
+            if allowed:
+                self._tats[key] = tat
+
+            # Drop keys that have fully replenished so idle clients cost nothing
+            self._calls += 1
+            if self._calls >= self.sweep_every:
+                self._calls = 0
+                for stale in [k for k, v in self._tats.items() if v <= now]:
+                    del self._tats[stale]
+
+        return allowed, tat, now
+
+
+class MmapStore:
+    """Fixed-size hash table in a memory-mapped file, shared by every worker
+    on the host (``file:///path/to/ratelimit.bin?slots=65536``).
+
+    Each slot is a 64-bit key hash plus the key's TAT, so memory is fixed at
+    ``16 * slots`` bytes no matter how many clients call. Slots whose TAT has
+    passed are free for reuse. When a probe run is full, the slot closest to
+    expiry is evicted. Writers serialize on an ``flock`` of the file.
+    """
+
+    slot = struct.Struct('<Qd')
+    probe = 32
+
+    def __init__(self, path, slots=65536):
+        self.path = path
+        self.slots = slots
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _open(self):
+        # A descriptor inherited across fork shares its flock with the parent,
+        # so every worker maps the file itself
+        if self._pid == os.getpid():
+            return
+        size = self.slot.size * self.slots
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(fd).st_size < size:
+            os.ftruncate(fd, size)
+        self._fd = fd
+        self._map = mmap.mmap(fd, size)
+        self._pid = os.getpid()
+
+    def hit(self, key, interval, period):
+        import fcntl
+
+        digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+        with self._lock:
+            self._open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                now = time.time()
+                offset, tat = self._find(digest, now)
+                allowed, tat = _gcra(tat, now, interval, period)
+                if allowed:
+                    self.slot.pack_into(self._map, offset, digest, tat)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+        return allowed, tat, now
+
+    def _find(self, digest, now):
+        start = digest % self.slots
+        free = None
+        victim, victim_tat = None, None
+        for i in range(self.probe):
+            offset = ((start + i) % self.slots) * self.slot.size
+            slot_digest, slot_tat = self.slot.unpack_from(self._map, offset)
+            if slot_digest == digest:
+                return offset, slot_tat
+            if free is None and (slot_digest == 0 or slot_tat <= now):
+                free = offset
+            if victim_tat is None or slot_tat < victim_tat:
+                victim, victim_tat = offset, slot_tat
+        return (free if free is not None else victim), None
+
+
+class RedisStore:
+    """Store shared by every worker and host (``redis://`` URLs). Requires the
+    optional ``redis`` package."""
+
+    # TAT in milliseconds from the server clock, so hosts with clock skew
+    # still agree; the key expires once fully replenished
+    script = """
+    local time = redis.call('TIME')
+    local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+    local interval = tonumber(ARGV[1])
+    local period = tonumber(ARGV[2])
+    local tat = tonumber(redis.call('GET', KEYS[1]) or 0)
+    if tat < now then tat = now end
+    local new_tat = tat + interval
+    if new_tat - period > now then
+        return {0, tostring(tat), tostring(now)}
+    end
+    redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil(new_tat - now))
+    return {1, tostring(new_tat), tostring(now)}
+    """
+
+    def __init__(self, url, prefix='ratelimit:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('RATELIMIT_STORAGE_URL points at Redis but the redis package is not installed')
+
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(self.script)
+
+    def hit(self, key, interval, period):
+        allowed, tat, now = self._script(keys=[self.prefix + key], args=[interval * 1000, period * 1000])
+        return bool(allowed), float(tat) / 1000, float(now) / 1000
+
+
+def create_store(url):
+    """Build a store from ``RATELIMIT_STORAGE_URL``"""
+    parsed = urlparse(url or 'memory://')
+    if parsed.scheme == 'memory':
+        return MemoryStore()
+    if parsed.scheme == 'file':
+        slots = int(parse_qs(parsed.query).get('slots', ['65536'])[0])
+        return MmapStore(parsed.path, slots=slots)
+    if parsed.scheme in ('redis', 'rediss', 'unix'):
+        return RedisStore(url)
+    raise ValueError(f'Unsupported RATELIMIT_STORAGE_URL: {url}')
+
+
+def get_limiter():
+    limiter = current_app.extensions.get('rate_limiter')
+    if limiter is None:
+        limiter = current_app.extensions['rate_limiter'] = create_store(current_app.config.get('RATELIMIT_STORAGE_URL'))
+    return limiter
+
+
+def check(key, max_requests, per_seconds):
+    """Count one request for ``key`` against ``max_requests`` per ``per_seconds``"""
+    interval = per_seconds / max_requests
+    allowed, tat, now = get_limiter().hit(key, interval, per_seconds)
+    return _result(allowed, tat, now, interval, per_seconds, max_requests)
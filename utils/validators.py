@@ -291,8 +291,9 @@ def validate_certificate_number(cert_number):
     if not cert_number:
         return False
     
-    # Expected format: AIFA-{course_id}-{user_id}-{random}
-    pattern = r'^AIFA-\d+-\d+-[A-F0-9]{8}$'
+    # Expected format: AIFA-{course_id}-{user_id}-{certificate_id}-{issued}-{signature},
+    # or AIFA-{course_id}-{user_id}-{random} for certificates issued before signing
+    pattern = r'^AIFA-\d+-\d+-(\d+-[0-9A-Z]{1,13}-[A-Z2-7]{16}|[A-F0-9]{8})$'
     return re.match(pattern, cert_number) is not None
 
 def validate_meeting_id(meeting_id):